@@ -0,0 +1,184 @@
+import os
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    """
+    Read a boolean flag from the environment.
+
+    Parameters:
+    name (str): The name of the environment variable.
+    default (bool): The value used when the variable is not set.
+
+    Returns:
+    bool: True for "1", "true", "yes" or "on" (case insensitive), False otherwise.
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name: str, default: int) -> int:
+    """
+    Read an integer setting from the environment.
+
+    Parameters:
+    name (str): The name of the environment variable.
+    default (int): The value used when the variable is not set or empty.
+
+    Returns:
+    int: The parsed value.
+    """
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+def env_float(name: str, default: float) -> float:
+    """
+    Read a decimal setting from the environment.
+
+    Parameters:
+    name (str): The name of the environment variable.
+    default (float): The value used when the variable is not set or empty.
+
+    Returns:
+    float: The parsed value.
+    """
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return float(value)
+
+
+# La contraseña de Postgres se toma de PGPASSWORD o de la propia URL.
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres@localhost:5432/booksdb")
+
+# Réplicas de solo lectura, separadas por comas. Las peticiones GET se
+# reparten entre ellas (round_robin o least_connections); el resto va al
+# primario. Un cliente que escribe lee del primario durante
+# DB_READ_YOUR_WRITES_SECONDS (0 = nunca).
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DB_REPLICA_SELECTION = os.getenv("DB_REPLICA_SELECTION", "round_robin")
+DB_READ_YOUR_WRITES_SECONDS = env_int("DB_READ_YOUR_WRITES_SECONDS", 5)
+
+# URL para el motor asíncrono. Si no se define se deriva de DATABASE_URL
+# (postgresql -> postgresql+asyncpg, sqlite -> sqlite+aiosqlite).
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+# Con DB_ASYNC_MODE=1 los routers se sirven con handlers async sobre AsyncSession.
+# Solo las lecturas más frecuentes (GET /tables, /tables/{n}, /books/{id} y
+# /customers/{id}) tienen una versión async nativa que espera sus consultas;
+# el resto ejecuta el handler síncrono con AsyncSession.run_sync, en un
+# greenlet del bucle de eventos: las consultas van por el driver async, pero
+# el trabajo del ORM y la serialización ocupan el bucle mientras duran.
+DB_ASYNC_MODE = env_bool("DB_ASYNC_MODE")
+
+# Duración de una reserva, usada para saber hasta cuándo ocupa la mesa.
+BOOKING_DURATION_MINUTES = env_int("BOOKING_DURATION_MINUTES", 120)
+
+# Caché de lecturas por entidad (mesa, cliente, reserva).
+CACHE_ENABLED = env_bool("CACHE_ENABLED", True)
+CACHE_MAX_ENTRIES = env_int("CACHE_MAX_ENTRIES", 1024)
+CACHE_TTL_SECONDS = env_int("CACHE_TTL_SECONDS", 30)
+
+# Pool de conexiones. Con varios workers el máximo de conexiones a Postgres
+# es workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+DB_POOL_SIZE = env_int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = env_int("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = env_int("DB_POOL_TIMEOUT", 30)
+DB_POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", True)
+DB_POOL_RECYCLE = env_int("DB_POOL_RECYCLE", 1800)
+# Tiempo máximo por sentencia en Postgres (0 = sin límite).
+DB_STATEMENT_TIMEOUT_MS = env_int("DB_STATEMENT_TIMEOUT_MS", 0)
+
+# Crear las tablas al arrancar. En producción se usa python -m app.database.schema.
+DB_CREATE_SCHEMA_ON_STARTUP = env_bool("DB_CREATE_SCHEMA_ON_STARTUP")
+
+# Métricas en /metrics (formato Prometheus) y cabecera Server-Timing.
+METRICS_ENABLED = env_bool("METRICS_ENABLED", True)
+
+# Respuestas guardadas para repetir peticiones con la misma Idempotency-Key.
+IDEMPOTENCY_MAX_ENTRIES = env_int("IDEMPOTENCY_MAX_ENTRIES", 10000)
+IDEMPOTENCY_TTL_SECONDS = env_int("IDEMPOTENCY_TTL_SECONDS", 86400)
+
+# Control de admisión (ADMISSION_CONTROL=1). Cada cliente (cabecera X-API-Key
+# o su IP) tiene un cubo de tokens para lecturas y otro para escrituras
+# (0 = sin límite); al agotarlo recibe 429 con Retry-After. Además solo
+# ADMISSION_MAX_CONCURRENCY peticiones se atienden a la vez (0 = el tamaño del
+# pool, DB_POOL_SIZE + DB_MAX_OVERFLOW); hasta ADMISSION_QUEUE_SIZE esperan como
+# mucho ADMISSION_QUEUE_TIMEOUT_MS y el resto recibe 503 con Retry-After.
+ADMISSION_CONTROL = env_bool("ADMISSION_CONTROL")
+ADMISSION_MAX_CONCURRENCY = env_int("ADMISSION_MAX_CONCURRENCY", 0)
+ADMISSION_QUEUE_SIZE = env_int("ADMISSION_QUEUE_SIZE", 100)
+ADMISSION_QUEUE_TIMEOUT_MS = env_int("ADMISSION_QUEUE_TIMEOUT_MS", 500)
+RATE_LIMIT_READS_PER_SECOND = env_int("RATE_LIMIT_READS_PER_SECOND", 20)
+RATE_LIMIT_READS_BURST = env_int("RATE_LIMIT_READS_BURST", 40)
+RATE_LIMIT_WRITES_PER_SECOND = env_int("RATE_LIMIT_WRITES_PER_SECOND", 5)
+RATE_LIMIT_WRITES_BURST = env_int("RATE_LIMIT_WRITES_BURST", 10)
+RATE_LIMIT_MAX_CLIENTS = env_int("RATE_LIMIT_MAX_CLIENTS", 10000)
+
+# Escritura agrupada de POST /books: las reservas se encolan y un hilo las
+# confirma en una sola transacción cada GROUP_COMMIT_WAIT_MS o cada
+# GROUP_COMMIT_MAX_BATCH reservas. Una petición espera la suya como mucho
+# GROUP_COMMIT_TIMEOUT_SECONDS; si no, recibe 503.
+BOOKS_GROUP_COMMIT = env_bool("BOOKS_GROUP_COMMIT")
+GROUP_COMMIT_MAX_BATCH = env_int("GROUP_COMMIT_MAX_BATCH", 100)
+GROUP_COMMIT_WAIT_MS = env_int("GROUP_COMMIT_WAIT_MS", 5)
+GROUP_COMMIT_TIMEOUT_SECONDS = env_int("GROUP_COMMIT_TIMEOUT_SECONDS", 10)
+
+# Flujo de cambios en /events (Server-Sent Events). Se guardan los últimos
+# EVENTS_HISTORY eventos para reanudar con Last-Event-ID; cada conexión tiene
+# una cola de EVENTS_QUEUE_SIZE y se corta si se llena. Cada
+# EVENTS_HEARTBEAT_SECONDS se envía un comentario para mantenerla abierta.
+# Mientras hay conexiones abiertas, cada EVENTS_POLL_MS se leen los cambios
+# de los demás workers y procesos para enviarlos también.
+EVENTS_HISTORY = env_int("EVENTS_HISTORY", 1000)
+EVENTS_QUEUE_SIZE = env_int("EVENTS_QUEUE_SIZE", 256)
+EVENTS_HEARTBEAT_SECONDS = env_int("EVENTS_HEARTBEAT_SECONDS", 15)
+EVENTS_POLL_MS = env_int("EVENTS_POLL_MS", 500)
+
+# Registro de cambios compartido (tabla change_log): cada escritura guarda sus
+# cambios en su misma transacción, numerados por id, y antes de cada lectura
+# el worker aplica a sus cachés e índices en memoria los cambios de los demás
+# workers y procesos. El registro se lee como mucho cada CHANGE_LOG_POLL_MS
+# (0 = en cada lectura), así que los cambios de otros procesos tardan hasta
+# ese tiempo en verse. Se guardan los últimos CHANGE_LOG_RETENTION cambios; un
+# worker que se queda más atrás recarga sus índices desde la base de datos.
+CHANGE_LOG_POLL_MS = env_int("CHANGE_LOG_POLL_MS", 200)
+CHANGE_LOG_RETENTION = env_int("CHANGE_LOG_RETENTION", 10000)
+
+# Informe de utilización (/reports/utilization): cada reserva guarda su
+# aportación en utilization_deltas y cada worker las pasa a
+# utilization_rollups cada ROLLUPS_FOLD_SECONDS.
+ROLLUPS_FOLD_SECONDS = env_int("ROLLUPS_FOLD_SECONDS", 5)
+
+# Archivo de reservas: python -m app.database.archive mueve a books_archive
+# las que terminaron hace más de ARCHIVE_AFTER_DAYS días, de
+# ARCHIVE_BATCH_SIZE en ARCHIVE_BATCH_SIZE.
+ARCHIVE_AFTER_DAYS = env_int("ARCHIVE_AFTER_DAYS", 90)
+ARCHIVE_BATCH_SIZE = env_int("ARCHIVE_BATCH_SIZE", 5000)
+
+# Búsqueda de clientes en /customers/search: "database" (índices pg_trgm en
+# Postgres; en otras bases recorre la tabla) o "memory" (índice de trigramas
+# que cada worker carga entero en memoria al arrancar; solo para bases sin
+# pg_trgm y pocos workers).
+CUSTOMER_SEARCH_BACKEND = os.getenv("CUSTOMER_SEARCH_BACKEND", "database")
+
+# Perfilado bajo demanda (PROFILING_ENABLED=1; si no, no se instala nada). Se
+# perfila una petición si trae la cabecera X-Profile firmada con
+# PROFILING_SECRET (python -m app.services.profiling GET /books) o, al azar,
+# con probabilidad PROFILING_SAMPLE_RATE (0 = nunca). PROFILING_MODE es
+# "sampling" (una muestra de la pila cada PROFILING_INTERVAL_MS, formato
+# speedscope) o "deterministic" (cProfile, formato pstats; solo hasta Python
+# 3.11, en versiones posteriores se usa "sampling"). El perfil y las
+# sentencias SQL de la petición se guardan en PROFILING_DIR, que conserva los
+# PROFILING_MAX_PROFILES últimos.
+PROFILING_ENABLED = env_bool("PROFILING_ENABLED")
+PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+PROFILING_SAMPLE_RATE = env_float("PROFILING_SAMPLE_RATE", 0.0)
+PROFILING_MODE = os.getenv("PROFILING_MODE", "sampling")
+PROFILING_INTERVAL_MS = env_int("PROFILING_INTERVAL_MS", 1)
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+PROFILING_MAX_PROFILES = env_int("PROFILING_MAX_PROFILES", 100)
@@ -0,0 +1,34 @@
+"""
+Move finished reservations out of the books table.
+
+Reservations that ended more than ARCHIVE_AFTER_DAYS days ago (or --days)
+go to books_archive, where the read endpoints still find them with
+include_archived=true. Run it from cron, e.g. nightly:
+
+    python -m app.database.archive --days 90
+
+The workers that are running do not need a restart: the moved
+reservations go to the shared change log and each worker drops them from
+its caches and in-memory indexes on its next read.
+"""
+import argparse
+from app.database.connection import SessionLocal, createSchema
+from app.services.archive import archiveBooks, archiveCutoff
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Archiva las reservas terminadas",
+        epilog="No hace falta reiniciar los workers: aplican los cambios desde change_log en su siguiente lectura.")
+    parser.add_argument("--days", type=int, default=None, help="Días de historial que se quedan en books")
+    parser.add_argument("--batch-size", type=int, default=None, help="Reservas por transacción")
+    args = parser.parse_args()
+
+    createSchema()
+    before = archiveCutoff(args.days)
+    session = SessionLocal()
+    try:
+        moved = archiveBooks(session, before, args.batch_size)
+    finally:
+        session.close()
+    print(f"Se han archivado {moved} reservas terminadas antes de {before:%Y-%m-%d}")
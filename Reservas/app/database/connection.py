@@ -0,0 +1,323 @@
+import itertools
+import re
+import threading
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.models import modelsDB
+from app import config
+from app.database import events
+from app.services import metrics
+from app.services.cache import LRUCache
+from app.services.search import normalize
+
+engine = None
+async_engine = None
+AsyncSessionLocal = None
+replica_engines = None
+async_replica_engines = None
+_lock = threading.Lock()
+_next_replica = itertools.count()
+
+READ_METHODS = ("GET", "HEAD")
+
+# Clientes que han escrito hace menos de DB_READ_YOUR_WRITES_SECONDS; sus
+# lecturas van al primario para que vean lo que acaban de escribir.
+_recent_writers = LRUCache(10000, config.DB_READ_YOUR_WRITES_SECONDS)
+
+
+def async_url(url: str) -> str:
+    """
+    Derive the async driver URL from a sync database URL.
+
+    Parameters:
+    url (str): A sync SQLAlchemy URL such as postgresql://... or sqlite:///...
+
+    Returns:
+    str: The same URL using the asyncpg or aiosqlite driver.
+    """
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url.split("://", 1)[1]
+    return url
+
+
+def engine_options(url: str) -> dict:
+    """
+    Build the keyword arguments for create_engine/create_async_engine.
+
+    Pool size, overflow, timeout, pre-ping, recycle and the Postgres
+    statement timeout come from app.config. SQLite connections are created
+    in one thread and used from FastAPI's threadpool, so the same-thread
+    check is disabled, and its pool does not take size settings.
+
+    Parameters:
+    url (str): The database URL the engine is created for.
+
+    Returns:
+    dict: The engine keyword arguments.
+    """
+    options = {
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+    }
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+        return options
+
+    options.update(
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+    )
+    if config.DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql"):
+        if "+asyncpg" in url:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(config.DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={config.DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def _regexpReplace(value, pattern, replacement, flags):
+    if value is None:
+        return None
+    return re.sub(pattern, replacement, value, count=0 if "g" in flags else 1)
+
+
+def addSqliteFunctions(engine):
+    """
+    Give SQLite connections the SQL functions the queries use on Postgres.
+
+    f_unaccent strips accents (and lowercases, which ILIKE ignores) as
+    app.services.search.normalize does, and regexp_replace replaces the
+    first match of a pattern, or every match with the "g" flag.
+
+    Parameters:
+    engine (Engine): A sync engine, or the sync_engine of an async one.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def addFunctions(dbapi_connection, connection_record):
+        dbapi_connection.create_function(
+            "f_unaccent", 1, lambda value: None if value is None else normalize(value), deterministic=True)
+        dbapi_connection.create_function("regexp_replace", 4, _regexpReplace, deterministic=True)
+
+
+def getEngine():
+    """
+    Return the sync engine, creating it on first use.
+
+    Importing this module does not connect to the database, so workers
+    start even if it is down and the first request pays the connection.
+    """
+    global engine
+    if engine is None:
+        with _lock:
+            if engine is None:
+                engine = create_engine(config.DATABASE_URL, **engine_options(config.DATABASE_URL))
+                metrics.instrumentEngine("sync", engine)
+                addSqliteFunctions(engine)
+    return engine
+
+
+def getAsyncEngine():
+    """
+    Return the async engine and its session factory, creating them on first use.
+    """
+    global async_engine, AsyncSessionLocal
+    if async_engine is None:
+        with _lock:
+            if async_engine is None:
+                from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+                url = config.ASYNC_DATABASE_URL or async_url(config.DATABASE_URL)
+                AsyncSessionLocal = async_sessionmaker(autoflush=False)
+                async_engine = create_async_engine(url, **engine_options(url))
+                metrics.instrumentEngine("async", async_engine.sync_engine)
+                addSqliteFunctions(async_engine.sync_engine)
+                AsyncSessionLocal.configure(bind=async_engine)
+    return async_engine
+
+
+def getReplicaEngines() -> list:
+    """
+    Return the engines of the read replicas, creating them on first use.
+
+    Returns:
+    list: One engine per URL in DATABASE_REPLICA_URLS (empty if there are none).
+    """
+    global replica_engines
+    if replica_engines is None:
+        with _lock:
+            if replica_engines is None:
+                engines = []
+                for position, url in enumerate(config.DATABASE_REPLICA_URLS):
+                    replica = create_engine(url, **engine_options(url))
+                    metrics.instrumentEngine(f"replica-{position}", replica)
+                    addSqliteFunctions(replica)
+                    engines.append(replica)
+                replica_engines = engines
+    return replica_engines
+
+
+def getAsyncReplicaEngines() -> list:
+    """
+    Return the async engines of the read replicas, creating them on first use.
+    """
+    global async_replica_engines
+    if async_replica_engines is None:
+        with _lock:
+            if async_replica_engines is None:
+                from sqlalchemy.ext.asyncio import create_async_engine
+
+                engines = []
+                for position, url in enumerate(config.DATABASE_REPLICA_URLS):
+                    replica = create_async_engine(async_url(url), **engine_options(async_url(url)))
+                    metrics.instrumentEngine(f"async-replica-{position}", replica.sync_engine)
+                    addSqliteFunctions(replica.sync_engine)
+                    engines.append(replica)
+                async_replica_engines = engines
+    return async_replica_engines
+
+
+def _checkedOut(replica) -> int:
+    pool = getattr(replica, "sync_engine", replica).pool
+    return pool.checkedout() if hasattr(pool, "checkedout") else 0
+
+
+def pickReplica(engines: list):
+    """
+    Choose the replica for the next read.
+
+    Parameters:
+    engines (list): The replica engines (sync or async).
+
+    Returns:
+    Engine: With DB_REPLICA_SELECTION=least_connections the one with the
+    fewest connections lent out (ties go round-robin), otherwise the next
+    one in round-robin order.
+    """
+    start = next(_next_replica) % len(engines)
+    if config.DB_REPLICA_SELECTION == "least_connections":
+        return min(engines[start:] + engines[:start], key=_checkedOut)
+    return engines[start]
+
+
+def clientKey(request: Request) -> str:
+    """
+    Identify the client for read-your-writes: the X-Client-Id header, or its address.
+    """
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "")
+
+
+def markWrite(request: Request):
+    """
+    Send the reads of this request's client to the primary for a while.
+    """
+    if config.DATABASE_REPLICA_URLS and config.DB_READ_YOUR_WRITES_SECONDS > 0:
+        _recent_writers.set(clientKey(request), True)
+
+
+def readsFromReplica(request: Request) -> bool:
+    """
+    Tell whether a request can be served by a read replica.
+
+    Parameters:
+    request (Request): The incoming request.
+
+    Returns:
+    bool: True for GET/HEAD requests when replicas are configured and the
+    client has not written within DB_READ_YOUR_WRITES_SECONDS.
+    """
+    if not config.DATABASE_REPLICA_URLS or request.method not in READ_METHODS:
+        return False
+    return config.DB_READ_YOUR_WRITES_SECONDS <= 0 or _recent_writers.get(clientKey(request)) is None
+
+
+class LazySessionmaker(sessionmaker):
+    """
+    sessionmaker that binds itself to the engine the first time it is called.
+    """
+
+    def __call__(self, **kwargs):
+        if self.kw.get("bind") is None:
+            self.configure(bind=getEngine())
+        return super().__call__(**kwargs)
+
+
+SessionLocal = LazySessionmaker(autocommit=False, autoflush=False)
+
+
+def createSchema():
+    """
+    Create the tables and indexes that do not exist yet.
+
+    This is an explicit deployment step (python -m app.database.schema),
+    not something every worker does on import.
+    """
+    modelsDB.Base.metadata.create_all(bind=getEngine())
+
+
+def catchUp(session):
+    """
+    Apply the changes of the other workers before a read (see events.catchUp).
+
+    A failure is logged and the read goes on with this worker's state, as
+    when a change callback fails.
+    """
+    try:
+        events.catchUp(session)
+    except Exception as e:
+        session.rollback()
+        print(f"Error al aplicar los cambios de otros procesos: {e}")
+
+
+def get_session(request: Request):
+    """
+    Provide a Session for one request.
+
+    GET and HEAD requests get a session on a read replica (when
+    DATABASE_REPLICA_URLS is set) unless the client wrote recently; every
+    other request gets the primary and marks its client as a recent writer.
+    Before a GET or HEAD the caches and indexes of this worker catch up with
+    the writes of the other workers.
+
+    The session is always closed when the request finishes, also when the
+    handler raises.
+    """
+    if readsFromReplica(request):
+        session = SessionLocal(bind=pickReplica(getReplicaEngines()))
+    else:
+        session = SessionLocal()
+    if request.method in READ_METHODS:
+        catchUp(session)
+    try:
+        yield session
+    finally:
+        session.close()
+        if request.method not in READ_METHODS:
+            markWrite(request)
+
+
+async def get_async_session(request: Request):
+    """
+    Provide an AsyncSession for the async routers, routed like get_session.
+
+    The session is closed when the request finishes, even if the handler fails.
+    """
+    getAsyncEngine()
+    if readsFromReplica(request):
+        session = AsyncSessionLocal(bind=pickReplica(getAsyncReplicaEngines()))
+    else:
+        session = AsyncSessionLocal()
+    if request.method in READ_METHODS:
+        await session.run_sync(catchUp)
+    try:
+        yield session
+    finally:
+        await session.close()
+        if request.method not in READ_METHODS:
+            markWrite(request)
@@ -0,0 +1,360 @@
+import json
+import threading
+import time
+import zlib
+from datetime import datetime
+from sqlalchemy import DateTime, delete, event, func, inspect, insert, select
+from sqlalchemy.orm import Session
+from app import config
+from app.models.modelsDB import Book, ChangeLog, Customer, Table
+
+# Colecciones cuyos cambios se escriben en change_log para el resto de
+# workers y procesos.
+COLLECTIONS = {Table: "tables", Customer: "customers", Book: "books"}
+
+# Acciones que quitan una fila de su tabla: "archive" es una reserva movida a
+# books_archive (app.services.archive), no cancelada.
+REMOVALS = ("delete", "archive")
+
+# Cada cuántos ids se borran las entradas antiguas de change_log.
+PRUNE_EVERY = 1000
+
+# Segundos que se espera a un id que falta en change_log (una transacción
+# que aún no ha terminado, en Postgres) antes de darlo por descartado.
+GAP_TIMEOUT = 60
+
+_listeners = []
+_flushListeners = []
+_reloaders = []
+
+# Estado de este proceso, protegido por _catchUpLock: ha recibido todos los
+# ids de change_log hasta _floor, y además los de _received (id: colección).
+# _gaps son los ids que faltan entre _floor y _top, con el momento en que se
+# vio que faltaban, y _base el último id hasta _floor de cada colección.
+_floor = 0
+_top = 0
+_received = {}
+_gaps = {}
+_base = {name: 0 for name in COLLECTIONS.values()}
+_catchUpLock = threading.RLock()
+_lastPoll = 0.0
+# Hay cambios propios sin entregar que catchUp debe leer sin esperar a
+# CHANGE_LOG_POLL_MS.
+_pending = False
+
+
+def onCommit(model, callback):
+    """
+    Register a callback for committed writes on a model.
+
+    Changes are collected on every flush and only delivered once the
+    transaction commits; a rollback discards them. The listener is installed
+    on the Session class, so it covers every session (sync, async, any engine).
+
+    Parameters:
+    model (type): The ORM class to watch (Table, Customer or Book).
+    callback (Callable): Called as callback(action, values, previous) where
+        action is "create", "update", "delete" or "archive" (see
+        REMOVALS), values is a dict with the
+        column values after the change and previous the values before it
+        (equal to values for create and delete).
+    """
+    _listeners.append((model, callback))
+
+
+def onFlush(model, callback):
+    """
+    Register a callback for the writes on a model, run inside the flush.
+
+    Unlike onCommit, the callback runs in the transaction that makes the
+    changes, right after their INSERT, UPDATE and DELETE statements, so
+    whatever it writes through session.connection() is committed or rolled
+    back with them. An exception aborts the flush. Bulk statements
+    (insert()/delete(), bulk_insert_mappings) bypass it.
+
+    Parameters:
+    model (type): The ORM class to watch.
+    callback (Callable): Called as callback(session, changes) once per flush
+        that touches the model, with changes a list of (action, values,
+        previous) as onCommit callbacks receive them.
+    """
+    _flushListeners.append((model, callback))
+
+
+def onReload(model, callback):
+    """
+    Register a callback that rebuilds in-memory state of a model from the database.
+
+    It runs when this process cannot replay the changes it missed, because
+    the change log no longer has them (see catchUp).
+
+    Parameters:
+    model (type): Table, Customer or Book.
+    callback (Callable): Called as callback(session).
+    """
+    _reloaders.append((model, callback))
+
+
+def version(name: str) -> str:
+    """
+    Identify the changes of a collection this process has received.
+
+    It is the id of the last change log entry of the collection it has
+    received; while some earlier entries are still missing, a hash of the
+    ids received after them is added.
+
+    Parameters:
+    name (str): "tables", "customers" or "books".
+
+    Returns:
+    str: The version, equal in every process that received the same changes.
+    """
+    with _catchUpLock:
+        later = sorted(number for number, entity in _received.items() if entity == name)
+    if not later:
+        return str(_base[name])
+    return f"{_base[name]}.{zlib.crc32(','.join(map(str, later)).encode()):08x}"
+
+
+def _collection(model_class):
+    for model, name in COLLECTIONS.items():
+        if issubclass(model_class, model):
+            return name
+    return None
+
+
+def _listenersOf(model_class) -> list:
+    return [callback for model, callback in _listeners if issubclass(model_class, model)]
+
+
+def _deliver(model_class, action: str, values: dict, previous: dict):
+    for callback in _listenersOf(model_class):
+        try:
+            callback(action, values, previous)
+        except Exception as e:
+            print(f"Error al procesar el cambio de {model_class.__name__}: {e}")
+
+
+def _encode(action: str, values: dict, previous: dict) -> str:
+    data = {"values": values}
+    if action == "update":
+        data["previous"] = previous
+    return json.dumps(data, default=lambda value: value.isoformat())
+
+
+def _decode(model_class, action: str, data: str) -> tuple:
+    data = json.loads(data)
+    moments = [column.key for column in model_class.__table__.columns if isinstance(column.type, DateTime)]
+    for values in data.values():
+        for key in moments:
+            if values.get(key) is not None:
+                values[key] = datetime.fromisoformat(values[key])
+    values = data["values"]
+    return values, data.get("previous", values)
+
+
+def _logChanges(session, changes: list):
+    """
+    Write the changes of a flush to the change log.
+
+    The entries are numbered by the autoincrement id of change_log, so the
+    writers do not wait on each other; the ids can commit out of order,
+    which catchUp takes into account.
+    """
+    entries = [(_collection(model_class), action, values, previous) for model_class, action, values, previous in changes]
+    entries = [entry for entry in entries if entry[0] is not None]
+    if not entries:
+        return
+    connection = session.connection()
+    numbers = dict(connection.execute(insert(ChangeLog).returning(ChangeLog.id, ChangeLog.entity), [
+        {"entity": name, "action": action, "data": _encode(action, values, previous)}
+        for name, action, values, previous in entries
+    ]).all())
+    last = max(numbers)
+    if config.CHANGE_LOG_RETENTION > 0 and (last - len(numbers)) // PRUNE_EVERY != last // PRUNE_EVERY:
+        connection.execute(delete(ChangeLog).where(ChangeLog.id <= last - config.CHANGE_LOG_RETENTION))
+    session.info.setdefault("own_changes", {}).update(numbers)
+
+
+def _receive(number: int, name: str):
+    global _top
+    if number > _floor:
+        _received[number] = name
+        _gaps.pop(number, None)
+        for missing in range(_top + 1, number):
+            _gaps.setdefault(missing, time.monotonic())
+        _top = max(_top, number)
+
+
+def _advance():
+    global _floor
+    now = time.monotonic()
+    while _floor < _top:
+        number = _floor + 1
+        if number in _received:
+            name = _received.pop(number)
+            _base[name] = number
+        elif now - _gaps[number] >= GAP_TIMEOUT:
+            del _gaps[number]
+        else:
+            break
+        _floor = number
+
+
+def _markCurrent(session):
+    global _floor, _top
+    latest = dict(session.execute(select(ChangeLog.entity, func.max(ChangeLog.id)).group_by(ChangeLog.entity)).all())
+    _floor = _top = max(latest.values(), default=0)
+    _received.clear()
+    _gaps.clear()
+    for name in _base:
+        _base[name] = latest.get(name, 0)
+
+
+def markCurrent(session):
+    """
+    Take the changes in the change log as already received.
+
+    Called at startup, before loading the in-memory indexes from the
+    database, so catchUp does not replay what they already contain.
+
+    Parameters:
+    session (Session): Any session on the database.
+    """
+    with _catchUpLock:
+        _markCurrent(session)
+
+
+def catchUp(session):
+    """
+    Deliver the changes committed by other workers and processes.
+
+    Reads the change log entries after the last id up to which this process
+    has received them all and delivers the new ones to the onCommit
+    callbacks in id order. An id that is missing belongs to a transaction
+    that has not ended yet (or was rolled back), and is read again on the
+    next calls for up to GAP_TIMEOUT seconds. If this process is so far
+    behind that the log may have been pruned, the onReload callbacks rebuild
+    its state instead. The log is read at most every CHANGE_LOG_POLL_MS,
+    unless this process has changes of its own waiting to be delivered.
+
+    Parameters:
+    session (Session): The session of the request; it can be a replica, in
+        which case the changes arrive with its replication lag.
+    """
+    global _lastPoll, _pending
+    now = time.monotonic()
+    if not _pending and now - _lastPoll < config.CHANGE_LOG_POLL_MS / 1000:
+        return
+    _lastPoll = now
+    latest = session.execute(select(func.max(ChangeLog.id))).scalar() or 0
+    if latest <= _top and not _gaps and not _pending:
+        return
+    models = {name: model for model, name in COLLECTIONS.items()}
+    if config.CHANGE_LOG_RETENTION > 0 and latest - _floor >= config.CHANGE_LOG_RETENTION:
+        with _catchUpLock:
+            _markCurrent(session)
+            _pending = False
+            for model, callback in _reloaders:
+                try:
+                    callback(session)
+                except Exception as e:
+                    print(f"Error al recargar {model.__tablename__}: {e}")
+        return
+    rows = session.execute(
+        select(ChangeLog.id, ChangeLog.entity, ChangeLog.action, ChangeLog.data)
+        .where(ChangeLog.id > _floor).order_by(ChangeLog.id)
+    ).all()
+    with _catchUpLock:
+        _pending = False
+        for number, name, action, data in rows:
+            if number > _floor and number not in _received:
+                values, previous = _decode(models[name], action, data)
+                _deliver(models[name], action, values, previous)
+                _receive(number, name)
+        _advance()
+
+
+def _columnValues(obj) -> dict:
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+def _previousValues(obj, values: dict) -> dict:
+    state = inspect(obj)
+    previous = dict(values)
+    for key in values:
+        history = state.attrs[key].history
+        if history.deleted:
+            previous[key] = history.deleted[0]
+    return previous
+
+
+def recordChanges(session, model, action: str, rows: list):
+    """
+    Queue changes made with bulk statements, which bypass the unit of work.
+
+    They are written to the change log in the session's transaction and
+    delivered to the onCommit callbacks with its next commit, like the
+    changes found on flush, so other workers see them too.
+
+    Parameters:
+    session (Session): The session that ran the statements.
+    model (type): The ORM class of the rows.
+    action (str): "create", "update", "delete" or "archive".
+    rows (list): One dict of column values per row.
+    """
+    changes = [(model, action, values, values) for values in rows]
+    _logChanges(session, changes)
+    session.info.setdefault("committed_changes", []).extend(changes)
+
+
+@event.listens_for(Session, "after_flush")
+def _collectChanges(session, flush_context):
+    found = []
+    for obj in session.new:
+        values = _columnValues(obj)
+        found.append((type(obj), "create", values, values))
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            values = _columnValues(obj)
+            found.append((type(obj), "update", values, _previousValues(obj, values)))
+    for obj in session.deleted:
+        values = _columnValues(obj)
+        found.append((type(obj), "delete", values, values))
+    for model, callback in _flushListeners:
+        changes = [(action, values, previous) for model_class, action, values, previous in found
+                   if issubclass(model_class, model)]
+        if changes:
+            callback(session, changes)
+    _logChanges(session, found)
+    if _listeners:
+        session.info.setdefault("committed_changes", []).extend(found)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatchChanges(session):
+    global _pending
+    changes = session.info.pop("committed_changes", None)
+    own = session.info.pop("own_changes", {})
+    with _catchUpLock:
+        # The changes are delivered here only if this process has received
+        # every id before them; otherwise another process committed in
+        # between (or may have: a missing id can belong to a transaction that
+        # ended since) and the next catchUp delivers both in id order.
+        inOrder = all(number in own or number in _received
+                      for number in range(_floor + 1, max(own, default=_floor) + 1))
+        if not inOrder:
+            _pending = True
+        else:
+            for number, name in sorted(own.items()):
+                _receive(number, name)
+            _advance()
+        for model_class, action, values, previous in changes or ():
+            if inOrder or _collection(model_class) is None:
+                _deliver(model_class, action, values, previous)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discardChanges(session):
+    session.info.pop("committed_changes", None)
+    session.info.pop("own_changes", None)
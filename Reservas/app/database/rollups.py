@@ -0,0 +1,22 @@
+"""
+Recompute the rollups behind /reports/utilization.
+
+Every reservation written through the API adds its contribution to
+utilization_deltas in its own transaction and the workers fold them into
+the rollups; run this after loading reservations with bulk statements,
+after restoring a backup or to repair them:
+
+    python -m app.database.rollups
+"""
+from app.database.connection import SessionLocal, createSchema
+from app.services.rollups import rebuild
+
+
+if __name__ == "__main__":
+    createSchema()
+    session = SessionLocal()
+    try:
+        written, read = rebuild(session)
+    finally:
+        session.close()
+    print(f"Se han recalculado {written} agregados a partir de {read} reservas")
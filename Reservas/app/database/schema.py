@@ -0,0 +1,13 @@
+"""
+Create the database schema.
+
+Run it once per deployment, before starting the workers:
+
+    python -m app.database.schema
+"""
+from app.database.connection import createSchema, getEngine
+
+
+if __name__ == "__main__":
+    createSchema()
+    print(f"Esquema creado en {getEngine().url.render_as_string(hide_password=True)}")
@@ -1,23 +1,81 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routers import tables,books,customer
+from app.routers import tables,books,customer,events,monitoring,reports
+from app.database.connection import SessionLocal, createSchema
+from app.database.events import markCurrent
+from app.services import availability, feed, metrics, occupancy, profiling, rollups, search
+from app.middleware import AdmissionMiddleware, IdempotencyMiddleware, MetricsMiddleware, ProfilingMiddleware
+from app.responses import JSONResponse
+from app import config
 
+# Rutas de monitorización y el flujo de eventos: sin control de admisión ni perfilado.
+MONITORING_PATHS = {
+    "/events", "/metrics", "/cache/stats", "/occupancy/stats", "/admission/stats", "/events/stats",
+    "/search/stats"}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.DB_CREATE_SCHEMA_ON_STARTUP:
+        createSchema()
+    session = SessionLocal()
+    try:
+        markCurrent(session)
+        availability.load(session)
+        occupancy.load(session)
+        search.load(session)
+    finally:
+        session.close()
+    books.bookWriter.start()
+    tasks = [asyncio.create_task(feed.followChanges()), asyncio.create_task(rollups.foldPeriodically())]
+    yield
+    for task in tasks:
+        task.cancel()
+    if not books.bookWriter.stop():
+        print("La escritura agrupada de reservas no ha terminado al detener el servidor")
 
 
 app = FastAPI(
+    lifespan=lifespan,
+    default_response_class=JSONResponse,
     title="Reservas de Mesas",
     description="API para reservar mesas en un restaurante",
     version="1.0",
     openapi_tags=[
         {"name": "Tables", "description": "API para administrar mesas"},
         {"name": "Books", "description": "API para administrar reservas"},
-        {"name": "Customer", "description": "API para administrar clientes"}
+        {"name": "Customer", "description": "API para administrar clientes"},
+        {"name": "Reports", "description": "Informes de ocupación"},
+        {"name": "Events", "description": "Cambios en tiempo real"},
+        {"name": "Monitoring", "description": "Estado interno del servicio"}
     ]
 )
 
+if config.PROFILING_ENABLED:
+    profiling.install()
+    app.add_middleware(ProfilingMiddleware, exempt=MONITORING_PATHS)
+
+app.add_middleware(IdempotencyMiddleware, paths={"/books", "/customers"})
+
+if config.ADMISSION_CONTROL:
+    app.add_middleware(AdmissionMiddleware, exempt=MONITORING_PATHS)
+
+if config.METRICS_ENABLED:
+    metrics.install()
+    app.add_middleware(MetricsMiddleware)
 
+routers = [tables.table, books.book, customer.customer, reports.reports]
+if config.DB_ASYNC_MODE:
+    from app.routers.asyncMode import asyncRouter
 
+    routers = [asyncRouter(router) for router in routers]
+if config.PROFILING_ENABLED:
+    from app.routers.asyncMode import copyRouter
 
+    routers = [copyRouter(router, profiling.profiledEndpoint) for router in routers]
+for router in routers:
+    app.include_router(router)
 
-app.include_router(tables.table)
-app.include_router(books.book)
-app.include_router(customer.customer)
\ No newline at end of file
+app.include_router(events.events)
+app.include_router(monitoring.monitoring)
@@ -0,0 +1,222 @@
+import time
+from starlette.concurrency import run_in_threadpool
+from app.responses import JSONResponse
+from app.services import admission, idempotency, metrics, profiling
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records latency, status and SQL usage per route.
+
+    The route label is the path template ("/books/{book_id}"), so the
+    number of series does not grow with the ids requested. Every response
+    gets a Server-Timing header with the time spent in the app and in the
+    database, which the browser's developer tools show per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = metrics.RequestStats()
+        token = metrics.current.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def sendWithTiming(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = (time.perf_counter() - started) * 1000
+                timing = (f'app;dur={elapsed:.1f}, '
+                          f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"')
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode("latin-1"))]
+            await send(message)
+
+        metrics.requests_in_progress.inc()
+        try:
+            await self.app(scope, receive, sendWithTiming)
+        finally:
+            metrics.requests_in_progress.inc(amount=-1)
+            metrics.current.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            metrics.requests_total.inc(method, path, str(status))
+            metrics.request_duration.observe(time.perf_counter() - started, method, path)
+            metrics.queries_per_request.observe(stats.queries, method, path)
+            metrics.db_time_per_request.observe(stats.db_time, method, path)
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware that makes POSTs with an Idempotency-Key header safe to retry.
+
+    The first response for a (method, path, client, key) combination is
+    stored (status, headers and body) and every retry gets it back, marked with
+    Idempotent-Replayed: true, without running the handler again. A
+    duplicate that arrives while the first request is still running waits
+    for it. Reusing a key with a different body is rejected with 422, and
+    5xx responses are not stored so the client can retry them. The client
+    is its X-API-Key or its address (admission.clientOf), so two clients
+    that pick the same key never get each other's responses.
+    """
+
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        key = dict(scope["headers"]).get(b"idempotency-key")
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(key) <= 255:
+            await JSONResponse(status_code=400, content={
+                "message": "La cabecera Idempotency-Key debe tener entre 1 y 255 caracteres"})(scope, receive, send)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        fingerprint = idempotency.fingerprint(body)
+        store_key = (scope["method"], scope["path"], admission.clientOf(scope), key)
+
+        stored = await idempotency.claim(store_key)
+        if stored is not None:
+            if stored.fingerprint != fingerprint:
+                await JSONResponse(status_code=422, content={
+                    "message": "La Idempotency-Key ya se ha usado con otra petición"})(scope, receive, send)
+                return
+            await send({"type": "http.response.start", "status": stored.status,
+                        "headers": stored.headers + [(b"idempotent-replayed", b"true")]})
+            await send({"type": "http.response.body", "body": stored.body})
+            return
+
+        body_sent = False
+        response = {"status": None, "headers": [], "body": [], "complete": False}
+
+        async def receiveBody():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def sendAndRecord(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+                response["complete"] = not message.get("more_body", False)
+            await send(message)
+
+        stored = None
+        try:
+            await self.app(scope, receiveBody, sendAndRecord)
+            if response["complete"] and response["status"] < 500:
+                stored = idempotency.StoredResponse(
+                    fingerprint, response["status"], response["headers"], b"".join(response["body"]))
+        finally:
+            idempotency.release(store_key, stored)
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that sheds load before it reaches the connection pool.
+
+    Each client (X-API-Key header or address) has a token bucket for reads
+    and one for writes; a client that runs out gets 429 with Retry-After
+    while the others carry on. Admitted requests then need a slot of the
+    concurrency limiter, sized to the pool: they wait briefly in a bounded
+    queue and get 503 with Retry-After if none frees up, instead of
+    timing out inside get_session. Paths in `exempt` (monitoring) skip
+    both checks.
+    """
+
+    def __init__(self, app, exempt=()):
+        self.app = app
+        self.exempt = frozenset(exempt)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = admission.routeClass(scope["method"])
+        wait = admission.rateLimiter.check(admission.clientOf(scope), route_class)
+        if wait:
+            metrics.admission_rejected_total.inc("rate_limit", route_class)
+            await JSONResponse(status_code=429, headers={"Retry-After": admission.retryAfter(wait)}, content={
+                "message": "Demasiadas peticiones, inténtelo de nuevo más tarde"})(scope, receive, send)
+            return
+
+        rejected = await admission.concurrencyLimiter.acquire()
+        if rejected:
+            metrics.admission_rejected_total.inc(rejected, route_class)
+            retry = admission.retryAfter(admission.concurrencyLimiter.timeout)
+            await JSONResponse(status_code=503, headers={"Retry-After": retry}, content={
+                "message": "El servicio está saturado, inténtelo de nuevo más tarde"})(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.concurrencyLimiter.release()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles the requests picked by profiling.selected().
+
+    The request runs under the profiler (see profiling.ProfileRun), its SQL
+    statements are recorded and, once the response has been sent, the
+    profile and the summary are written to PROFILING_DIR from the
+    threadpool. The response carries the run id in X-Profile-Id. Only one
+    request is profiled at a time; the others run normally. Paths in
+    `exempt` (monitoring, the event stream) are never profiled.
+    """
+
+    def __init__(self, app, exempt=()):
+        self.app = app
+        self.exempt = frozenset(exempt)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt or not profiling.selected(scope):
+            await self.app(scope, receive, send)
+            return
+        run = profiling.start(scope["method"], scope["path"])
+        if run is None:
+            await self.app(scope, receive, send)
+            return
+
+        token = profiling.current.set(run)
+        status = 500
+
+        async def sendWithProfileId(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", run.id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, sendWithProfileId)
+        finally:
+            profiling.current.reset(token)
+            profiling.stop(run, status)
+            await run_in_threadpool(profiling.save, run)
+
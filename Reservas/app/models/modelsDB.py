@@ -1,9 +1,32 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, UniqueConstraint, DDL, event, func, literal_column
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
+
+def telDigits(tel):
+    """
+    SQL expression with only the digits of a phone number column.
+
+    The arguments are literals, not bound parameters, so that queries match
+    the expression of ix_customers_tel_digits_trgm.
+    """
+    return func.regexp_replace(tel, literal_column("'[^0-9]'"), literal_column("''"), literal_column("'g'"))
+
+
+def unaccented(text):
+    """
+    SQL expression of a text column without its accents ("Peña" -> "Pena").
+
+    On Postgres it calls f_unaccent, an IMMUTABLE wrapper of unaccent()
+    created with the schema so that it can be indexed; SQLite connections get
+    a function with the same name (see app.database.connection).
+    """
+    return func.f_unaccent(text)
+
+
 class Table(Base):
     __tablename__ = 'tables'
 
@@ -16,15 +39,119 @@ class Table(Base):
 
 class Book(Base):
     __tablename__ = 'books'
+    __table_args__ = (
+        # Solo impide dos reservas de una mesa que empiecen a la misma hora;
+        # los solapamientos los impiden ex_books_table_overlap (Postgres) y
+        # los triggers de abajo (SQLite). El índice también sirve la consulta
+        # de solapamientos por mesa.
+        UniqueConstraint('table_number', 'time', name='uq_books_table_time'),
+        Index('ix_books_table_number_end_time', 'table_number', 'end_time'),
+        # Los ids de reservas archivadas no se reutilizan en SQLite.
+        {'sqlite_autoincrement': True},
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     table_number = Column(Integer, ForeignKey('tables.number'), nullable=False)
-    customer_id = Column(String(10), ForeignKey('customers.idcustomer'), nullable=False)
-    time = Column(DateTime, nullable=False)
+    customer_id = Column(String(10), ForeignKey('customers.idcustomer'), nullable=False, index=True)
+    time = Column(DateTime, nullable=False, index=True)
+    end_time = Column(DateTime, nullable=False)
+    no_show = Column(Boolean, nullable=False, default=False)
 
     table = relationship("Table", back_populates="reservations")
     customer = relationship("Customer", back_populates="reservations")
 
+# Garantía en la base de datos de que las reservas de una mesa no se solapan,
+# aunque se escriban sin pasar por la API. En Postgres es una restricción de
+# exclusión (necesita btree_gist para comparar table_number con =); SQLite no
+# las tiene y usa un trigger por INSERT y UPDATE que busca un solapamiento con
+# ix_books_table_number_end_time. En los dos casos la base de datos devuelve
+# un IntegrityError.
+Book.__table__.append_constraint(ExcludeConstraint(
+    (Book.table_number, '='),
+    (func.tsrange(Book.time, Book.end_time), '&&'),
+    name='ex_books_table_overlap', using='gist',
+).ddl_if(dialect='postgresql'))
+
+_BOOK_OVERLAP_CHECK = """
+CREATE TRIGGER IF NOT EXISTS tr_books_no_overlap_{name}
+BEFORE {event} ON books
+BEGIN
+    SELECT RAISE(ABORT, 'La mesa ya está reservada en ese horario')
+    WHERE EXISTS (
+        SELECT 1 FROM books
+        WHERE table_number = NEW.table_number AND end_time > NEW.time
+          AND time < NEW.end_time AND id IS NOT NEW.id
+    );
+END
+"""
+for _name, _event in (('insert', 'INSERT'), ('update', 'UPDATE OF table_number, time, end_time')):
+    event.listen(Book.__table__, 'after_create',
+                 DDL(_BOOK_OVERLAP_CHECK.format(name=_name, event=_event)).execute_if(dialect='sqlite'))
+
+class ArchivedBook(Base):
+    # Reservas pasadas que python -m app.database.archive ha sacado de books;
+    # conservan su id y solo se leen (include_archived=true).
+    __tablename__ = 'books_archive'
+    __table_args__ = (
+        Index('ix_books_archive_table_number_time', 'table_number', 'time'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    table_number = Column(Integer, ForeignKey('tables.number'), nullable=False)
+    customer_id = Column(String(10), ForeignKey('customers.idcustomer'), nullable=False, index=True)
+    time = Column(DateTime, nullable=False, index=True)
+    end_time = Column(DateTime, nullable=False)
+    no_show = Column(Boolean, nullable=False, default=False)
+    archived_at = Column(DateTime, nullable=False)
+
+    table = relationship("Table", viewonly=True)
+    customer = relationship("Customer", viewonly=True)
+
+class UtilizationRollup(Base):
+    # Totales de reservas por hora y por día para /reports/utilization. Los
+    # workers les suman las filas de utilization_deltas (app.services.rollups)
+    # y se recalculan con python -m app.database.rollups. Incluyen las
+    # reservas archivadas.
+    __tablename__ = 'utilization_rollups'
+
+    granularity = Column(String(4), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    reservations = Column(Integer, nullable=False, default=0)
+    covers = Column(Integer, nullable=False, default=0)
+    no_shows = Column(Integer, nullable=False, default=0)
+    table_seconds = Column(BigInteger, nullable=False, default=0)
+    seat_seconds = Column(BigInteger, nullable=False, default=0)
+
+class UtilizationDelta(Base):
+    # Lo que cada cambio de una reserva (o de las plazas de su mesa) suma o
+    # resta a utilization_rollups, con los argumentos de
+    # app.services.rollups.addContribution. Las escrituras solo añaden filas
+    # aquí, así que no esperan unas a otras; los workers las pasan a
+    # utilization_rollups cada ROLLUPS_FOLD_SECONDS y los informes suman las
+    # que quedan.
+    __tablename__ = 'utilization_deltas'
+
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    no_show = Column(Boolean, nullable=False)
+    count = Column(Integer, nullable=False)
+    seats = Column(Integer, nullable=False)
+
+class ChangeLog(Base):
+    # Cambios confirmados de tablas, clientes y reservas, numerados por id.
+    # Cada worker aplica los de los demás procesos a sus cachés e índices en
+    # memoria (app.database.events.catchUp) y calcula los ETag con el último
+    # id que ha recibido de cada colección. Se guardan los últimos
+    # CHANGE_LOG_RETENTION.
+    __tablename__ = 'change_log'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    entity = Column(String(16), nullable=False)
+    action = Column(String(7), nullable=False)
+    data = Column(Text, nullable=False)
+
 class Customer(Base):
     __tablename__ = 'customers'
 
@@ -34,4 +161,28 @@ class Customer(Base):
     email = Column(String(100), nullable=False,unique=True)
     tel = Column(String(20))
 
-    reservations = relationship("Book", back_populates="customer")
\ No newline at end of file
+    reservations = relationship("Book", back_populates="customer")
+
+# Índices de trigramas para /customers/search en Postgres, sobre el nombre y
+# el email sin acentos y los dígitos del teléfono: las mismas expresiones que
+# compara app.services.search.databaseSearch.
+Index('ix_customers_name_trgm', unaccented(Customer.name).label('name_unaccented'),
+      postgresql_using='gin', postgresql_ops={'name_unaccented': 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+Index('ix_customers_email_trgm', unaccented(Customer.email).label('email_unaccented'),
+      postgresql_using='gin', postgresql_ops={'email_unaccented': 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+Index('ix_customers_tel_digits_trgm', telDigits(Customer.tel).label('tel_digits'),
+      postgresql_using='gin', postgresql_ops={'tel_digits': 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+
+event.listen(Base.metadata, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+event.listen(Base.metadata, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+event.listen(Base.metadata, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS unaccent').execute_if(dialect='postgresql'))
+# unaccent() es STABLE (depende del diccionario configurado) y no se puede
+# indexar; con el diccionario fijo el resultado no cambia.
+event.listen(Base.metadata, 'before_create', DDL("""
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+""").execute_if(dialect='postgresql'))
@@ -1,6 +1,9 @@
 from datetime import datetime
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+# Máximo de minutos de una duración o una espera: un día.
+MAX_MINUTES = 24 * 60
 
 
 class TableBase(BaseModel):
@@ -33,10 +36,10 @@ class CustomerPydantic(CustomerBase):
         orm_mode = True
 
 class CustomerUpdate(BaseModel):
-    idCustomer: Optional[str]
-    name: Optional[str]
-    email: Optional[str]
-    tel: Optional[str]
+    idCustomer: Optional[str] = None
+    name: Optional[str] = None
+    email: Optional[str] = None
+    tel: Optional[str] = None
 
 class BookBase(BaseModel):
     table_number: int
@@ -44,7 +47,14 @@ class BookBase(BaseModel):
     time: datetime
 
 class BookCreate(BookBase):
-    pass
+    duration: Optional[int] = Field(None, ge=1, le=MAX_MINUTES, description="Duración en minutos")
+
+class PartyAllocation(BaseModel):
+    customer_id: str
+    size: int = Field(..., ge=1, description="Número de comensales")
+    time: datetime
+    duration: Optional[int] = Field(None, ge=1, le=MAX_MINUTES, description="Duración en minutos")
+    max_wait: int = Field(0, ge=0, le=MAX_MINUTES, description="Minutos que el grupo puede esperar después de la hora pedida")
 
 class PydanticBook(BookBase):
     id: int
@@ -56,6 +66,8 @@ class BookUpdate(BaseModel):
     table_number: Optional[int] = None
     customer_id: Optional[str] = None
     time: Optional[datetime] = None
+    duration: Optional[int] = Field(None, ge=1, le=MAX_MINUTES, description="Duración en minutos")
+    no_show: Optional[bool] = Field(None, description="El cliente no se presentó")
 
 
     class Config:
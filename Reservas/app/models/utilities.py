@@ -1,5 +1,37 @@
+import csv
+import io
+from datetime import datetime, timedelta
+from fastapi.responses import StreamingResponse
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload
 from app.models.pydanticModels import TableCreate, CustomerCreate,BookCreate
-from app.models.modelsDB import Table,Customer,Book
+from app.models.modelsDB import Table,Customer,Book,ArchivedBook
+from app.responses import JSONResponse, dumps
+from app import config
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+MAX_BULK_SIZE = 5000
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Columnas que devuelven los listados y exportaciones, en lugar de SELECT *.
+TABLE_COLUMNS = (Table.id, Table.number, Table.seats, Table.is_occupied)
+CUSTOMER_COLUMNS = (Customer.id, Customer.idcustomer, Customer.name, Customer.email, Customer.tel)
+BOOK_COLUMNS = (Book.id, Book.table_number, Book.customer_id, Book.time, Book.end_time, Book.no_show)
+ARCHIVED_BOOK_COLUMNS = (ArchivedBook.id, ArchivedBook.table_number, ArchivedBook.customer_id,
+                         ArchivedBook.time, ArchivedBook.end_time, ArchivedBook.no_show)
+
+def bookingEnd(start: datetime, duration: int = None) -> datetime:
+    """
+    Return the end of a reservation.
+
+    Parameters:
+    start (datetime): When the reservation starts.
+    duration (int, optional): Length in minutes. Defaults to BOOKING_DURATION_MINUTES.
+    """
+    return start + timedelta(minutes=duration or config.BOOKING_DURATION_MINUTES)
+
 
 def pydanticTableToAlchemy(table:TableCreate):
     return Table(
@@ -22,5 +54,274 @@ def pydanticBookToAlchemy(book : BookCreate):
     return Book(
         table_number=book.table_number,
         customer_id=book.customer_id,
-        time=book.time  
-    )
\ No newline at end of file
+        time=book.time,
+        end_time=bookingEnd(book.time, book.duration)
+    )
+
+
+def rowDicts(result) -> list:
+    """
+    Turn the rows of a Core result into dictionaries keyed by column name.
+
+    Zipping the keys once per row is much cheaper than building a dict from
+    each RowMapping.
+
+    Parameters:
+    result (Result): The result of a select() of columns.
+
+    Returns:
+    list: One dictionary per row.
+    """
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+def keysetPage(session, statement, id_column, limit: int, after=None, serialize=None):
+    """
+    Run one page of a keyset (cursor) paginated query.
+
+    Rows are ordered by `id_column` and only the ones after the cursor are
+    read, so the cost of a page does not depend on how deep it is.
+
+    Parameters:
+    session (Session): The database session.
+    statement (Select): The filtered select() to paginate.
+    id_column (Column): The unique, indexed column used as cursor.
+    limit (int): Maximum number of rows in the page.
+    after (int, optional): Cursor returned by the previous page.
+    serialize (Callable, optional): For ORM selects, turns each object into a dictionary.
+
+    Returns:
+    tuple: (list of row dictionaries, cursor for the next page or None if this is the last one)
+    """
+    return pageRows(session.execute(keysetStatement(statement, id_column, limit, after)), id_column, limit, serialize)
+
+
+def keysetStatement(statement, id_column, limit: int, after=None):
+    """
+    Add the cursor condition, the order and the limit of a keyset page to `statement`.
+    """
+    if after is not None:
+        statement = statement.where(id_column > after)
+    return statement.order_by(id_column).limit(limit)
+
+
+def pageRows(result, id_column, limit: int, serialize=None) -> tuple:
+    """
+    Turn the result of a keysetStatement into the page and its next cursor.
+
+    It is the part of keysetPage that does not touch the session, shared
+    with the async handlers, which run the statement with await session.execute().
+    """
+    if serialize is None:
+        rows = rowDicts(result)
+    else:
+        rows = [serialize(obj) for obj in result.scalars()]
+    next_after = rows[-1][id_column.key] if len(rows) == limit else None
+    return rows, next_after
+
+
+
+def mergedPage(pages: list, limit: int) -> tuple:
+    """
+    Merge keyset pages of the same size read from tables with disjoint ids.
+
+    Parameters:
+    pages (list): The (rows, next_after) results of keysetPage for each table.
+    limit (int): The page size they were read with.
+
+    Returns:
+    tuple: (the first `limit` rows of all of them by id, cursor for the next page or None)
+    """
+    rows = sorted((row for page, _ in pages for row in page), key=lambda row: row["id"])
+    more = len(rows) > limit or any(next_after is not None for _, next_after in pages)
+    rows = rows[:limit]
+    return rows, (rows[-1]["id"] if more and rows else None)
+
+
+def keepSync(endpoint):
+    """
+    Mark a handler that has to keep its sync Session in async mode.
+
+    Streaming handlers keep reading from the session after they return, so
+    they cannot run inside AsyncSession.run_sync.
+    """
+    endpoint.keep_sync = True
+    return endpoint
+
+
+def asyncVersionOf(endpoint):
+    """
+    Register the decorated async def handler as the async mode version of `endpoint`.
+
+    asyncRouter serves it instead of wrapping `endpoint` in
+    AsyncSession.run_sync, so its queries are awaited on the event loop.
+    It must take the same parameters, with an AsyncSession from
+    get_async_session in place of the Session.
+    """
+    def register(async_endpoint):
+        endpoint.async_version = async_endpoint
+        return async_endpoint
+    return register
+
+
+def keepSyncWhen(condition: bool):
+    """
+    Apply keepSync only when `condition` is true (a setting read at startup).
+    """
+    return keepSync if condition else (lambda endpoint: endpoint)
+
+
+def streamRows(session, statement, format: str, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Stream the rows of a query as NDJSON or CSV text chunks.
+
+    The query is executed with yield_per, so the driver fetches `batch_size`
+    rows at a time (a server-side cursor on Postgres) and only one batch is
+    held in memory. The session is closed when the stream ends or the client
+    goes away.
+
+    Parameters:
+    session (Session): The database session; it is owned by the stream from now on.
+    statement (Select): The query to export.
+    format (str): "ndjson" or "csv".
+    batch_size (int): Number of rows fetched and written per chunk.
+
+    Yields:
+    str | bytes: One chunk of the export per batch of rows (plus the CSV header).
+    """
+    try:
+        result = session.execute(statement, execution_options={"yield_per": batch_size})
+        columns = list(result.keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if format == "csv" else None
+        if writer:
+            writer.writerow(columns)
+            yield buffer.getvalue()
+
+        for partition in result.partitions():
+            if not writer:
+                yield b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in partition)
+                continue
+            buffer.seek(0)
+            buffer.truncate()
+            for row in partition:
+                writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+            yield buffer.getvalue()
+    finally:
+        session.close()
+
+
+def exportResponse(session, statement, format: str, filename: str) -> StreamingResponse:
+    """
+    Build the StreamingResponse for an export endpoint.
+
+    Parameters:
+    session (Session): The database session used by the stream.
+    statement (Select): The query to export.
+    format (str): "ndjson" or "csv".
+    filename (str): Name of the file without extension.
+
+    Returns:
+    StreamingResponse: The response streaming the rows as they are read.
+    """
+    return StreamingResponse(
+        streamRows(session, statement, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'},
+    )
+
+
+
+def bulkResponse(created: list, errors: list, total: int) -> JSONResponse:
+    """
+    Build the response of a bulk create endpoint.
+
+    Parameters:
+    created (list): One dictionary per inserted item, including its index in
+        the request and "status": 201.
+    errors (list): One {"index", "status", "message"} dictionary per rejected
+        item; the status is the one the single-item endpoint would return
+        (404 for a missing table or customer, 409 for a conflict).
+    total (int): Number of items received.
+
+    Returns:
+    JSONResponse: 201 if every item was created, 207 if only some of them were.
+    """
+    return JSONResponse(
+        status_code=201 if not errors else 207,
+        content={
+            "message": f"Se han creado {len(created)} de {total} registros",
+            "created": created,
+            "errors": errors,
+        }
+    )
+
+
+
+# Relaciones que se pueden pedir con ?expand= y la colección de la que dependen (para el ETag).
+BOOK_EXPANSIONS = {"table": "tables", "customer": "customers"}
+CUSTOMER_EXPANSIONS = {"reservations": "books"}
+
+
+def parseExpand(expand: str, allowed: dict) -> list:
+    """
+    Parse an ?expand= value such as "table,customer".
+
+    Parameters:
+    expand (str, optional): Comma separated relationship names.
+    allowed (dict): The relationships that can be expanded.
+
+    Returns:
+    list: The requested relationship names, without duplicates.
+
+    Raises:
+    ValueError: If a name is not in `allowed`.
+    """
+    names = []
+    for name in (expand or "").split(","):
+        name = name.strip()
+        if not name or name in names:
+            continue
+        if name not in allowed:
+            raise ValueError(f"No se puede expandir '{name}'. Opciones: {', '.join(allowed)}")
+        names.append(name)
+    return names
+
+
+def eagerOptions(model, expand: list) -> list:
+    """
+    Build the eager loading options for the expanded relationships.
+
+    Many-to-one relationships (a book's table and customer) are joined into
+    the same SELECT; one-to-many ones (a customer's reservations) are loaded
+    with one extra SELECT ... WHERE customer_id IN (...). Either way the
+    number of queries does not depend on the number of rows.
+    """
+    options = []
+    for name in expand:
+        attribute = getattr(model, name)
+        options.append(selectinload(attribute) if attribute.property.uselist else joinedload(attribute))
+    return options
+
+
+def modelToDict(obj, expand=()) -> dict:
+    """
+    Turn an ORM object into a dictionary of its columns plus the expanded relationships.
+
+    Parameters:
+    obj: A Table, Customer or Book instance.
+    expand (Iterable[str]): Relationship names to include; they must already be loaded.
+
+    Returns:
+    dict: Column values by name; each expanded relationship is a nested
+    dictionary (or a list of them for one-to-many relationships).
+    """
+    data = {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+    for name in expand:
+        related = getattr(obj, name)
+        if isinstance(related, list):
+            data[name] = [modelToDict(item) for item in related]
+        else:
+            data[name] = modelToDict(related) if related is not None else None
+    return data
@@ -0,0 +1,48 @@
+import json
+from datetime import date, datetime, time
+from typing import Any
+from starlette import responses
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Encode a value as compact UTF-8 JSON.
+
+    Uses orjson when it is installed and the standard library otherwise.
+    Datetimes are written as ISO 8601 strings in both cases, so row
+    dictionaries can be passed as they come from the database.
+
+    Parameters:
+    content (Any): Dictionaries, lists and scalars (including datetimes).
+
+    Returns:
+    bytes: The JSON document.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+class JSONResponse(responses.JSONResponse):
+    """
+    Drop-in replacement for fastapi.responses.JSONResponse using dumps().
+
+    It is the app's default response class. Handlers return it directly
+    with plain dictionaries of row values, which skips jsonable_encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,127 @@
+import inspect
+from fastapi import APIRouter, Depends
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.connection import get_session, get_async_session
+
+
+def uses_session(endpoint) -> bool:
+    """
+    Tell whether an endpoint receives its database session from get_session.
+
+    Parameters:
+    endpoint (Callable): The route handler.
+
+    Returns:
+    bool: True if one of its parameters is Depends(get_session) and the
+    handler is not marked with keepSync.
+    """
+    if getattr(endpoint, "keep_sync", False):
+        return False
+    for param in inspect.signature(endpoint).parameters.values():
+        if getattr(param.default, "dependency", None) is get_session:
+            return True
+    return False
+
+
+def asyncEndpoint(endpoint):
+    """
+    Build the async def version of a sync route handler.
+
+    The handler keeps its parameters, except that `session` is now an
+    AsyncSession from get_async_session. The original body runs through
+    AsyncSession.run_sync: it is still the blocking ORM code, run in a
+    greenlet on the event loop with the session's single connection. Its
+    queries go through the async driver, but everything else the handler
+    does (building ORM objects, serializing) holds the event loop and
+    delays the other requests meanwhile. The hot read endpoints have a
+    native async version instead (see asyncVersionOf).
+
+    Parameters:
+    endpoint (Callable): A sync handler with a `session` parameter.
+
+    Returns:
+    Callable: An async handler with the same path, query and body parameters.
+    """
+    signature = inspect.signature(endpoint)
+    parameters = [
+        param.replace(annotation=AsyncSession, default=Depends(get_async_session))
+        if getattr(param.default, "dependency", None) is get_session else param
+        for param in signature.parameters.values()
+    ]
+    session_names = [
+        param.name for param in signature.parameters.values()
+        if getattr(param.default, "dependency", None) is get_session
+    ]
+
+    async def async_endpoint(**kwargs):
+        async_session = kwargs[session_names[0]]
+
+        def run(sync_session):
+            for name in session_names:
+                kwargs[name] = sync_session
+            return endpoint(**kwargs)
+
+        return await async_session.run_sync(run)
+
+    async_endpoint.__signature__ = signature.replace(parameters=parameters)
+    async_endpoint.__name__ = endpoint.__name__
+    async_endpoint.__qualname__ = endpoint.__qualname__
+    async_endpoint.__doc__ = endpoint.__doc__
+    async_endpoint.__module__ = endpoint.__module__
+    return async_endpoint
+
+
+def copyRouter(router: APIRouter, transform) -> APIRouter:
+    """
+    Create a copy of a router with every endpoint passed through `transform`.
+
+    Parameters:
+    router (APIRouter): The router to copy.
+    transform (Callable): Takes a route handler and returns the one to register.
+
+    Returns:
+    APIRouter: A router with the same paths, methods and tags.
+    """
+    copy = APIRouter()
+    for route in router.routes:
+        if not isinstance(route, APIRoute):
+            copy.routes.append(route)
+            continue
+        copy.add_api_route(
+            route.path,
+            transform(route.endpoint),
+            methods=list(route.methods),
+            tags=route.tags,
+            name=route.name,
+            summary=route.summary,
+            description=route.description,
+            status_code=route.status_code,
+            response_class=route.response_class,
+            response_model=route.response_model,
+            dependencies=route.dependencies,
+            include_in_schema=route.include_in_schema,
+        )
+    return copy
+
+
+def asyncRouter(router: APIRouter) -> APIRouter:
+    """
+    Create an async copy of a router.
+
+    Every route that depends on get_session is registered again with its
+    async version: the one registered with asyncVersionOf if there is one,
+    otherwise the run_sync wrapper of asyncEndpoint. The rest are copied
+    unchanged.
+
+    Parameters:
+    router (APIRouter): One of the sync routers (tables, books, customer).
+
+    Returns:
+    APIRouter: A router with the same paths, methods and tags.
+    """
+    def transform(endpoint):
+        if not uses_session(endpoint):
+            return endpoint
+        return getattr(endpoint, "async_version", None) or asyncEndpoint(endpoint)
+    return copyRouter(router, transform)
@@ -1,47 +1,198 @@
-from fastapi import APIRouter,Depends
-from fastapi.responses import JSONResponse,Response
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import text
+from datetime import datetime
+from typing import List, Literal, Optional
+from fastapi import APIRouter,Body,Depends,Header,Query
+from fastapi.responses import Response
+from sqlalchemy import select, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.models.pydanticModels import BookCreate,BookUpdate
-from app.database.connection import get_session
-from app.models.modelsDB import Table,Customer,Book
-from app.models.utilities import pydanticBookToAlchemy
+from app.responses import JSONResponse
+from app.models.pydanticModels import BookCreate,BookUpdate,PartyAllocation
+from app.database.connection import SessionLocal, get_async_session, get_session
+from app import config
+from app.services import cache, versions
+from app.services.writer import GroupCommitWriter, WriterStopped
+from app.services.allocation import allocate
+from app.services.availability import addBooks, lockTable, overlappingBook
+from app.models.modelsDB import Table,Customer,Book,ArchivedBook
+from app.models.utilities import pydanticBookToAlchemy, bookingEnd, keysetPage, keepSync, keepSyncWhen, exportResponse, bulkResponse, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_BULK_SIZE, BOOK_COLUMNS
+from app.models.utilities import BOOK_EXPANSIONS, ARCHIVED_BOOK_COLUMNS, parseExpand, eagerOptions, modelToDict, mergedPage
+from app.models.utilities import asyncVersionOf
 
 book = APIRouter()
 
+
+def commitBookBatch(books_data: list) -> list:
+    """
+    Write a batch of reservations queued by add_book in one transaction.
+
+    Parameters:
+    books_data (list): The BookCreate items, in arrival order.
+
+    Returns:
+    list: One (status code, content) pair per item, as add_book responds.
+    """
+    session = SessionLocal()
+    try:
+        accepted, errors = addBooks(session, [pydanticBookToAlchemy(item) for item in books_data])
+        session.commit()
+        results = [None] * len(books_data)
+        for index, item, customer_name in accepted:
+            results[index] = (201, {
+                "message": "Se ha creado la reserva con éxito",
+                "reserva": {
+                    "id": item.id,
+                    "table_number": item.table_number,
+                    "Nombre Cliente": customer_name,
+                    "Fecha": item.time.isoformat(),
+                    "Fin": item.end_time.isoformat()
+                }
+            })
+        for error in errors:
+            results[error["index"]] = (error["status"], {"message": error["message"]})
+        return results
+    except IntegrityError:
+        session.rollback()
+        if len(books_data) > 1:
+            raise
+        return [(409, {"message": "La mesa ya está reservada en ese horario"})]
+    finally:
+        session.close()
+
+
+bookWriter = GroupCommitWriter(commitBookBatch, config.GROUP_COMMIT_MAX_BATCH, config.GROUP_COMMIT_WAIT_MS / 1000)
+
+
+def bookFilters(model, start=None, end=None, table_number=None, customer_id=None) -> list:
+    """
+    Build the WHERE conditions of the reservation filters for Book or ArchivedBook.
+    """
+    conditions = []
+    if start is not None:
+        conditions.append(model.time >= start)
+    if end is not None:
+        conditions.append(model.time < end)
+    if table_number is not None:
+        conditions.append(model.table_number == table_number)
+    if customer_id is not None:
+        conditions.append(model.customer_id == customer_id)
+    return conditions
+
+
+def markArchived(rows: list, archived: bool) -> list:
+    for row in rows:
+        row["archived"] = archived
+    return rows
+
 @book.get('/books', tags=['Books'])
-def get_books(session : Session = Depends(get_session)):
+def get_books(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    table_number: Optional[int] = None,
+    customer_id: Optional[str] = None,
+    expand: Optional[str] = Query(None, description="Relaciones a incluir: table,customer"),
+    include_archived: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    session : Session = Depends(get_session)):
     """
-    Retrieve all book reservations.
+    Retrieve one page of book reservations.
 
     Parameters:
+    limit (int): Maximum number of reservations in the page.
+    after (int, optional): The `next_after` cursor of the previous page.
+    start (datetime, optional): Only reservations at or after this time.
+    end (datetime, optional): Only reservations before this time.
+    table_number (int, optional): Only reservations for this table.
+    customer_id (str, optional): Only reservations for this customer.
+    expand (str, optional): "table", "customer" or "table,customer" to embed the
+        related table and/or customer in each reservation. They are joined into the
+        same query, so the page still takes a single SELECT.
+    include_archived (bool): Also return the reservations moved to books_archive.
+        Both tables are paged by id and merged; each reservation gets an
+        "archived" field and the archived ones their "archived_at".
+    if_none_match (str, optional): ETag of a previous response; if the reservations
+        have not changed since, a 304 is returned after reading only the versions.
     session (Session): A database session object provided by FastAPI Depends.
 
     Returns:
-    dict: A dictionary containing a list of all book reservations.
+    JSONResponse: A JSON response containing the page of reservations and the cursor for the next page.
     """
     try:
-        result = session.execute(text("SELECT * FROM books"))
-        column_names = [desc[0] for desc in result.cursor.description]
+        try:
+            expanded = parseExpand(expand, BOOK_EXPANSIONS)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"message": str(e)})
 
-        books = []
+        current = versions.etag("books", *[BOOK_EXPANSIONS[name] for name in expanded])
+        if versions.matches(if_none_match, current):
+            return Response(status_code=304, headers={"ETag": current})
 
-        for row in result:
-            table_dict = {column_names[i]: value for i, value in enumerate(row)}
-            books.append(table_dict)
+        filters = (start, end, table_number, customer_id)
+        if expanded:
+            statement = select(Book).options(*eagerOptions(Book, expanded))
+        else:
+            statement = select(*BOOK_COLUMNS)
+        statement = statement.where(*bookFilters(Book, *filters))
 
-        return {"books":books}
+        serialize = (lambda obj: modelToDict(obj, expanded)) if expanded else None
+        books, next_after = keysetPage(session, statement, Book.id, limit, after, serialize)
+
+        if include_archived:
+            if expanded:
+                archived = select(ArchivedBook).options(*eagerOptions(ArchivedBook, expanded))
+            else:
+                archived = select(*ARCHIVED_BOOK_COLUMNS, ArchivedBook.archived_at)
+            archived = archived.where(*bookFilters(ArchivedBook, *filters))
+            archived_books, archived_after = keysetPage(session, archived, ArchivedBook.id, limit, after, serialize)
+            books, next_after = mergedPage(
+                [(markArchived(books, False), next_after), (markArchived(archived_books, True), archived_after)], limit)
+
+        return JSONResponse(status_code=200, headers={"ETag": current}, content={"books":books, "next_after":next_after})
     except Exception as e:
         return JSONResponse(status_code=500, content={"message":f"Ha ocurrido un error: {str(e)}"})
     finally:
         session.close()
 
+@book.get('/books/export', tags=['Books'])
+@keepSync
+def export_books(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    include_archived: bool = False,
+    session: Session = Depends(get_session)):
+    """
+    Export every book reservation as a stream.
+
+    Parameters:
+    format (str): "ndjson" (one JSON object per line) or "csv".
+    include_archived (bool): Also export the reservations in books_archive.
+    session (Session): A database session object provided by FastAPI Depends.
+
+    Returns:
+    StreamingResponse: The reservations, written in batches as they are read from the database.
+    """
+    try:
+        statement = select(*BOOK_COLUMNS)
+        if include_archived:
+            statement = union_all(statement, select(*ARCHIVED_BOOK_COLUMNS))
+        return exportResponse(session, statement.order_by("id"), format, "books")
+    except Exception as e:
+        session.close()
+        return JSONResponse(status_code=500, content={"message":f"Ha ocurrido un error: {str(e)}"})
+
 @book.post('/books', tags=['Books'])
+@keepSyncWhen(config.BOOKS_GROUP_COMMIT)
 def add_book(book_data: BookCreate, session: Session = Depends(get_session)):
     """
     Add a new book reservation.
 
+    With BOOKS_GROUP_COMMIT the reservation is queued to bookWriter and
+    committed together with the others that arrive within a few
+    milliseconds; the handler waits for its own result up to
+    GROUP_COMMIT_TIMEOUT_SECONDS and answers 503 after that or while the
+    server shuts down.
+
     Parameters:
     book_data (BookCreate): A Pydantic model representing the new book reservation data.
     session (Session): A database session object provided by FastAPI Depends.
@@ -50,7 +201,22 @@ def add_book(book_data: BookCreate, session: Session = Depends(get_session)):
     JSONResponse: A JSON response with a success message and the created book reservation data.
     """
     try:
-        table_exist = session.query(Table).filter(Table.number == book_data.table_number).first()
+        if config.BOOKS_GROUP_COMMIT:
+            try:
+                future = bookWriter.submit(book_data)
+                status, content = future.result(timeout=config.GROUP_COMMIT_TIMEOUT_SECONDS)
+            except WriterStopped:
+                return JSONResponse(status_code=503, headers={"Retry-After": "1"}, content={
+                    "message": "El servidor se está deteniendo, inténtalo de nuevo"})
+            except TimeoutError:
+                if future.cancel():
+                    message = "No se ha podido guardar la reserva a tiempo, inténtalo de nuevo"
+                else:
+                    message = "La reserva se está guardando todavía, consúltala antes de repetirla"
+                return JSONResponse(status_code=503, headers={"Retry-After": "1"}, content={"message": message})
+            return JSONResponse(status_code=status, content=content)
+
+        table_exist = lockTable(session, book_data.table_number)
         customer_exist = session.query(Customer).filter(Customer.idcustomer == book_data.customer_id).first()
         
         if not table_exist:
@@ -60,6 +226,10 @@ def add_book(book_data: BookCreate, session: Session = Depends(get_session)):
             return JSONResponse(status_code=404, content={"message": "No se ha encontrado un cliente con ese ID"})
         
         book_serialized = pydanticBookToAlchemy(book_data)
+        if overlappingBook(session, book_serialized.table_number, book_serialized.time, book_serialized.end_time):
+            session.rollback()
+            return JSONResponse(status_code=409, content={"message": "La mesa ya está reservada en ese horario"})
+
         session.add(book_serialized)
         session.commit()
         
@@ -71,40 +241,231 @@ def add_book(book_data: BookCreate, session: Session = Depends(get_session)):
                     "id": book_serialized.id,
                     "table_number": book_serialized.table_number,
                     "Nombre Cliente": customer_exist.name,
-                    "Fecha": book_serialized.time.isoformat()  # Convertir datetime a string
+                    "Fecha": book_serialized.time.isoformat(),  # Convertir datetime a string
+                    "Fin": book_serialized.end_time.isoformat()
                 }
             }
         )
+    except IntegrityError:
+        session.rollback()
+        return JSONResponse(status_code=409, content={"message": "La mesa ya está reservada en ese horario"})
     except Exception as e:
         print(e)
         return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
     finally:
         session.close()
 
+@book.post('/books/bulk', tags=['Books'])
+def add_books_bulk(
+    books_data: List[BookCreate] = Body(..., max_length=MAX_BULK_SIZE),
+    session: Session = Depends(get_session)):
+    """
+    Add many book reservations in a single transaction.
+
+    The batch is checked with three queries (tables, customers and
+    overlapping reservations, see availability.addBooks) and the accepted
+    reservations are inserted together in one commit.
+
+    Parameters:
+    books_data (List[BookCreate]): The reservations to add.
+    session (Session): A database session object provided by FastAPI Depends.
+
+    Returns:
+    JSONResponse: 201 if every reservation was added, 207 if some were rejected. The content
+    lists the created reservations and an error (with the item index) for each rejected one.
+    """
+    try:
+        books_serialized = [pydanticBookToAlchemy(item) for item in books_data]
+        if not books_serialized:
+            return bulkResponse([], [], 0)
+
+        accepted, errors = addBooks(session, books_serialized)
+        created = [{"index": index, "status": 201, "id": item.id, "table_number": item.table_number,
+                    "customer_id": item.customer_id, "time": item.time.isoformat(),
+                    "end_time": item.end_time.isoformat()} for index, item, _ in accepted]
+        session.commit()
+        return bulkResponse(created, errors, len(books_serialized))
+    except IntegrityError:
+        session.rollback()
+        return JSONResponse(status_code=409, content={"message": "La mesa ya está reservada en ese horario"})
+    except Exception as e:
+        session.rollback()
+        return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
+    finally:
+        session.close()
+
+@book.post('/books/allocate', tags=['Books'])
+def allocate_books(
+    parties: List[PartyAllocation] = Body(..., embed=True, max_length=MAX_BULK_SIZE),
+    commit: bool = False,
+    session: Session = Depends(get_session)):
+    """
+    Propose a table for each party in a batch (walk-ins, waitlist) by best fit on seats.
+
+    See allocation.allocate: every party gets the free table with the fewest
+    seats that fits it, at its time or up to max_wait minutes later, without
+    overlapping the existing reservations or each other.
+
+    Parameters:
+    parties (List[PartyAllocation]): The parties: customer, size, time and optionally
+        duration and max_wait.
+    commit (bool): Also create the proposed reservations, all in one transaction.
+        They are checked again with the tables locked (availability.addBooks); if
+        any is no longer possible nothing is created and the response is a 409
+        (or a 404 if a customer does not exist) with the failing parties.
+    session (Session): A database session object provided by FastAPI Depends.
+
+    Returns:
+    JSONResponse: The assignments (with the reservation ids when committed), the parties
+    left without a table and the total wasted seats; 201 if the reservations were created.
+    """
+    try:
+        assignments, unassigned = allocate(session, parties)
+        if commit and assignments:
+            books_serialized = [
+                Book(table_number=item["table_number"], customer_id=item["customer_id"],
+                     time=item["time"], end_time=item["end_time"]) for item in assignments]
+            accepted, errors = addBooks(session, books_serialized)
+            if errors:
+                session.rollback()
+                status = 409 if any(error["status"] == 409 for error in errors) else 404
+                return JSONResponse(status_code=status, content={
+                    "message": "No se ha creado ninguna reserva",
+                    "errors": [{"index": assignments[error["index"]]["index"], "message": error["message"]}
+                               for error in errors]})
+            session.commit()
+            for assignment, (_, item, _) in zip(assignments, accepted):
+                assignment["id"] = item.id
+        for assignment in assignments:
+            assignment["time"] = assignment["time"].isoformat()
+            assignment["end_time"] = assignment["end_time"].isoformat()
+        committed = commit and bool(assignments)
+        return JSONResponse(status_code=201 if committed else 200, content={
+            "assignments": assignments,
+            "unassigned": unassigned,
+            "wasted_seats": sum(assignment["wasted_seats"] for assignment in assignments),
+            "committed": committed,
+        })
+    except IntegrityError:
+        session.rollback()
+        return JSONResponse(status_code=409, content={"message": "La mesa ya está reservada en ese horario"})
+    except Exception as e:
+        session.rollback()
+        return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
+    finally:
+        session.close()
+
 @book.get('/books/{book_id}', tags=['Books'])
-def get_single_book(book_id: int, session: Session = Depends(get_session)):
+def get_single_book(
+    book_id: int,
+    expand: Optional[str] = Query(None, description="Relaciones a incluir: table,customer"),
+    include_archived: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    session: Session = Depends(get_session)):
     """
     Retrieve a single book reservation by its ID.
 
     Parameters:
     book_id (int): The ID of the book reservation.
+    expand (str, optional): "table", "customer" or "table,customer" to embed the related rows.
+    include_archived (bool): Also look in books_archive; the reservation then has an "archived" field.
+    if_none_match (str, optional): ETag of a previous response.
     session (Session): A database session object provided by FastAPI Depends.
 
     Returns:
-    JSONResponse: A JSON response with a success message and the requested book reservation data.
+    JSONResponse: A JSON response with a success message and the requested book reservation data,
+    or an empty 304 response if the reservations have not changed since the ETag in If-None-Match.
     """
     try:
-        get_book = session.query(Book).filter(Book.id == book_id).first()
-        if not get_book:
+        try:
+            expanded = parseExpand(expand, BOOK_EXPANSIONS)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"message": str(e)})
+
+        current = versions.etag("books", *[BOOK_EXPANSIONS[name] for name in expanded])
+        if versions.matches(if_none_match, current):
+            return Response(status_code=304, headers={"ETag": current})
+
+        if expanded:
+            get_book = session.execute(
+                select(Book).where(Book.id == book_id).options(*eagerOptions(Book, expanded))
+            ).scalar()
+            book_serialized = modelToDict(get_book, expanded) if get_book else None
+        else:
+            book_serialized = cache.caches["books"].get(book_id)
+            if book_serialized is None:
+                get_book = session.query(Book).filter(Book.id == book_id).first()
+                if get_book:
+                    book_serialized = modelToDict(get_book)
+                    cache.caches["books"].set(book_id, book_serialized)
+
+        if include_archived:
+            if book_serialized is not None:
+                book_serialized = dict(book_serialized, archived=False)
+            else:
+                archived = session.execute(
+                    select(ArchivedBook).where(ArchivedBook.id == book_id).options(*eagerOptions(ArchivedBook, expanded))
+                ).scalar()
+                if archived:
+                    book_serialized = dict(modelToDict(archived, expanded), archived=True)
+
+        if book_serialized is None:
             return JSONResponse(status_code=404, content={"message": "No se ha encontrado una reserva con ese ID"})
-        
-        book_serialized = jsonable_encoder(get_book)
-        return JSONResponse(status_code=200, content={"message": "Reserva encontrada con exito", "reserva": book_serialized})
+        return JSONResponse(status_code=200, headers={"ETag": current}, content={"message": "Reserva encontrada con exito", "reserva": book_serialized})
     except Exception as e:
         return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
     finally:
         session.close()
 
+
+@asyncVersionOf(get_single_book)
+async def get_single_book_async(
+    book_id: int,
+    expand: Optional[str] = Query(None, description="Relaciones a incluir: table,customer"),
+    include_archived: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session)):
+    """
+    Async mode version of get_single_book: its queries are awaited.
+    """
+    try:
+        try:
+            expanded = parseExpand(expand, BOOK_EXPANSIONS)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"message": str(e)})
+
+        current = versions.etag("books", *[BOOK_EXPANSIONS[name] for name in expanded])
+        if versions.matches(if_none_match, current):
+            return Response(status_code=304, headers={"ETag": current})
+
+        book_serialized = None if expanded else cache.caches["books"].get(book_id)
+        if book_serialized is None:
+            get_book = (await session.execute(
+                select(Book).where(Book.id == book_id).options(*eagerOptions(Book, expanded))
+            )).scalar()
+            if get_book:
+                book_serialized = modelToDict(get_book, expanded)
+                if not expanded:
+                    cache.caches["books"].set(book_id, book_serialized)
+
+        if include_archived:
+            if book_serialized is not None:
+                book_serialized = dict(book_serialized, archived=False)
+            else:
+                archived = (await session.execute(
+                    select(ArchivedBook).where(ArchivedBook.id == book_id).options(*eagerOptions(ArchivedBook, expanded))
+                )).scalar()
+                if archived:
+                    book_serialized = dict(modelToDict(archived, expanded), archived=True)
+
+        if book_serialized is None:
+            return JSONResponse(status_code=404, content={"message": "No se ha encontrado una reserva con ese ID"})
+        return JSONResponse(status_code=200, headers={"ETag": current}, content={"message": "Reserva encontrada con exito", "reserva": book_serialized})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
+    finally:
+        await session.close()
+
 @book.delete('/books/{book_id}', tags=['Books'])
 def delete_book(book_id: int, session: Session = Depends(get_session)):
     """
@@ -148,22 +509,35 @@ def update_book(book_id: int,book_upd:BookUpdate, session: Session = Depends(get
         if not get_book:
             return JSONResponse(status_code=404, content={"message": "No se ha encontrado una reserva con ese ID"})
         
-        get_customer = session.query(Customer).filter(Customer.idcustomer == book_upd.customer_id).first()
-        if not get_customer:
-            return JSONResponse(status_code=404, content={"message": "No se ha encontrado un cliente con ese ID"})
+        if book_upd.customer_id is not None:
+            get_customer = session.query(Customer).filter(Customer.idcustomer == book_upd.customer_id).first()
+            if not get_customer:
+                return JSONResponse(status_code=404, content={"message": "No se ha encontrado un cliente con ese ID"})
         
-        get_table = session.query(Table).filter(Table.number == book_upd.table_number).first()
+        table_number = book_upd.table_number if book_upd.table_number is not None else get_book.table_number
+        get_table = lockTable(session, table_number)
         if not get_table:
             return JSONResponse(status_code=404, content={"message": "No se ha encontrado una mesa con ese número"})
         
         update_data = book_upd.model_dump(exclude_unset=True)
+        duration = update_data.pop("duration", None)
+        if duration is None:
+            duration = int((get_book.end_time - get_book.time).total_seconds() // 60)
 
         for key,value in dict(update_data).items():
             setattr(get_book, key, value)
+        get_book.end_time = bookingEnd(get_book.time, duration)
+
+        if overlappingBook(session, get_book.table_number, get_book.time, get_book.end_time, exclude_id=get_book.id):
+            session.rollback()
+            return JSONResponse(status_code=409, content={"message": "La mesa ya está reservada en ese horario"})
         
         session.commit()
         session.refresh(get_book)
         return JSONResponse(status_code=200, content={"message": "Reserva actualizada con exito"})
+    except IntegrityError:
+        session.rollback()
+        return JSONResponse(status_code=409, content={"message": "La mesa ya está reservada en ese horario"})
     except Exception as e:
         return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
     finally:
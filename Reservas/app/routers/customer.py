@@ -1,44 +1,72 @@
-from typing import Union
-from fastapi import APIRouter,Depends,Response
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
+from typing import List, Literal, Optional, Union
+from fastapi import APIRouter,Body,Depends,Header,Query,Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from app.responses import JSONResponse
+from sqlalchemy import or_, select
 from app.models.pydanticModels import CustomerCreate,CustomerUpdate
 from app.models.modelsDB import Customer
-from app.models.utilities import pydanticCustomerToAlchemy
-from app.database.connection import get_session
+from app.models.utilities import pydanticCustomerToAlchemy, keysetPage, keepSync, exportResponse, bulkResponse, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_BULK_SIZE, CUSTOMER_COLUMNS
+from app.models.utilities import CUSTOMER_EXPANSIONS, parseExpand, eagerOptions, modelToDict, rowDicts, asyncVersionOf
+from app.database.connection import get_async_session, get_session
+from app.services import cache, search, versions
 
 customer = APIRouter()
 
 
 @customer.get("/customers", tags=['Customer'])
-def read_customers(session : Session = Depends(get_session)) -> dict:
+def read_customers(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
+    session : Session = Depends(get_session)) -> Response:
     """
-    Retrieve all customers from the database.
+    Retrieve one page of customers from the database.
 
     Parameters:
+    limit (int): Maximum number of customers in the page.
+    after (int, optional): The `next_after` cursor of the previous page.
+    if_none_match (str, optional): ETag of a previous response; if the customers
+        have not changed since, a 304 is returned after reading only the versions.
     session (Session): A database session object provided by FastAPI Depends.
 
     Returns:
-    dict: A dictionary containing a list of customers.
+    JSONResponse: A JSON response containing the page of customers and the cursor for the next page.
     """
     try:
-        result = session.execute(text("SELECT * FROM customers"))
-        column_names = [desc[0] for desc in result.cursor.description]
+        current = versions.etag("customers")
+        if versions.matches(if_none_match, current):
+            return Response(status_code=304, headers={"ETag": current})
 
-        customers = []
-        for row in result:
-            customer_dict = {column_names[i]: value for i, value in enumerate(row)}
-            customers.append(customer_dict)
+        customers, next_after = keysetPage(session, select(*CUSTOMER_COLUMNS), Customer.id, limit, after)
 
-        return {"customers":customers}
+        return JSONResponse(status_code=200, headers={"ETag": current}, content={"customers":customers, "next_after":next_after})
     except Exception as e:
         return JSONResponse(status_code=500, content={"message":f"Ha ocurrido un error: {str(e)}"})
     finally:
         session.close()
 
 
+@customer.get("/customers/export", tags=['Customer'])
+@keepSync
+def export_customers(format: Literal["ndjson", "csv"] = "ndjson", session : Session = Depends(get_session)):
+    """
+    Export every customer as a stream.
+
+    Parameters:
+    format (str): "ndjson" (one JSON object per line) or "csv".
+    session (Session): A database session object provided by FastAPI Depends.
+
+    Returns:
+    StreamingResponse: The customers, written in batches as they are read from the database.
+    """
+    try:
+        return exportResponse(session, select(*CUSTOMER_COLUMNS).order_by(Customer.id), format, "customers")
+    except Exception as e:
+        session.close()
+        return JSONResponse(status_code=500, content={"message":f"Ha ocurrido un error: {str(e)}"})
+
+
 @customer.post("/customers", tags=['Customer'])
 def add_customer(new_customer: CustomerCreate, session: Session = Depends(get_session)) -> JSONResponse:
     """
@@ -60,7 +88,7 @@ def add_customer(new_customer: CustomerCreate, session: Session = Depends(get_se
                 "message":"Ya existe un cliente con ese ID"
                 })
         
-        session.add(customer)
+        session.add(customer_serialized)
         session.commit()
         return JSONResponse(status_code=201, 
                             content={"message":"Cliente creado con exito",
@@ -78,31 +106,196 @@ def add_customer(new_customer: CustomerCreate, session: Session = Depends(get_se
         session.close()
 
 
+@customer.post("/customers/bulk", tags=['Customer'])
+def add_customers_bulk(
+    new_customers: List[CustomerCreate] = Body(..., max_length=MAX_BULK_SIZE),
+    session: Session = Depends(get_session)) -> JSONResponse:
+    """
+    Add many customers in a single transaction.
+
+    The IDs and emails already in use are looked up with one query for the
+    whole batch and the new customers are inserted together in one commit.
+
+    Parameters:
+    new_customers (List[CustomerCreate]): The customers to add.
+    session (Session): A database session object provided by FastAPI Depends.
+
+    Returns:
+    JSONResponse: 201 if every customer was added, 207 if some were rejected. The content
+    lists the created customers and an error (with the item index) for each rejected one.
+    """
+    try:
+        customers_serialized = [pydanticCustomerToAlchemy(new_customer) for new_customer in new_customers]
+        ids = {item.idcustomer for item in customers_serialized}
+        emails = {item.email for item in customers_serialized}
+        taken_ids, taken_emails = set(), set()
+        for idcustomer, email in session.execute(
+            select(Customer.idcustomer, Customer.email).where(or_(Customer.idcustomer.in_(ids), Customer.email.in_(emails)))
+        ):
+            taken_ids.add(idcustomer)
+            taken_emails.add(email)
+
+        accepted, errors = [], []
+        for index, item in enumerate(customers_serialized):
+            if item.idcustomer in taken_ids:
+                errors.append({"index": index, "status": 409, "message": "Ya existe un cliente con ese ID"})
+                continue
+            if item.email in taken_emails:
+                errors.append({"index": index, "status": 409, "message": "Ya existe un cliente con ese email"})
+                continue
+            taken_ids.add(item.idcustomer)
+            taken_emails.add(item.email)
+            accepted.append((index, item))
+
+        session.add_all([item for _, item in accepted])
+        session.commit()
+        return bulkResponse(
+            [{"index": index, "status": 201, "idCustomer": item.idcustomer, "name": item.name, "email": item.email, "tel": item.tel}
+             for index, item in accepted],
+            errors, len(customers_serialized))
+    except Exception as e:
+        session.rollback()
+        return JSONResponse(status_code=500, content={"message":f"Ha ocurrido un error: {str(e)}"})
+    finally:
+        session.close()
+
+
+@customer.get("/customers/search", tags=['Customer'])
+def search_customers(
+    q: str = Query(..., max_length=100, description="Parte del nombre, email o teléfono"),
+    limit: int = Query(10, ge=1, le=100),
+    if_none_match: Optional[str] = Header(None),
+    session: Session = Depends(get_session)) -> Response:
+    """
+    Find customers by part of their name, email or phone number.
+
+    Every word of `q` has to appear in one of the three fields (accents and
+    case are ignored, and phone numbers match without separators). It runs
+    in the database, on pg_trgm indexes in Postgres, or on the in-memory
+    trigram index of app.services.search with CUSTOMER_SEARCH_BACKEND=memory.
+
+    Parameters:
+    q (str): What the user typed; at least one word of three characters.
+    limit (int): Maximum number of customers returned.
+    if_none_match (str, optional): ETag of a previous response.
+    session (Session): A database session object provided by FastAPI Depends.
+
+    Returns:
+    JSONResponse: The matching customers, best match first (by trigram
+    similarity on Postgres, shortest name on other databases, whole field,
+    then prefix, then anywhere in memory), or an empty 304 response if the
+    customers have not changed.
+    """
+    try:
+        current = versions.etag("customers")
+        if versions.matches(if_none_match, current):
+            return Response(status_code=304, headers={"ETag": current})
+
+        try:
+            ids = search.search(session, q, limit)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"message": str(e)})
+
+        rows = rowDicts(session.execute(select(*CUSTOMER_COLUMNS).where(Customer.id.in_(ids)))) if ids else []
+        position = {customer_id: rank for rank, customer_id in enumerate(ids)}
+        rows.sort(key=lambda row: position[row["id"]])
+        return JSONResponse(status_code=200, headers={"ETag": current}, content={"customers": rows})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
+    finally:
+        session.close()
+
+
 @customer.get("/customers/{idCustomer}", tags=['Customer'])
-def get_single_client(idCustomer:str,session:Session = Depends(get_session)) -> JSONResponse:
+def get_single_client(
+    idCustomer:str,
+    expand: Optional[str] = Query(None, description="Relaciones a incluir: reservations"),
+    if_none_match: Optional[str] = Header(None),
+    session:Session = Depends(get_session)) -> Response:
     """
     Retrieve a single customer from the database by their ID.
 
     Parameters:
     idCustomer (str): The ID of the customer to retrieve.
+    expand (str, optional): "reservations" to embed the customer's reservations,
+        loaded with a single extra query.
+    if_none_match (str, optional): ETag of a previous response.
     session (Session): A database session object provided by FastAPI Depends.
 
     Returns:
-    JSONResponse: A JSON response with a success message and the retrieved customer.
+    JSONResponse: A JSON response with a success message and the retrieved customer,
+    or an empty 304 response if the customers have not changed since the ETag in If-None-Match.
     """
     try:
-        customer = session.query(Customer).filter(Customer.idcustomer == idCustomer).first()
-        if not customer:
-            return JSONResponse(status_code=404, content={"message":"No se ha encontrado un cliente con ese ID"})
-        customerSerialized = jsonable_encoder(customer)
-        return JSONResponse(status_code=200, content={"message":"Cliente encontrado con exito","customer":customerSerialized})
+        try:
+            expanded = parseExpand(expand, CUSTOMER_EXPANSIONS)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"message": str(e)})
+
+        current = versions.etag("customers", *[CUSTOMER_EXPANSIONS[name] for name in expanded])
+        if versions.matches(if_none_match, current):
+            return Response(status_code=304, headers={"ETag": current})
+
+        if expanded:
+            find_customer = session.execute(
+                select(Customer).where(Customer.idcustomer == idCustomer).options(*eagerOptions(Customer, expanded))
+            ).scalar()
+            if not find_customer:
+                return JSONResponse(status_code=404, content={"message":"No se ha encontrado un cliente con ese ID"})
+            return JSONResponse(status_code=200, headers={"ETag": current}, content={
+                "message":"Cliente encontrado con exito","customer":modelToDict(find_customer, expanded)})
+
+        customerSerialized = cache.caches["customers"].get(idCustomer)
+        if customerSerialized is None:
+            find_customer = session.query(Customer).filter(Customer.idcustomer == idCustomer).first()
+            if not find_customer:
+                return JSONResponse(status_code=404, content={"message":"No se ha encontrado un cliente con ese ID"})
+            customerSerialized = modelToDict(find_customer)
+            cache.caches["customers"].set(idCustomer, customerSerialized)
+        return JSONResponse(status_code=200, headers={"ETag": current}, content={"message":"Cliente encontrado con exito","customer":customerSerialized})
     except Exception as e:
         return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
     finally:
         session.close()
 
 
-@customer.delete("/customers/{idCustomer}", tags=['Customer'])
+@asyncVersionOf(get_single_client)
+async def get_single_client_async(
+    idCustomer:str,
+    expand: Optional[str] = Query(None, description="Relaciones a incluir: reservations"),
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session)) -> Response:
+    """
+    Async mode version of get_single_client: its queries are awaited.
+    """
+    try:
+        try:
+            expanded = parseExpand(expand, CUSTOMER_EXPANSIONS)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"message": str(e)})
+
+        current = versions.etag("customers", *[CUSTOMER_EXPANSIONS[name] for name in expanded])
+        if versions.matches(if_none_match, current):
+            return Response(status_code=304, headers={"ETag": current})
+
+        customerSerialized = None if expanded else cache.caches["customers"].get(idCustomer)
+        if customerSerialized is None:
+            find_customer = (await session.execute(
+                select(Customer).where(Customer.idcustomer == idCustomer).options(*eagerOptions(Customer, expanded))
+            )).scalar()
+            if not find_customer:
+                return JSONResponse(status_code=404, content={"message":"No se ha encontrado un cliente con ese ID"})
+            customerSerialized = modelToDict(find_customer, expanded)
+            if not expanded:
+                cache.caches["customers"].set(idCustomer, customerSerialized)
+        return JSONResponse(status_code=200, headers={"ETag": current}, content={"message":"Cliente encontrado con exito","customer":customerSerialized})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
+    finally:
+        await session.close()
+
+
+@customer.delete("/customers/{idCustomer}", tags=['Customer'], response_model=None)
 def delete_customer(id_customer: str, session: Session = Depends(get_session)) -> Union[Response, JSONResponse]:
     """
     Delete a customer from the database by their ID.
@@ -123,7 +316,7 @@ def delete_customer(id_customer: str, session: Session = Depends(get_session)) -
                 "message": "No se ha encontrado un cliente con ese ID"
                 })
         
-        session.delete(customer)
+        session.delete(find_customer)
         session.commit()
 
         return Response(status_code=204)
@@ -154,11 +347,15 @@ def update_customer(id_customer:str, customer_upd:CustomerUpdate,session : Sessi
         if not find_customer:
             return JSONResponse(status_code=404, content={"message":"No se ha encontrado un cliente con ese ID"})
         
-        for key,value in dict(customer_upd).items():
-            setattr(customer, key, value)
+        update_data = customer_upd.model_dump(exclude_unset=True)
+        if "idCustomer" in update_data:
+            update_data["idcustomer"] = update_data.pop("idCustomer")
+
+        for key,value in update_data.items():
+            setattr(find_customer, key, value)
 
         session.commit()
-        session.refresh(customer)
+        session.refresh(find_customer)
 
         return JSONResponse(status_code=200, content={"message": "Cliente actualizado con exito"})
     
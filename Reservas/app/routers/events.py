@@ -0,0 +1,67 @@
+from typing import Optional
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import StreamingResponse
+from app.responses import JSONResponse, dumps
+from app.services import feed
+from app import config
+
+events = APIRouter()
+
+# Milisegundos que espera el navegador antes de reconectar.
+RECONNECT_MS = 3000
+
+
+def formatEvent(event_id: str, name: str, data: dict) -> bytes:
+    return b"id: " + event_id.encode() + b"\nevent: " + name.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+@events.get("/events", tags=['Events'], response_class=StreamingResponse)
+async def stream_events(
+    entities: str = Query(",".join(feed.ENTITIES)),
+    last_event_id: Optional[str] = Query(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")):
+    """
+    Stream the committed changes to tables, customers and books as Server-Sent Events.
+
+    Each event is named after its collection ("tables", "customers" or
+    "books") and carries {"action": "create" | "update" | "delete" |
+    "archive", "data": the row}; "archive" is a past reservation moved to
+    the archive, not a cancellation. A client that reconnects with Last-Event-ID (browsers send it
+    on their own) first receives the events it missed; if they are no longer
+    available it gets a "reset" event and should reload the collections.
+    A comment is sent every EVENTS_HEARTBEAT_SECONDS to keep the connection open.
+
+    Parameters:
+    entities (str): Comma-separated collections to receive; all by default.
+    last_event_id (str, optional): Resume after this event id (for clients
+        that cannot send the header).
+    last_event_id_header (str, optional): The Last-Event-ID header.
+
+    Returns:
+    StreamingResponse: A text/event-stream that stays open until the client leaves.
+    """
+    selected = {name.strip() for name in entities.split(",") if name.strip()}
+    if not selected or not selected <= set(feed.ENTITIES):
+        return JSONResponse(status_code=400, content={
+            "message": f"Las colecciones válidas son: {', '.join(feed.ENTITIES)}"})
+
+    async def stream():
+        subscriber = feed.broker.subscribe(selected, last_event_id_header or last_event_id)
+        try:
+            yield f"retry: {RECONNECT_MS}\n\n".encode()
+            if subscriber.reset_id:
+                yield formatEvent(subscriber.reset_id, "reset", {})
+            while True:
+                try:
+                    event = await subscriber.next(config.EVENTS_HEARTBEAT_SECONDS)
+                except OverflowError:
+                    return
+                if event is None:
+                    yield b": keep-alive\n\n"
+                else:
+                    yield formatEvent(event.event_id, event.entity, {"action": event.action, "data": event.data})
+        finally:
+            feed.broker.unsubscribe(subscriber)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,78 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services import admission, cache, feed, metrics, occupancy, search
+
+monitoring = APIRouter()
+
+
+@monitoring.get("/cache/stats", tags=['Monitoring'])
+def cache_stats() -> dict:
+    """
+    Retrieve the counters of the entity caches.
+
+    Returns:
+    dict: For each cache (tables, customers, books) its size, limits and
+    hit, miss, eviction, expiration and invalidation counters.
+    """
+    return {"caches": cache.stats()}
+
+
+@monitoring.get("/occupancy/stats", tags=['Monitoring'])
+def occupancy_stats() -> dict:
+    """
+    Retrieve the size of the occupancy bitmap.
+
+    Returns:
+    dict: Days and tables held, shared slots and the memory used in bytes.
+    """
+    return {"occupancy": occupancy.bitmap.stats()}
+
+
+@monitoring.get("/search/stats", tags=['Monitoring'])
+def search_stats() -> dict:
+    """
+    Retrieve the size of the in-memory customer search index.
+
+    Returns:
+    dict: Customers indexed, distinct trigrams, postings and their memory in bytes
+    (all zero when the search runs on Postgres).
+    """
+    return {"search": search.index.stats()}
+
+
+@monitoring.get("/admission/stats", tags=['Monitoring'])
+def admission_stats() -> dict:
+    """
+    Retrieve the state of the admission control.
+
+    Returns:
+    dict: The concurrency limit, requests running and queued, the rate
+    limits per route class, the clients tracked and the queued and
+    rejected counters (by reason and route class).
+    """
+    return {"admission": admission.stats()}
+
+
+@monitoring.get("/events/stats", tags=['Monitoring'])
+def events_stats() -> dict:
+    """
+    Retrieve the state of the change feed.
+
+    Returns:
+    dict: Open streams, events published, the last event id and the events
+    kept for resuming.
+    """
+    return {"events": feed.broker.stats()}
+
+
+@monitoring.get("/metrics", tags=['Monitoring'], response_class=PlainTextResponse)
+def prometheus_metrics() -> PlainTextResponse:
+    """
+    Expose the request, SQL and connection pool metrics of this process.
+
+    Returns:
+    PlainTextResponse: The metrics in the Prometheus text exposition format:
+    latency histograms and status counts per route, SQL statements and
+    database time per request, pool checkout wait and connections in use.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+from app.database.connection import get_session
+from app.responses import JSONResponse
+from app.services import rollups, versions
+
+reports = APIRouter()
+
+
+@reports.get("/reports/utilization", tags=['Reports'])
+def utilization_report(
+    start: datetime = Query(..., alias="from"),
+    end: datetime = Query(..., alias="to"),
+    granularity: Literal["hour", "day"] = "day",
+    if_none_match: Optional[str] = Header(None),
+    session: Session = Depends(get_session)):
+    """
+    Report covers, table utilization and no-shows per hour or per day.
+
+    The report is read from the utilization_rollups rows, at most
+    MAX_BUCKETS whatever the number of reservations, plus the
+    utilization_deltas of the last writes that the workers have not folded
+    into them yet. Archived reservations are included.
+
+    Parameters:
+    start (datetime): "from", the first hour or day of the report.
+    end (datetime): "to", the end of the report (exclusive).
+    granularity (str): "hour" or "day".
+    if_none_match (str, optional): ETag of a previous response.
+    session (Session): A database session object provided by FastAPI Depends.
+
+    Returns:
+    JSONResponse: The capacity of the restaurant, one entry per hour or day with
+    reservations, covers, no_shows, no_show_rate, utilization and seat_utilization,
+    and the totals of the range; 400 if the range is empty or too long.
+    """
+    try:
+        current = versions.etag("books", "tables")
+        if versions.matches(if_none_match, current):
+            return Response(status_code=304, headers={"ETag": current})
+        try:
+            content = rollups.report(session, start, end, granularity)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"message": str(e)})
+        return JSONResponse(status_code=200, headers={"ETag": current}, content=content)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
+    finally:
+        session.close()
@@ -1,48 +1,108 @@
-from typing import Union
-from fastapi import APIRouter, Depends, Response
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Union
+from fastapi import APIRouter, Body, Depends, Header, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from app.models.pydanticModels import TableCreate, SeatsUpdate
-from app.models.modelsDB import Table
-from app.database.connection import get_session
-from app.models.utilities import pydanticTableToAlchemy
+from app.responses import JSONResponse
+from sqlalchemy import Boolean, bindparam, exists, func, select
+from app.models.pydanticModels import MAX_MINUTES, TableCreate, SeatsUpdate
+from app.models.modelsDB import Book, Table
+from app.database.connection import get_async_session, get_session
+from app.services import availability, cache, occupancy, versions
+from app import config
+from app.models.utilities import asyncVersionOf, keysetStatement, pageRows
+from app.models.utilities import modelToDict, pydanticTableToAlchemy, keysetPage, bulkResponse, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_BULK_SIZE, TABLE_COLUMNS, rowDicts
 
 
 table = APIRouter()
 
+# Se construye una vez y SQLAlchemy reutiliza su SQL compilado.
+ALL_TABLES = select(*TABLE_COLUMNS).order_by(Table.number)
+
+# /tablesFilter para momentos que el bitmap de ocupación no cubre. El momento
+# y el valor del filtro van como parámetros, así una sola sentencia compilada
+# sirve para mesas ocupadas y libres; la subconsulta usa
+# ix_books_table_number_end_time.
+_OCCUPIED_AT = exists().where(
+    Book.table_number == Table.number, Book.time <= bindparam("at"), Book.end_time > bindparam("at"))
+FILTER_STATEMENT = (
+    select(Table.id, Table.number, Table.seats, _OCCUPIED_AT.label("is_occupied"))
+    .where(_OCCUPIED_AT == bindparam("occupied", type_=Boolean))
+    .order_by(Table.number)
+)
+
 
 @table.get("/tables", tags=['Tables'])
-def read_tables(session: Session = Depends(get_session)):
-    """This function retieves all the tables in the database
+def read_tables(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    min_seats: Optional[int] = Query(None, ge=1),
+    if_none_match: Optional[str] = Header(None),
+    session: Session = Depends(get_session)):
+    """This function retieves one page of the tables in the database
 
     Parameters:
+        limit (int): Maximum number of tables in the page.
+        after (int, optional): The `next_after` cursor of the previous page.
+        min_seats (int, optional): Only tables with at least this many seats.
+        if_none_match (str, optional): ETag of a previous response; if the tables
+            have not changed since, a 304 is returned after reading only the versions.
         session (Session, optional): [description]. Defaults to Depends(get_session).
 
     Returns:
-        A dictionary containing list of tables. Each table is represented 
+        A dictionary containing the page of tables and the cursor for the
+        next page (None on the last page). Each table is represented
         as a dictionary with colum names as kleys and values.
         If an error occurs during the database operation, a JSON response with
         an error message is returned.
     """
     try:
-        result = session.execute(text("SELECT * FROM tables"))
-        column_names = [desc[0] for desc in result.cursor.description]
+        current = versions.etag("tables")
+        if versions.matches(if_none_match, current):
+            return Response(status_code=304, headers={"ETag": current})
 
-        tables = []
-        for row in result:
-            table_dict = {column_names[i]
-                : value for i, value in enumerate(row)}
-            tables.append(table_dict)
+        statement = select(*TABLE_COLUMNS)
+        if min_seats is not None:
+            statement = statement.where(Table.seats >= min_seats)
 
-        return {"mesas": tables}
+        tables, next_after = keysetPage(session, statement, Table.id, limit, after)
+
+        return JSONResponse(status_code=200, headers={"ETag": current}, content={"mesas": tables, "next_after": next_after})
     except Exception as e:
         return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
     finally:
         session.close()
 
 
+@asyncVersionOf(read_tables)
+async def read_tables_async(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    min_seats: Optional[int] = Query(None, ge=1),
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session)):
+    """
+    Async mode version of read_tables: the page query is awaited.
+    """
+    try:
+        current = versions.etag("tables")
+        if versions.matches(if_none_match, current):
+            return Response(status_code=304, headers={"ETag": current})
+
+        statement = select(*TABLE_COLUMNS)
+        if min_seats is not None:
+            statement = statement.where(Table.seats >= min_seats)
+
+        result = await session.execute(keysetStatement(statement, Table.id, limit, after))
+        tables, next_after = pageRows(result, Table.id, limit)
+
+        return JSONResponse(status_code=200, headers={"ETag": current}, content={"mesas": tables, "next_after": next_after})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
+    finally:
+        await session.close()
+
+
 @table.post("/tables", tags=['Tables'])
 def add_table(table_create: TableCreate, session: Session = Depends(get_session)) -> JSONResponse:
     """
@@ -79,30 +139,144 @@ def add_table(table_create: TableCreate, session: Session = Depends(get_session)
         session.close()
 
 
+@table.post("/tables/bulk", tags=['Tables'])
+def add_tables_bulk(
+    tables_create: List[TableCreate] = Body(..., max_length=MAX_BULK_SIZE),
+    session: Session = Depends(get_session)) -> JSONResponse:
+    """
+    Adds many tables in a single transaction.
+
+    The existing numbers are looked up with one IN query for the whole batch
+    and the new tables are inserted together in one commit.
+
+    Parameters:
+    tables_create (List[TableCreate]): The tables to add.
+    session (Session, optional): The database session. Defaults to Depends(get_session).
+
+    Returns:
+    JSONResponse: 201 if every table was added, 207 if some were rejected. The content
+    lists the created tables and an error (with the item index) for each rejected one.
+    """
+    try:
+        new_tables = [pydanticTableToAlchemy(table_create) for table_create in tables_create]
+        existing = set(session.execute(
+            select(Table.number).where(Table.number.in_({new_table.number for new_table in new_tables}))
+        ).scalars())
+
+        accepted, errors = [], []
+        for index, new_table in enumerate(new_tables):
+            if new_table.number in existing:
+                errors.append({"index": index, "status": 409, "message": "Ya existe una mesa con ese numero"})
+                continue
+            existing.add(new_table.number)
+            accepted.append((index, new_table))
+
+        session.add_all([new_table for _, new_table in accepted])
+        session.commit()
+        return bulkResponse(
+            [{"index": index, "status": 201, "number": new_table.number, "seats": new_table.seats}
+             for index, new_table in accepted],
+            errors, len(new_tables))
+    except Exception as e:
+        session.rollback()
+        return JSONResponse(status_code=400, content={"message": f"Ha ocurrido un error: {str(e)}"})
+    finally:
+        session.close()
+
+
+@table.get("/tables/available", tags=['Tables'])
+def available_tables(
+    seats: int = Query(..., ge=1),
+    start: datetime = Query(...),
+    duration: int = Query(config.BOOKING_DURATION_MINUTES, ge=1, le=MAX_MINUTES, description="Duración en minutos"),
+    session: Session = Depends(get_session)):
+    """
+    Finds the tables that can seat a party during a time window.
+
+    Parameters:
+    seats (int): Size of the party; only tables with at least this many seats are considered.
+    start (datetime): Start of the window.
+    duration (int): Length of the window in minutes.
+    session (Session, optional): The database session. Defaults to Depends(get_session).
+
+    Returns:
+    dict: The free tables ordered by seats (best fit first), each one with its number and seats.
+    Reservations are checked against the in-memory availability index, not the books table.
+    """
+    try:
+        candidates = session.execute(
+            select(Table.number, Table.seats).where(Table.seats >= seats).order_by(Table.seats, Table.number)
+        ).all()
+        end = start + timedelta(minutes=duration)
+        free = set(availability.index.freeTables([number for number, _ in candidates], start, end))
+
+        return JSONResponse(status_code=200, content={"mesas": [{"number": number, "seats": table_seats}
+                                                           for number, table_seats in candidates if number in free]})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
+    finally:
+        session.close()
+
+
+@table.get("/tables/utilization", tags=['Tables'])
+def tables_utilization(day: date = Query(...), session: Session = Depends(get_session)):
+    """
+    Computes the share of table time booked in each hour of a day.
+
+    Parameters:
+    day (date): The day to report.
+    session (Session, optional): The database session. Defaults to Depends(get_session).
+
+    Returns:
+    JSONResponse: The day and a list of 24 values between 0 and 1, one per hour,
+    read from the in-memory occupancy bitmap, or computed from the reservations
+    (archived included) for the past days it does not hold.
+    """
+    try:
+        table_count = session.execute(select(func.count()).select_from(Table)).scalar()
+        return JSONResponse(status_code=200, content={
+            "day": day.isoformat(), "utilization": occupancy.utilization(session, day, table_count)})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": f"Ha ocurrido un error: {str(e)}"})
+    finally:
+        session.close()
+
+
 @table.get("/tables/{tableNumber}", tags=['Tables'])
-def get_single_table(table_number: int, session: Session = Depends(get_session)) -> JSONResponse:
+def get_single_table(
+    table_number: int, if_none_match: Optional[str] = Header(None), session: Session = Depends(get_session)
+    ) -> Response:
     """
     Retrieves a single table from the database based on the provided table number.
 
     Parameters:
     table_number (int): The unique identifier of the table to be retrieved.
+    if_none_match (str, optional): ETag of a previous response.
     session (Session, optional): The database session. Defaults to Depends(get_session).
 
     Returns:
     JSONResponse: A JSON response with the following structure:
-        - status_code: 200 if the table is successfully retrieved, 404 if the table is not found.
+        - status_code: 200 if the table is successfully retrieved, 404 if the table is not found,
+        304 (empty) if the tables have not changed since the ETag in If-None-Match.
         - content: A dictionary containing a message indicating the outcome of the operation.
         If the table is retrieved, it also includes the serialized table data.
     """
     try:
-        get_table = session.query(Table).filter(
-            Table.number == table_number).first()
-        if not get_table:
-            return JSONResponse(status_code=404, content={
-                "message": "No se ha encontrado una mesa con ese numero"
-            })
-        serialized_table = jsonable_encoder(get_table)
-        return JSONResponse(status_code=200, content={
+        current = versions.etag("tables")
+        if versions.matches(if_none_match, current):
+            return Response(status_code=304, headers={"ETag": current})
+
+        serialized_table = cache.caches["tables"].get(table_number)
+        if serialized_table is None:
+            get_table = session.query(Table).filter(
+                Table.number == table_number).first()
+            if not get_table:
+                return JSONResponse(status_code=404, content={
+                    "message": "No se ha encontrado una mesa con ese numero"
+                })
+            serialized_table = modelToDict(get_table)
+            cache.caches["tables"].set(table_number, serialized_table)
+        return JSONResponse(status_code=200, headers={"ETag": current}, content={
             "message": "Mesa encontrada con exito", "table": serialized_table
         })
     except Exception as e:
@@ -113,6 +287,38 @@ def get_single_table(table_number: int, session: Session = Depends(get_session))
         session.close()
 
 
+@asyncVersionOf(get_single_table)
+async def get_single_table_async(
+    table_number: int, if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session)) -> Response:
+    """
+    Async mode version of get_single_table: a cache miss awaits its query.
+    """
+    try:
+        current = versions.etag("tables")
+        if versions.matches(if_none_match, current):
+            return Response(status_code=304, headers={"ETag": current})
+
+        serialized_table = cache.caches["tables"].get(table_number)
+        if serialized_table is None:
+            get_table = (await session.execute(select(Table).where(Table.number == table_number))).scalar()
+            if not get_table:
+                return JSONResponse(status_code=404, content={
+                    "message": "No se ha encontrado una mesa con ese numero"
+                })
+            serialized_table = modelToDict(get_table)
+            cache.caches["tables"].set(table_number, serialized_table)
+        return JSONResponse(status_code=200, headers={"ETag": current}, content={
+            "message": "Mesa encontrada con exito", "table": serialized_table
+        })
+    except Exception as e:
+        return JSONResponse(status_code=500, content={
+            "message": f"Ha ocurrido un error buscando la mesa: {str(e)}"
+        })
+    finally:
+        await session.close()
+
+
 @table.delete("/tables/{tableNumber}", tags=['Tables'])
 def delete_table(
     table_number: int, session: Session = Depends(get_session)
@@ -173,9 +379,9 @@ def update_table(
                 "message": "No se ha encontrado una mesa con ese numero"
             })
         for key, value in dict(table_update).items():
-            setattr(table, key, value)
+            setattr(get_table, key, value)
         session.commit()
-        session.refresh(table)
+        session.refresh(get_table)
         return JSONResponse(status_code=200, content={
             "message": "Mesa actualizada con exito"
         })
@@ -186,20 +392,43 @@ def update_table(
 
 
 @table.get("/tablesFilter", tags=['Tables'])
-def filter_tables(booleanTable: bool, session: Session = Depends(get_session)):
+def filter_tables(
+    booleanTable: bool, at: Optional[datetime] = None,
+    if_none_match: Optional[str] = Header(None), session: Session = Depends(get_session)):
+    """
+    Lists the tables that are (or are not) occupied at a given moment.
+
+    Parameters:
+    booleanTable (bool): True for the occupied tables, False for the free ones.
+    at (datetime, optional): The moment to check. Defaults to now.
+    if_none_match (str, optional): ETag of a previous response.
+    session (Session, optional): The database session. Defaults to Depends(get_session).
+
+    Returns:
+    JSONResponse: The matching tables, with is_occupied set from the
+    reservations (the occupancy bitmap, in 15-minute slots) at that moment,
+    or 304 (empty) if nothing changed since the ETag in If-None-Match.
+    Moments before the bitmap's first day are checked exactly against the
+    books table with FILTER_STATEMENT.
+    """
     try:
-        result = session.execute(
-            text(f"SELECT * FROM tables WHERE is_occupied = {booleanTable}"))
-        column_names = [desc[0] for desc in result.cursor.description]
+        at = at or datetime.now()
+        current = versions.etag("tables", "books", suffix=f"slot-{occupancy.slotOf(at)}")
+        if versions.matches(if_none_match, current):
+            return Response(status_code=304, headers={"ETag": current})
 
-        tables = []
+        if not occupancy.bitmap.covers(at):
+            tables = rowDicts(session.execute(FILTER_STATEMENT, {"at": at, "occupied": booleanTable}))
+            return JSONResponse(status_code=200, headers={"ETag": current}, content={"mesas": tables})
 
-        for row in result:
-            table_dict = {column_names[i]
-                : value for i, value in enumerate(row)}
-            tables.append(table_dict)
+        occupied = set(occupancy.bitmap.occupiedAt(at))
+        tables = []
+        for row in rowDicts(session.execute(ALL_TABLES)):
+            row["is_occupied"] = row["number"] in occupied
+            if row["is_occupied"] == booleanTable:
+                tables.append(row)
 
-        return {"mesas": tables}
+        return JSONResponse(status_code=200, headers={"ETag": current}, content={"mesas": tables})
 
     except Exception as e:
         print(e)
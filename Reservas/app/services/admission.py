@@ -0,0 +1,214 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from app import config
+from app.services import metrics
+
+READ_METHODS = ("GET", "HEAD")
+
+
+class TokenBucket:
+    """
+    Token bucket: `rate` tokens per second, at most `burst` saved up.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """
+        Take one token if there is one.
+
+        Returns:
+        float: 0 if the token was taken, otherwise the seconds until the next one.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    One token bucket per (client, route class), kept in least recently used order.
+
+    A bucket left alone for the time it takes to refill is full again, so
+    it is dropped once it has been idle that long and rebuilt on the next
+    request; a bucket in use is never dropped, however old it is. At most
+    `max_clients` buckets are kept.
+    """
+
+    def __init__(self, limits: dict, max_clients: int):
+        self.limits = {name: limit for name, limit in limits.items() if limit[0] > 0}
+        self.refill = max((burst / rate for rate, burst in self.limits.values()), default=1)
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client: str, route_class: str) -> float:
+        """
+        Count a request of `client` against the limit of its route class.
+
+        Parameters:
+        client (str): The API key or address of the client.
+        route_class (str): "read" or "write".
+
+        Returns:
+        float: 0 if the request is allowed, otherwise the seconds to wait.
+        """
+        limit = self.limits.get(route_class)
+        if limit is None:
+            return 0.0
+        key = (client, route_class)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(*limit)
+            else:
+                self._buckets.move_to_end(key)
+            wait = bucket.take()
+            self._prune(bucket.updated)
+            return wait
+
+    def _prune(self, now: float):
+        while self._buckets:
+            oldest = next(iter(self._buckets.values()))
+            if len(self._buckets) <= self.max_clients and now - oldest.updated < self.refill:
+                break
+            self._buckets.popitem(last=False)
+
+    def tracked(self) -> int:
+        with self._lock:
+            return len(self._buckets)
+
+
+class ConcurrencyLimiter:
+    """
+    Lets at most `limit` requests run at once and queues a few more.
+
+    Requests beyond the limit wait in FIFO order, up to `max_queue` of them
+    and for at most `timeout` seconds; past that they are turned away
+    instead of piling up on the connection pool. A finishing request hands
+    its slot straight to the oldest waiter.
+
+    It runs on the event loop, so it needs no lock.
+    """
+
+    def __init__(self, limit: int, max_queue: int, timeout: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters = deque()
+
+    async def acquire(self) -> str:
+        """
+        Wait for a slot.
+
+        Returns:
+        str: None when the request got a slot (it must call release()), or
+        "queue_full" / "queue_timeout" when it has to be rejected.
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return None
+        if len(self._waiters) >= self.max_queue:
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        metrics.admission_queued_total.inc()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+            return None
+        except asyncio.TimeoutError:
+            if waiter.done():
+                return None
+            self._waiters.remove(waiter)
+            waiter.cancel()
+            return "queue_timeout"
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+                waiter.cancel()
+            raise
+        finally:
+            metrics.admission_queue_wait.observe(time.perf_counter() - started)
+
+    def release(self):
+        """
+        Give the slot to the next waiter, or free it.
+        """
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "timeout_seconds": self.timeout,
+        }
+
+
+def routeClass(method: str) -> str:
+    return "read" if method in READ_METHODS else "write"
+
+
+def clientOf(scope) -> str:
+    """
+    Identify the client of a request: its X-API-Key header, or its address.
+    """
+    key = dict(scope["headers"]).get(b"x-api-key")
+    if key:
+        return key.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else ""
+
+
+def retryAfter(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+rateLimiter = RateLimiter({
+    "read": (config.RATE_LIMIT_READS_PER_SECOND, config.RATE_LIMIT_READS_BURST),
+    "write": (config.RATE_LIMIT_WRITES_PER_SECOND, config.RATE_LIMIT_WRITES_BURST),
+}, config.RATE_LIMIT_MAX_CLIENTS)
+
+concurrencyLimiter = ConcurrencyLimiter(
+    config.ADMISSION_MAX_CONCURRENCY or config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW,
+    config.ADMISSION_QUEUE_SIZE,
+    config.ADMISSION_QUEUE_TIMEOUT_MS / 1000,
+)
+
+
+def stats() -> dict:
+    """
+    Return the state of the concurrency limiter and the rejection counters.
+    """
+    return {
+        "concurrency": concurrencyLimiter.stats(),
+        "rate_limits": {name: {"per_second": rate, "burst": burst}
+                        for name, (rate, burst) in rateLimiter.limits.items()},
+        "clients_tracked": rateLimiter.tracked(),
+        "queued_total": metrics.admission_queued_total.value(),
+        "rejected_total": {"/".join(labels): count for labels, count in metrics.admission_rejected_total.items()},
+    }
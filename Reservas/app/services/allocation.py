@@ -0,0 +1,115 @@
+from bisect import bisect_left
+from datetime import timedelta
+from sqlalchemy import select
+from app.models.modelsDB import Book, Table
+from app.models.utilities import bookingEnd
+from app.services.occupancy import SLOT_MINUTES, slotSpan
+
+
+class SeatingPlan:
+    """
+    Occupancy of the tables in 15-minute slots, for one allocation run.
+
+    The tables are ordered by (seats, number) and bit i of a slot's mask
+    is set when the i-th table is taken during that slot. The tables big
+    enough for a party are then every position from the first one with
+    enough seats on, so the best fit for a window is the lowest bit of
+    "big enough and not taken in any of its slots": a few big-integer
+    operations per party, whatever the number of tables.
+
+    Like the occupancy bitmap, a table counts as taken for a whole slot if
+    a reservation covers part of it.
+    """
+
+    def __init__(self, tables):
+        self.tables = sorted(tables, key=lambda table: (table[1], table[0]))
+        self._seats = [seats for _, seats in self.tables]
+        self._positions = {number: position for position, (number, _) in enumerate(self.tables)}
+        self._all = (1 << len(self.tables)) - 1
+        self._slots = {}
+
+    def occupy(self, table_number: int, start, end):
+        """
+        Mark a table as taken during [start, end).
+        """
+        position = self._positions.get(table_number)
+        if position is None:
+            return
+        bit = 1 << position
+        first, last = slotSpan(start, end)
+        for slot in range(first, last):
+            self._slots[slot] = self._slots.get(slot, 0) | bit
+
+    def bestFit(self, size: int, start, end):
+        """
+        Return the free table with the fewest seats (at least `size`) for [start, end).
+
+        Returns:
+        tuple: (table number, seats), or None if every big enough table is taken.
+        """
+        smallest = bisect_left(self._seats, size)
+        free = self._all >> smallest << smallest
+        first, last = slotSpan(start, end)
+        slots = self._slots
+        for slot in range(first, last):
+            free &= ~slots.get(slot, 0)
+            if not free:
+                return None
+        return self.tables[(free & -free).bit_length() - 1]
+
+
+def allocate(session, parties: list) -> tuple:
+    """
+    Assign tables to a batch of parties by best fit on seats.
+
+    Parties are served in order of requested time and, at the same time,
+    largest first, as the big tables are the scarce ones. Each one gets the
+    table with the fewest seats that fits it and is free at its time; if
+    none is, it is tried again every 15 minutes up to its max_wait. Existing
+    reservations are read with one query and the assignments made so far
+    also block their tables, so the proposals never overlap.
+
+    Parameters:
+    session (Session): The database session.
+    parties (list): PartyAllocation items.
+
+    Returns:
+    tuple: (assignments, unassigned) where assignments is a list of dicts
+    with the party index, customer_id, size, table_number, seats,
+    wasted_seats, time, end_time and wait_minutes, ordered by index, and
+    unassigned a list of {"index", "message"}.
+    """
+    if not parties:
+        return [], []
+    windows = [(party.time, bookingEnd(party.time, party.duration)) for party in parties]
+    earliest = min(start for start, _ in windows)
+    latest = max(end + timedelta(minutes=party.max_wait) for party, (_, end) in zip(parties, windows))
+
+    plan = SeatingPlan(session.execute(
+        select(Table.number, Table.seats).where(Table.seats >= min(party.size for party in parties))).all())
+    for table_number, start, end in session.execute(
+        select(Book.table_number, Book.time, Book.end_time).where(Book.time < latest, Book.end_time > earliest)
+    ):
+        plan.occupy(table_number, start, end)
+
+    assignments, unassigned = [], []
+    order = sorted(range(len(parties)), key=lambda index: (parties[index].time, -parties[index].size, index))
+    for index in order:
+        party = parties[index]
+        start, end = windows[index]
+        for wait in range(0, party.max_wait + 1, SLOT_MINUTES):
+            delay = timedelta(minutes=wait)
+            table = plan.bestFit(party.size, start + delay, end + delay)
+            if table is not None:
+                plan.occupy(table[0], start + delay, end + delay)
+                assignments.append({
+                    "index": index, "customer_id": party.customer_id, "size": party.size,
+                    "table_number": table[0], "seats": table[1], "wasted_seats": table[1] - party.size,
+                    "time": start + delay, "end_time": end + delay, "wait_minutes": wait,
+                })
+                break
+        else:
+            unassigned.append({"index": index, "message": "No hay ninguna mesa libre con plazas suficientes"})
+    assignments.sort(key=lambda assignment: assignment["index"])
+    unassigned.sort(key=lambda item: item["index"])
+    return assignments, unassigned
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, literal, select
+from app import config
+from app.database.events import recordChanges
+from app.models.modelsDB import ArchivedBook, Book
+from app.models.utilities import rowDicts
+
+MOVED_COLUMNS = ("id", "table_number", "customer_id", "time", "end_time", "no_show")
+
+
+def archiveCutoff(days: int = None) -> datetime:
+    """
+    Return the moment before which finished reservations are archived.
+
+    Parameters:
+    days (int, optional): Days of history kept in books; ARCHIVE_AFTER_DAYS by default.
+
+    Returns:
+    datetime: Midnight `days` days ago.
+    """
+    days = config.ARCHIVE_AFTER_DAYS if days is None else days
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=days)
+
+
+def archiveBooks(session, before: datetime, batch_size: int = None) -> int:
+    """
+    Move the reservations that ended before `before` from books to books_archive.
+
+    Each batch (the `batch_size` oldest reservations) is copied with
+    INSERT ... SELECT and deleted in the same transaction, so a reservation is always in exactly one of the tables
+    and an interrupted run can simply be started again. The moved rows are
+    recorded with the "archive" action (recordChanges) in the same
+    transaction, so the consumers can tell them from cancellations: this
+    process's onCommit callbacks get them on commit and the running workers
+    on their next read, through the change log, so their caches, ETags,
+    availability index, occupancy bitmap and change feed drop them without
+    a restart.
+
+    Parameters:
+    session (Session): A sync session on the primary database.
+    before (datetime): Reservations with end_time before this are moved.
+    batch_size (int, optional): Reservations per transaction; ARCHIVE_BATCH_SIZE by default.
+
+    Returns:
+    int: The number of reservations archived.
+    """
+    batch_size = batch_size or config.ARCHIVE_BATCH_SIZE
+    columns = [getattr(Book, name) for name in MOVED_COLUMNS]
+    moved = 0
+    while True:
+        # time < end_time < before: filtering and ordering on time walks the ix_books_time index.
+        rows = rowDicts(session.execute(
+            select(*columns).where(Book.time < before, Book.end_time < before).order_by(Book.time).limit(batch_size)
+        ))
+        if not rows:
+            return moved
+        ids = [row["id"] for row in rows]
+        session.execute(insert(ArchivedBook).from_select(
+            list(MOVED_COLUMNS) + ["archived_at"],
+            select(*columns, literal(datetime.now(), ArchivedBook.archived_at.type)).where(Book.id.in_(ids)),
+        ))
+        session.execute(delete(Book).where(Book.id.in_(ids)))
+        recordChanges(session, Book, "archive", rows)
+        session.commit()
+        moved += len(rows)
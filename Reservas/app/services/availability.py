@@ -0,0 +1,246 @@
+import bisect
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from app.database.events import REMOVALS, onCommit, onReload
+from app.models.modelsDB import Book, Customer, Table
+
+
+class AvailabilityIndex:
+    """
+    In-memory interval index of reservations, one sorted list per table.
+
+    Each table keeps its reservations as (start, end, book_id) tuples sorted
+    by start. A window [start, end) is free when no reservation overlaps it;
+    since a reservation can only overlap if it starts before `end` and no
+    earlier than `start - longest reservation of that table`, the check is a
+    binary search plus the (few) reservations inside that range.
+
+    The index lives in the process: each worker loads it at startup, keeps
+    it updated from the commits it performs and, before each read, from the
+    ones of the other workers and scripts (app.database.events.catchUp). If
+    it falls further behind than the change log keeps, it is loaded again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._intervals = {}
+        self._books = {}
+        self._longest = {}
+
+    def clear(self):
+        with self._lock:
+            self._intervals.clear()
+            self._books.clear()
+            self._longest.clear()
+
+    def replace(self, other: "AvailabilityIndex"):
+        """
+        Take the contents of another index at once, so readers never see it half loaded.
+        """
+        with self._lock:
+            self._intervals, self._books, self._longest = other._intervals, other._books, other._longest
+
+    def add(self, book_id: int, table_number: int, start: datetime, end: datetime):
+        """
+        Add or move a reservation.
+        """
+        with self._lock:
+            self._remove(book_id)
+            bisect.insort(self._intervals.setdefault(table_number, []), (start, end, book_id))
+            self._books[book_id] = (table_number, start, end)
+            self._longest[table_number] = max(self._longest.get(table_number, timedelta(0)), end - start)
+
+    def remove(self, book_id: int):
+        """
+        Remove a reservation, if it is indexed.
+        """
+        with self._lock:
+            self._remove(book_id)
+
+    def _remove(self, book_id: int):
+        indexed = self._books.pop(book_id, None)
+        if indexed is None:
+            return
+        table_number, start, end = indexed
+        intervals = self._intervals[table_number]
+        position = bisect.bisect_left(intervals, (start, end, book_id))
+        if position < len(intervals) and intervals[position][2] == book_id:
+            del intervals[position]
+
+    def _isFree(self, table_number: int, start: datetime, end: datetime) -> bool:
+        intervals = self._intervals.get(table_number)
+        if not intervals:
+            return True
+        high = bisect.bisect_left(intervals, (end,))
+        earliest = start - self._longest[table_number]
+        for position in range(high - 1, -1, -1):
+            interval = intervals[position]
+            if interval[1] > start:
+                return False
+            if interval[0] <= earliest:
+                break
+        return True
+
+    def isFree(self, table_number: int, start: datetime, end: datetime) -> bool:
+        """
+        Tell whether a table has no reservation overlapping [start, end).
+        """
+        with self._lock:
+            return self._isFree(table_number, start, end)
+
+    def freeTables(self, table_numbers, start: datetime, end: datetime) -> list:
+        """
+        Filter the given table numbers down to the ones free in [start, end).
+        """
+        with self._lock:
+            return [number for number in table_numbers if self._isFree(number, start, end)]
+
+    def __len__(self):
+        return len(self._books)
+
+
+index = AvailabilityIndex()
+
+
+def load(session, since: datetime = None):
+    """
+    Fill the index from the books table.
+
+    Parameters:
+    session (Session): The database session used to read the reservations.
+    since (datetime, optional): Only load reservations ending after this
+        moment. Defaults to the start of today, as past reservations never
+        block a new one.
+    """
+    since = since or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    statement = select(Book.id, Book.table_number, Book.time, Book.end_time).where(Book.end_time > since)
+    loaded = AvailabilityIndex()
+    for book_id, table_number, start, end in session.execute(statement):
+        loaded.add(book_id, table_number, start, end)
+    index.replace(loaded)
+
+
+def lockTables(session, table_numbers) -> dict:
+    """
+    Lock the rows of several tables until the current transaction ends.
+
+    Reservations for the same table are serialized on this lock, while
+    reservations for other tables go ahead in parallel. Postgres takes row
+    locks (SELECT ... FOR UPDATE, in table number order so two batches never
+    deadlock); SQLite has no row locks, so an empty UPDATE takes its write
+    lock for the rest of the transaction.
+
+    Parameters:
+    session (Session): The session whose transaction holds the locks.
+    table_numbers (Iterable[int]): The numbers of the tables.
+
+    Returns:
+    dict: The existing tables by number; missing numbers are left out.
+    """
+    numbers = sorted(set(table_numbers))
+    if not numbers:
+        return {}
+    if session.get_bind().dialect.name == "sqlite":
+        session.execute(
+            update(Table.__table__).where(Table.number.in_(numbers)).values(number=Table.number)
+        )
+    tables = session.query(Table).filter(Table.number.in_(numbers)).order_by(Table.number).with_for_update().all()
+    return {table.number: table for table in tables}
+
+
+def lockTable(session, table_number: int):
+    """
+    Lock a table's row until the current transaction ends and return it.
+
+    Parameters:
+    session (Session): The session whose transaction holds the lock.
+    table_number (int): The number of the table.
+
+    Returns:
+    Table: The locked table, or None if it does not exist.
+    """
+    return lockTables(session, [table_number]).get(table_number)
+
+
+def overlappingBook(session, table_number: int, start: datetime, end: datetime, exclude_id: int = None):
+    """
+    Find a reservation of the table that overlaps [start, end).
+
+    Parameters:
+    session (Session): The database session.
+    table_number (int): The number of the table.
+    start (datetime): Start of the window.
+    end (datetime): End of the window.
+    exclude_id (int, optional): A reservation to ignore (the one being updated).
+
+    Returns:
+    int: The ID of an overlapping reservation, or None if the window is free.
+    """
+    statement = select(Book.id).where(
+        Book.table_number == table_number, Book.time < end, Book.end_time > start
+    )
+    if exclude_id is not None:
+        statement = statement.where(Book.id != exclude_id)
+    return session.execute(statement.limit(1)).scalar()
+
+
+def addBooks(session, books: list) -> tuple:
+    """
+    Check a batch of reservations and add the valid ones to the session.
+
+    The tables of the batch are locked and resolved with one query, the
+    customers with another one, and the reservations already overlapping the
+    batch with a third; every item is then checked in memory against those
+    and against the items accepted before it. The accepted ones are added
+    and flushed (so they get their ids) but not committed.
+
+    Parameters:
+    session (Session): The session whose transaction receives the reservations.
+    books (list): Book objects with their end_time set.
+
+    Returns:
+    tuple: (accepted, errors) where accepted is a list of (index, book,
+    customer name) and errors a list of {"index", "status", "message"}.
+    """
+    tables = lockTables(session, [item.table_number for item in books])
+    customers = dict(session.execute(
+        select(Customer.idcustomer, Customer.name).where(Customer.idcustomer.in_({item.customer_id for item in books}))
+    ).all())
+
+    taken = AvailabilityIndex()
+    for book_id, table_number, start, end in session.execute(
+        select(Book.id, Book.table_number, Book.time, Book.end_time).where(
+            Book.table_number.in_(tables),
+            Book.time < max(item.end_time for item in books),
+            Book.end_time > min(item.time for item in books),
+        )
+    ):
+        taken.add(book_id, table_number, start, end)
+
+    accepted, errors = [], []
+    for position, item in enumerate(books):
+        if item.table_number not in tables:
+            errors.append({"index": position, "status": 404, "message": "No se ha encontrado una mesa con ese número"})
+        elif item.customer_id not in customers:
+            errors.append({"index": position, "status": 404, "message": "No se ha encontrado un cliente con ese ID"})
+        elif not taken.isFree(item.table_number, item.time, item.end_time):
+            errors.append({"index": position, "status": 409, "message": "La mesa ya está reservada en ese horario"})
+        else:
+            taken.add(-(position + 1), item.table_number, item.time, item.end_time)
+            accepted.append((position, item, customers[item.customer_id]))
+
+    session.add_all([item for _, item, _ in accepted])
+    session.flush()
+    return accepted, errors
+
+
+def _onBookCommit(action, values, previous):
+    if action in REMOVALS:
+        index.remove(values["id"])
+    else:
+        index.add(values["id"], values["table_number"], values["time"], values["end_time"])
+
+
+onCommit(Book, _onBookCommit)
+onReload(Book, load)
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import OrderedDict
+from app import config
+from app.database.events import onCommit, onReload
+from app.models.modelsDB import Table, Customer, Book
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with a time to live.
+
+    Entries are dropped when they are older than `ttl` seconds or when the
+    cache is full and they are the least recently used.
+
+    Any object with the same get/set/delete/clear/stats methods can replace
+    it in `caches` (for instance a Redis-backed one shared by every worker).
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """
+        Return the cached value for `key`, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """
+        Store `value` under `key`, evicting the least recently used entry if full.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """
+        Drop `key` from the cache, if present.
+        """
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Return the cache counters and current size.
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class NullCache:
+    """
+    Cache that stores nothing, used when CACHE_ENABLED is off.
+    """
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"size": 0, "enabled": False}
+
+
+def newCache():
+    """
+    Build a cache with the configured backend and limits.
+    """
+    if not config.CACHE_ENABLED:
+        return NullCache()
+    return LRUCache(config.CACHE_MAX_ENTRIES, config.CACHE_TTL_SECONDS)
+
+
+# Detalle de mesas por número, clientes por idcustomer y reservas por id.
+caches = {
+    "tables": newCache(),
+    "customers": newCache(),
+    "books": newCache(),
+}
+
+
+def stats() -> dict:
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+def _invalidator(name: str, key: str):
+    def invalidate(action, values, previous):
+        caches[name].delete(values[key])
+        if previous[key] != values[key]:
+            caches[name].delete(previous[key])
+    return invalidate
+
+
+onCommit(Table, _invalidator("tables", "number"))
+onCommit(Customer, _invalidator("customers", "idcustomer"))
+onCommit(Book, _invalidator("books", "id"))
+onReload(Table, lambda session: caches["tables"].clear())
+onReload(Customer, lambda session: caches["customers"].clear())
+onReload(Book, lambda session: caches["books"].clear())
@@ -0,0 +1,213 @@
+import asyncio
+import threading
+from collections import deque
+from starlette.concurrency import run_in_threadpool
+from app import config
+from app.database.connection import SessionLocal, catchUp
+from app.database.events import onCommit
+from app.models.modelsDB import Table, Customer, Book
+from app.services.versions import BOOT_ID
+
+ENTITIES = ("tables", "customers", "books")
+
+# Marca el final del flujo de un suscriptor que se ha quedado atrás.
+_OVERFLOW = object()
+
+
+class ChangeEvent:
+    """
+    A committed create, update or delete, numbered in commit order.
+    """
+
+    __slots__ = ("id", "entity", "action", "data")
+
+    def __init__(self, id: int, entity: str, action: str, data: dict):
+        self.id = id
+        self.entity = entity
+        self.action = action
+        self.data = data
+
+    @property
+    def event_id(self) -> str:
+        return f"{BOOT_ID}-{self.id}"
+
+
+class Subscriber:
+    """
+    One open stream: a bounded queue on the event loop that serves it.
+
+    When the queue fills up the subscriber is cut off instead of holding
+    events for it without limit; the client reconnects with Last-Event-ID
+    and catches up from the broker's history.
+    """
+
+    def __init__(self, loop, entities: frozenset, max_queue: int):
+        self.loop = loop
+        self.entities = entities
+        self.queue = asyncio.Queue(max_queue + 1)
+        self.max_queue = max_queue
+        self.reset_id = None
+
+    def offer(self, event):
+        if self.queue.qsize() >= self.max_queue:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_OVERFLOW)
+            return
+        self.queue.put_nowait(event)
+
+    async def next(self, timeout: float):
+        """
+        Wait for the next event.
+
+        Returns:
+        ChangeEvent: The event, or None if nothing arrived within `timeout`
+        seconds. Raises OverflowError once the subscriber has fallen behind.
+        """
+        if self.queue.empty():
+            try:
+                event = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        else:
+            event = self.queue.get_nowait()
+        if event is _OVERFLOW:
+            raise OverflowError
+        return event
+
+
+class Broker:
+    """
+    In-process fan-out of committed changes to the open event streams.
+
+    Events are published from the after-commit hooks, in whatever thread
+    committed, and from catchUp for the changes of other processes (see
+    followChanges). Subscribers are grouped by event loop and each loop is woken
+    once per event, which then queues it for all of its subscribers. The
+    last `history` events are kept so a client can resume after a reconnect.
+    """
+
+    def __init__(self, history: int, max_queue: int):
+        self.max_queue = max_queue
+        self._history = deque(maxlen=history)
+        self._loops = {}
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self.published = 0
+
+    def publish(self, entity: str, action: str, data: dict):
+        with self._lock:
+            self._last_id += 1
+            event = ChangeEvent(self._last_id, entity, action, data)
+            self._history.append(event)
+            self.published += 1
+            loops = list(self._loops.items())
+        for loop, subscribers in loops:
+            try:
+                loop.call_soon_threadsafe(self._deliver, subscribers, event)
+            except RuntimeError:
+                with self._lock:
+                    self._loops.pop(loop, None)
+
+    @staticmethod
+    def _deliver(subscribers: set, event: ChangeEvent):
+        for subscriber in list(subscribers):
+            if event.entity in subscriber.entities:
+                subscriber.offer(event)
+
+    def subscribe(self, entities=ENTITIES, last_event_id: str = None) -> Subscriber:
+        """
+        Open a stream on the running event loop.
+
+        Parameters:
+        entities (Iterable[str]): The collections to receive events for.
+        last_event_id (str, optional): The id of the last event the client saw.
+            The events after it are queued first. If they are no longer in the
+            history, do not fit in the queue or the id comes from another
+            process, reset_id is set to the current event id instead, so the
+            client reloads its state and resumes from there.
+
+        Returns:
+        Subscriber: The new subscriber; call unsubscribe() when the stream ends.
+        """
+        subscriber = Subscriber(asyncio.get_running_loop(), frozenset(entities), self.max_queue)
+        with self._lock:
+            if last_event_id is not None:
+                missed = self._since(last_event_id)
+                if missed is not None:
+                    missed = [event for event in missed if event.entity in subscriber.entities]
+                if missed is None or len(missed) > self.max_queue:
+                    subscriber.reset_id = f"{BOOT_ID}-{self._last_id}"
+                else:
+                    for event in missed:
+                        subscriber.offer(event)
+            self._loops.setdefault(subscriber.loop, set()).add(subscriber)
+        return subscriber
+
+    def hasSubscribers(self) -> bool:
+        with self._lock:
+            return bool(self._loops)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            subscribers = self._loops.get(subscriber.loop)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._loops[subscriber.loop]
+
+    def _since(self, last_event_id: str):
+        boot_id, _, number = last_event_id.rpartition("-")
+        if boot_id != BOOT_ID or not number.isdigit():
+            return None
+        last = int(number)
+        if last >= self._last_id:
+            return []
+        if not self._history or self._history[0].id > last + 1:
+            return None
+        return [event for event in self._history if event.id > last]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": sum(len(subscribers) for subscribers in self._loops.values()),
+                "published": self.published,
+                "last_event_id": f"{BOOT_ID}-{self._last_id}",
+                "history": len(self._history),
+            }
+
+
+broker = Broker(config.EVENTS_HISTORY, config.EVENTS_QUEUE_SIZE)
+
+
+def _catchUp():
+    session = SessionLocal()
+    try:
+        catchUp(session)
+    finally:
+        session.close()
+
+
+async def followChanges():
+    """
+    Publish the changes of the other workers and processes while there are streams open.
+
+    Local writes reach the broker through the after-commit hooks, and the
+    others through catchUp, which otherwise only runs before the reads this
+    worker serves. Started by the lifespan of the app; runs until cancelled.
+    """
+    while True:
+        await asyncio.sleep(config.EVENTS_POLL_MS / 1000)
+        if broker.hasSubscribers():
+            await run_in_threadpool(_catchUp)
+
+
+def _publisher(entity: str):
+    def publish(action: str, values: dict, previous: dict):
+        broker.publish(entity, action, values)
+    return publish
+
+
+onCommit(Table, _publisher("tables"))
+onCommit(Customer, _publisher("customers"))
+onCommit(Book, _publisher("books"))
@@ -0,0 +1,62 @@
+import asyncio
+import hashlib
+from app import config
+from app.services.cache import LRUCache
+
+# Respuestas ya enviadas por (método, ruta, cliente, Idempotency-Key); el
+# cliente es su X-API-Key o su dirección. Cualquier objeto con get/set (por
+# ejemplo uno sobre Redis) sirve para compartirlas entre workers.
+responses = LRUCache(config.IDEMPOTENCY_MAX_ENTRIES, config.IDEMPOTENCY_TTL_SECONDS)
+
+# Peticiones en curso por la misma clave; los duplicados esperan a este evento.
+_inflight = {}
+
+
+class StoredResponse:
+    """
+    A finished response kept for replay, with the fingerprint of its request body.
+    """
+
+    __slots__ = ("fingerprint", "status", "headers", "body")
+
+    def __init__(self, fingerprint: str, status: int, headers: list, body: bytes):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+def fingerprint(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+async def claim(key: tuple):
+    """
+    Wait until no other request is running with `key` and return its stored response.
+
+    Returns:
+    StoredResponse: The response to replay, or None when the caller now owns
+    the key and must run the request (and then call release()).
+    """
+    while True:
+        stored = responses.get(key)
+        if stored is not None:
+            return stored
+        running = _inflight.get(key)
+        if running is None:
+            _inflight[key] = asyncio.Event()
+            return None
+        await running.wait()
+
+
+def release(key: tuple, stored: StoredResponse = None):
+    """
+    Store the response of the request that owned `key`, if any, and wake its duplicates.
+
+    Server errors are not stored, so a retry runs the request again.
+    """
+    if stored is not None:
+        responses.set(key, stored)
+    running = _inflight.pop(key, None)
+    if running is not None:
+        running.set()
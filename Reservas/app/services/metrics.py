@@ -0,0 +1,250 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Límites (en segundos) de los histogramas de latencia.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Metric:
+    """
+    A labelled metric family rendered in the Prometheus text format.
+
+    The values live in this process; with several workers each one exposes
+    its own and Prometheus aggregates them.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _labelText(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def items(self) -> list:
+        """
+        Return the (labels, value) pairs recorded so far.
+        """
+        with self._lock:
+            return sorted(self._values.items())
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self) -> list:
+        with self._lock:
+            return [f"{self.name}{self._labelText(key)} {_number(value)}" for key, value in sorted(self._values.items())]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> list:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    labels = self._labelText(key, 'le="' + le + '"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{self._labelText(key)} {_number(total)}")
+                lines.append(f"{self.name}_count{self._labelText(key)} {count}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+requests_total = Counter(
+    "http_requests_total", "Peticiones HTTP atendidas.", ("method", "route", "status"))
+request_duration = Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP.", ("method", "route"))
+requests_in_progress = Gauge(
+    "http_requests_in_progress", "Peticiones HTTP en curso.")
+queries_per_request = Histogram(
+    "db_queries_per_request", "Sentencias SQL ejecutadas por petición.", ("method", "route"), QUERY_COUNT_BUCKETS)
+db_time_per_request = Histogram(
+    "db_time_per_request_seconds", "Tiempo en la base de datos por petición.", ("method", "route"))
+queries_total = Counter(
+    "db_queries_total", "Sentencias SQL ejecutadas.")
+query_errors_total = Counter(
+    "db_query_errors_total", "Sentencias SQL que han fallado.")
+pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Espera para obtener una conexión del pool.", ("engine",))
+pool_in_use = Gauge(
+    "db_pool_connections_in_use", "Conexiones del pool prestadas en este momento.", ("engine",))
+pool_size = Gauge(
+    "db_pool_size", "Tamaño configurado del pool.", ("engine",))
+pool_overflow = Gauge(
+    "db_pool_overflow", "Conexiones por encima del tamaño del pool.", ("engine",))
+admission_rejected_total = Counter(
+    "admission_rejected_total", "Peticiones rechazadas por el control de admisión.", ("reason", "route_class"))
+admission_queued_total = Counter(
+    "admission_queued_total", "Peticiones que han esperado turno en la cola de admisión.")
+admission_queue_wait = Histogram(
+    "admission_queue_wait_seconds", "Espera en la cola de admisión.")
+
+registry = [
+    requests_total, request_duration, requests_in_progress, queries_per_request, db_time_per_request,
+    queries_total, query_errors_total, pool_checkout_wait, pool_in_use, pool_size, pool_overflow,
+    admission_rejected_total, admission_queued_total, admission_queue_wait,
+]
+
+_engines = {}
+
+
+class RequestStats:
+    """
+    SQL statements and database time of the request being served.
+    """
+
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+# La petición en curso. FastAPI copia el contexto al threadpool y al greenlet
+# de run_sync, así que los hooks de SQLAlchemy ven el mismo objeto.
+current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _beforeExecute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _afterExecute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    queries_total.inc()
+    stats = current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+
+
+def _queryError(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+    query_errors_total.inc()
+
+
+_installed = False
+
+
+def install():
+    """
+    Register the SQL hooks on every Engine.
+
+    Called once from main.py when METRICS_ENABLED is set; without it the
+    statements run with no instrumentation at all.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    event.listen(Engine, "before_cursor_execute", _beforeExecute)
+    event.listen(Engine, "after_cursor_execute", _afterExecute)
+    event.listen(Engine, "handle_error", _queryError)
+
+
+def instrumentEngine(name: str, engine):
+    """
+    Report the pool of an engine on /metrics, labelled with its name.
+
+    Counts the connections lent out, times how long the engine waits to get
+    one (pool.connect() blocks when every connection is lent out and the
+    overflow is exhausted) and remembers the engine so its pool size and
+    overflow are reported too.
+
+    Parameters:
+    name (str): Label for the engine ("sync", "async", "replica-0"...).
+    engine (Engine): The sync engine (for async engines, engine.sync_engine).
+    """
+    if not _installed:
+        return
+    pool = engine.pool
+    connect = pool.connect
+
+    def timedConnect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started, name)
+
+    pool.connect = timedConnect
+    event.listen(pool, "checkout", lambda dbapi_connection, record, proxy: pool_in_use.inc(name))
+    event.listen(pool, "checkin", lambda dbapi_connection, record: pool_in_use.inc(name, amount=-1))
+    _engines[name] = engine
+
+
+def render() -> str:
+    """
+    Return every metric of this process in the Prometheus text format.
+    """
+    for name, engine in _engines.items():
+        pool = engine.pool
+        if hasattr(pool, "size") and hasattr(pool, "overflow"):
+            pool_size.set(pool.size(), name)
+            pool_overflow.set(max(pool.overflow(), 0), name)
+    return "\n".join(metric.render() for metric in registry) + "\n"
@@ -0,0 +1,284 @@
+import sys
+import threading
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import select
+from app.database.events import REMOVALS, onCommit, onReload
+from app.models.modelsDB import ArchivedBook, Book
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOT = timedelta(minutes=SLOT_MINUTES)
+_EPOCH = datetime(2000, 1, 1)
+
+
+def slotOf(moment: datetime) -> int:
+    """
+    Return the absolute number of the 15-minute slot that contains `moment`.
+    """
+    return (moment - _EPOCH) // SLOT
+
+
+def slotSpan(start: datetime, end: datetime) -> tuple:
+    """
+    Return the absolute slots [first, last) touched by [start, end).
+
+    A slot counts as occupied if the reservation covers any part of it.
+    """
+    first = slotOf(start)
+    last = -((_EPOCH - end) // SLOT)
+    return first, max(last, first + 1)
+
+
+def _slotDay(absolute: int) -> tuple:
+    return _EPOCH.date() + timedelta(days=absolute // SLOTS_PER_DAY), absolute % SLOTS_PER_DAY
+
+
+class OccupancyBitmap:
+    """
+    Occupancy of every table in 15-minute slots, kept as bitsets.
+
+    Each day is a list of 96 integers, one per slot, where bit i is set
+    when the table at position i has a reservation during that slot. For
+    50 tables a day takes about 3.5 KB. "Occupied at", "free in a window"
+    and "utilization per hour" are ORs and popcounts over those integers
+    instead of a scan of the books table.
+
+    Reservations of one table never overlap, but two consecutive ones can
+    share the slot where one ends and the next starts; those few bits are
+    reference counted in `_shared` so removing one of them keeps the slot
+    occupied. The slots of each reservation are kept by its id, so adding
+    one that is already there moves it instead of counting it twice, and
+    removing one that was never loaded does nothing.
+
+    Like the availability index, the bitmap lives in the process: it is
+    updated from the commits it performs and, before each read, from those
+    of the other workers and scripts (app.database.events.catchUp), and is
+    loaded again if it falls further behind than the change log keeps.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._days = {}
+        self._shared = {}
+        self._books = {}
+        self._positions = {}
+        self._numbers = []
+        self.since = None
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
+            self._shared.clear()
+            self._books.clear()
+
+    def replace(self, other: "OccupancyBitmap"):
+        """
+        Take the contents of another bitmap at once, so readers never see it half loaded.
+        """
+        with self._lock:
+            self._days, self._shared, self._books = other._days, other._shared, other._books
+            self._positions, self._numbers, self.since = other._positions, other._numbers, other.since
+
+    def _position(self, table_number: int) -> int:
+        position = self._positions.get(table_number)
+        if position is None:
+            position = self._positions[table_number] = len(self._numbers)
+            self._numbers.append(table_number)
+        return position
+
+    def _tables(self, mask: int) -> list:
+        numbers = []
+        while mask:
+            low = mask & -mask
+            numbers.append(self._numbers[low.bit_length() - 1])
+            mask ^= low
+        return numbers
+
+    def add(self, book_id: int, table_number: int, start: datetime, end: datetime):
+        """
+        Mark the slots of a reservation as occupied, or move it if it is already there.
+        """
+        with self._lock:
+            self._remove(book_id)
+            self._books[book_id] = (table_number, start, end)
+            bit = 1 << self._position(table_number)
+            first, last = slotSpan(start, end)
+            for absolute in range(first, last):
+                day, slot = _slotDay(absolute)
+                slots = self._days.get(day)
+                if slots is None:
+                    slots = self._days[day] = [0] * SLOTS_PER_DAY
+                if slots[slot] & bit:
+                    key = (day, slot, table_number)
+                    self._shared[key] = self._shared.get(key, 1) + 1
+                else:
+                    slots[slot] |= bit
+
+    def remove(self, book_id: int):
+        """
+        Release the slots of a reservation, if it is in the bitmap.
+        """
+        with self._lock:
+            self._remove(book_id)
+
+    def _remove(self, book_id: int):
+        indexed = self._books.pop(book_id, None)
+        if indexed is None:
+            return
+        table_number, start, end = indexed
+        bit = 1 << self._positions[table_number]
+        first, last = slotSpan(start, end)
+        for absolute in range(first, last):
+            day, slot = _slotDay(absolute)
+            slots = self._days.get(day)
+            if slots is None:
+                continue
+            key = (day, slot, table_number)
+            count = self._shared.pop(key, 1)
+            if count > 2:
+                self._shared[key] = count - 1
+            elif count == 1:
+                slots[slot] &= ~bit
+
+    def covers(self, moment: datetime) -> bool:
+        """
+        Tell whether the bitmap holds every reservation that can overlap `moment`.
+
+        It holds the reservations ending after the moment it was loaded from,
+        so anything earlier (or any moment before it is loaded) has to be
+        answered from the books table.
+        """
+        return self.since is not None and moment >= self.since
+
+    def occupiedMask(self, start: datetime, end: datetime) -> int:
+        """
+        Return the bitset of tables with a reservation in some slot of [start, end).
+        """
+        mask = 0
+        first, last = slotSpan(start, end)
+        with self._lock:
+            for absolute in range(first, last):
+                day, slot = _slotDay(absolute)
+                slots = self._days.get(day)
+                if slots is not None:
+                    mask |= slots[slot]
+        return mask
+
+    def occupiedAt(self, moment: datetime) -> list:
+        """
+        Return the numbers of the tables occupied at `moment`.
+        """
+        mask = self.occupiedMask(moment, moment)
+        with self._lock:
+            return self._tables(mask)
+
+    def freeTables(self, table_numbers, start: datetime, end: datetime) -> list:
+        """
+        Filter the given table numbers down to the ones with no occupied slot in [start, end).
+
+        The answer is rounded to whole slots: a table whose reservation ends
+        at 14:05 is not free for a window starting at 14:10.
+        """
+        mask = self.occupiedMask(start, end)
+        with self._lock:
+            positions = self._positions
+            return [number for number in table_numbers
+                    if number not in positions or not mask >> positions[number] & 1]
+
+    def utilization(self, day: date, table_count: int) -> list:
+        """
+        Return the share of table time booked in each hour of a day.
+
+        Parameters:
+        day (date): The day.
+        table_count (int): Number of tables in the restaurant.
+
+        Returns:
+        list: 24 values between 0 and 1, one per hour.
+        """
+        slots_per_hour = 60 // SLOT_MINUTES
+        with self._lock:
+            slots = self._days.get(day) or [0] * SLOTS_PER_DAY
+            booked = [mask.bit_count() for mask in slots]
+        capacity = table_count * slots_per_hour
+        return [
+            round(sum(booked[hour * slots_per_hour:(hour + 1) * slots_per_hour]) / capacity, 4) if capacity else 0.0
+            for hour in range(24)
+        ]
+
+    def stats(self) -> dict:
+        """
+        Return the number of days, tables and reservations held and the memory the days use.
+        """
+        with self._lock:
+            size = sum(sys.getsizeof(slots) + sum(sys.getsizeof(mask) for mask in slots)
+                       for slots in self._days.values())
+            return {
+                "days": len(self._days),
+                "tables": len(self._numbers),
+                "reservations": len(self._books),
+                "shared_slots": len(self._shared),
+                "bytes": size,
+                "bytes_per_day": size // len(self._days) if self._days else 0,
+            }
+
+
+bitmap = OccupancyBitmap()
+
+
+def load(session, since: datetime = None):
+    """
+    Fill the bitmap from the books table.
+
+    Parameters:
+    session (Session): The database session used to read the reservations.
+    since (datetime, optional): Only load reservations ending after this
+        moment. Defaults to the start of today.
+    """
+    since = since or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    statement = select(Book.id, Book.table_number, Book.time, Book.end_time).where(Book.end_time > since)
+    loaded = OccupancyBitmap()
+    for book_id, table_number, start, end in session.execute(statement):
+        loaded.add(book_id, table_number, start, end)
+    loaded.since = since
+    bitmap.replace(loaded)
+
+
+def utilization(session, day: date, table_count: int) -> list:
+    """
+    Return the share of table time booked in each hour of a day.
+
+    From the bitmap if it holds the day; for the days before bitmap.since,
+    from the reservations of the day in books and books_archive, counted by
+    slot as the bitmap does.
+
+    Parameters:
+    session (Session): The database session.
+    day (date): The day.
+    table_count (int): Number of tables in the restaurant.
+
+    Returns:
+    list: 24 values between 0 and 1, one per hour.
+    """
+    start = datetime.combine(day, time())
+    if bitmap.covers(start):
+        return bitmap.utilization(day, table_count)
+    end = start + timedelta(days=1)
+    loaded = OccupancyBitmap()
+    for model in (Book, ArchivedBook):
+        statement = select(model.id, model.table_number, model.time, model.end_time).where(
+            model.time < end, model.end_time > start)
+        for book_id, table_number, book_start, book_end in session.execute(statement):
+            loaded.add(book_id, table_number, book_start, book_end)
+    return loaded.utilization(day, table_count)
+
+
+def _onBookCommit(action, values, previous):
+    if action in REMOVALS:
+        bitmap.remove(values["id"])
+    else:
+        bitmap.add(values["id"], values["table_number"], values["time"], values["end_time"])
+
+
+onCommit(Book, _onBookCommit)
+onReload(Book, load)
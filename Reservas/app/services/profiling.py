@@ -0,0 +1,373 @@
+"""
+Profile single requests on demand.
+
+With PROFILING_ENABLED the app profiles the requests that carry a valid
+X-Profile header, or a random PROFILING_SAMPLE_RATE share of them, and
+writes to PROFILING_DIR, per request:
+
+- <id>.speedscope.json (sampling mode, open it in https://www.speedscope.app)
+  or <id>.pstats (deterministic mode, python -m pstats or snakeviz);
+- <id>.summary.json: method, path, status, total and database time and
+  every SQL statement with its duration (without its parameters).
+
+The id is returned in the X-Profile-Id response header. The X-Profile
+header is "<expires>.<HMAC-SHA256 of 'expires:METHOD:path' with
+PROFILING_SECRET>"; this prints one valid for five minutes:
+
+    python -m app.services.profiling GET /books --ttl 300
+"""
+import argparse
+import cProfile
+import functools
+import hashlib
+import hmac
+import inspect
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import config
+
+# Sentencias SQL que se guardan por petición como mucho.
+MAX_STATEMENTS = 1000
+
+# Solo se perfila una petición a la vez en cada proceso: cProfile y el
+# muestreo del hilo del bucle de eventos no se pueden compartir.
+_active = threading.Lock()
+_saving = threading.Lock()
+
+# El modo determinista usa un cProfile por hilo (el del bucle de eventos y el
+# del threadpool). Desde Python 3.12 cProfile va sobre sys.monitoring y solo
+# puede haber uno activo en todo el proceso.
+DETERMINISTIC_SUPPORTED = sys.version_info < (3, 12)
+
+
+def profilingMode() -> str:
+    """
+    Return the mode of the runs: PROFILING_MODE, with "deterministic" turned
+    into "sampling" where it is not supported (see DETERMINISTIC_SUPPORTED).
+    """
+    if config.PROFILING_MODE == "deterministic" and not DETERMINISTIC_SUPPORTED:
+        return "sampling"
+    return config.PROFILING_MODE
+
+
+class StackSampler(threading.Thread):
+    """
+    Thread that records the call stack of some threads every `interval` seconds.
+
+    Each sample is weighted by the time since the previous one. The
+    interval is a target: the sampler needs the GIL, so a busy thread is
+    sampled about once per sys.getswitchinterval() (5 ms by default).
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self.threads = {}
+        self.samples = {}
+        self._stopped = threading.Event()
+
+    def run(self):
+        previous = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            now = time.perf_counter()
+            weight, previous = now - previous, now
+            frames = sys._current_frames()
+            for ident, label in list(self.threads.items()):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                if stack:
+                    stack.reverse()
+                    self.samples.setdefault(label, []).append((tuple(stack), weight))
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class ProfileRun:
+    """
+    One profiled request: its profilers, its SQL statements and its timings.
+
+    The event loop thread is profiled for the whole request; sync handlers
+    run in the threadpool, so profiledEndpoint adds the worker thread
+    while the handler runs. The event loop also serves the other requests
+    in flight, whose async parts show up in its profile too.
+    """
+
+    def __init__(self, method: str, path: str):
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-") or "root"
+        self.id = f"{datetime.now():%Y%m%d-%H%M%S}-{method}-{slug}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.mode = profilingMode()
+        self.status = None
+        self.statements = []
+        self.dropped_statements = 0
+        self.db_time = 0.0
+        self._profiles = []
+        self._sampler = None
+        self._loop_profile = None
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        if self.mode == "deterministic":
+            self._loop_profile = cProfile.Profile()
+            self._loop_profile.enable()
+        else:
+            self._sampler = StackSampler(config.PROFILING_INTERVAL_MS / 1000)
+            self._sampler.threads[threading.get_ident()] = "event loop"
+            self._sampler.start()
+
+    def callInThread(self, endpoint, args, kwargs):
+        """
+        Run a sync handler in the current (worker) thread under the profiler.
+        """
+        if self._sampler is None:
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(endpoint, *args, **kwargs)
+            finally:
+                self._profiles.append(profile)
+        ident = threading.get_ident()
+        self._sampler.threads[ident] = "endpoint"
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            self._sampler.threads.pop(ident, None)
+
+    def addStatement(self, statement: str, started: float, elapsed: float, executemany: bool):
+        self.db_time += elapsed
+        if len(self.statements) >= MAX_STATEMENTS:
+            self.dropped_statements += 1
+            return
+        self.statements.append({
+            "sql": statement,
+            "start_ms": round((started - self.started) * 1000, 3),
+            "duration_ms": round(elapsed * 1000, 3),
+            "executemany": executemany,
+        })
+
+    def stop(self, status: int):
+        self.elapsed = time.perf_counter() - self.started
+        self.status = status
+        if self._loop_profile is not None:
+            self._loop_profile.disable()
+            self._profiles.insert(0, self._loop_profile)
+        if self._sampler is not None:
+            self._sampler.stop()
+
+    def speedscope(self) -> dict:
+        """
+        Return the samples in the speedscope file format, one profile per thread.
+        """
+        frames, positions, profiles = [], {}, []
+        for label, samples in self._sampler.samples.items():
+            stacks, weights = [], []
+            for stack, weight in samples:
+                indexes = []
+                for frame in stack:
+                    if frame not in positions:
+                        positions[frame] = len(frames)
+                        frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                    indexes.append(positions[frame])
+                stacks.append(indexes)
+                weights.append(round(weight * 1000, 3))
+            profiles.append({"type": "sampled", "name": label, "unit": "milliseconds",
+                             "startValue": 0, "endValue": round(sum(weights), 3),
+                             "samples": stacks, "weights": weights})
+        return {"$schema": "https://www.speedscope.app/file-format-schema.json", "name": self.id,
+                "exporter": "reservas", "shared": {"frames": frames}, "profiles": profiles}
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id, "method": self.method, "path": self.path, "status": self.status, "mode": self.mode,
+            "duration_ms": round(self.elapsed * 1000, 3), "db_time_ms": round(self.db_time * 1000, 3),
+            "queries": len(self.statements) + self.dropped_statements,
+            "dropped_statements": self.dropped_statements, "statements": self.statements,
+        }
+
+
+# El perfil de la petición en curso (None si no se perfila). FastAPI copia el
+# contexto al threadpool y al greenlet de run_sync, como con metrics.current.
+current: ContextVar[Optional[ProfileRun]] = ContextVar("profile_run", default=None)
+
+
+def signature(method: str, path: str, expires: int) -> str:
+    message = f"{expires}:{method.upper()}:{path}".encode()
+    return hmac.new(config.PROFILING_SECRET.encode(), message, hashlib.sha256).hexdigest()
+
+
+def token(method: str, path: str, ttl: int = 300) -> str:
+    """
+    Return an X-Profile header value for one method and path, valid for `ttl` seconds.
+    """
+    expires = int(time.time()) + ttl
+    return f"{expires}.{signature(method, path, expires)}"
+
+
+def verify(value: str, method: str, path: str) -> bool:
+    """
+    Tell whether an X-Profile header is signed with PROFILING_SECRET for this request and not expired.
+    """
+    if not config.PROFILING_SECRET:
+        return False
+    expires, _, signed = value.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signed, signature(method, path, int(expires)))
+
+
+def selected(scope) -> bool:
+    """
+    Tell whether a request has to be profiled: a valid X-Profile header or the sampling rate.
+    """
+    header = dict(scope["headers"]).get(b"x-profile")
+    if header is not None:
+        return verify(header.decode("latin-1"), scope["method"], scope["path"])
+    return config.PROFILING_SAMPLE_RATE > 0 and random.random() < config.PROFILING_SAMPLE_RATE
+
+
+def start(method: str, path: str) -> Optional[ProfileRun]:
+    """
+    Start profiling a request in the event loop thread.
+
+    Returns:
+    ProfileRun: The run, or None if another request is being profiled or
+    another profiling tool (a debugger, coverage) holds the profiler.
+    """
+    if not _active.acquire(blocking=False):
+        return None
+    try:
+        return ProfileRun(method, path)
+    except ValueError:
+        _active.release()
+        return None
+    except Exception:
+        _active.release()
+        raise
+
+
+def stop(run: ProfileRun, status: int):
+    """
+    Stop the profilers of a run and let the next request be profiled.
+
+    It does not await anything, so the middleware calls it first in its
+    finally block: a request cancelled while its profile is being saved
+    cannot keep the lock.
+    """
+    try:
+        run.stop(status)
+    finally:
+        _active.release()
+
+
+def save(run: ProfileRun):
+    """
+    Write the profile and the summary of a stopped run and drop the oldest ones.
+    """
+    os.makedirs(config.PROFILING_DIR, exist_ok=True)
+    base = os.path.join(config.PROFILING_DIR, run.id)
+    if run.mode == "deterministic":
+        stats = pstats.Stats(run._profiles[0])
+        for profile in run._profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(base + ".pstats")
+    else:
+        with open(base + ".speedscope.json", "w") as file:
+            json.dump(run.speedscope(), file)
+    with open(base + ".summary.json", "w") as file:
+        json.dump(run.summary(), file, indent=1)
+    # Las ejecuciones se guardan fuera de _active y pueden coincidir.
+    with _saving:
+        _prune(config.PROFILING_DIR, config.PROFILING_MAX_PROFILES)
+
+
+def _prune(directory: str, keep: int):
+    names = os.listdir(directory)
+    # Los ids empiezan por la fecha, así que el orden alfabético es el cronológico.
+    ids = sorted({name.split(".")[0] for name in names if name.endswith(".summary.json")})
+    expired = set(ids[:-keep]) if keep else set()
+    for name in names:
+        if name.split(".")[0] in expired:
+            os.remove(os.path.join(directory, name))
+
+
+def profiledEndpoint(endpoint):
+    """
+    Wrap a sync route handler so a profiled request also profiles its worker thread.
+
+    Async handlers run in the event loop thread, which is already profiled,
+    and are returned unchanged.
+    """
+    if inspect.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    def profiled(*args, **kwargs):
+        run = current.get()
+        if run is None:
+            return endpoint(*args, **kwargs)
+        return run.callInThread(endpoint, args, kwargs)
+    return profiled
+
+
+def _beforeExecute(conn, cursor, statement, parameters, context, executemany):
+    if current.get() is not None:
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+
+def _afterExecute(conn, cursor, statement, parameters, context, executemany):
+    run = current.get()
+    if run is not None and conn.info.get("profile_started"):
+        started = conn.info["profile_started"].pop()
+        run.addStatement(statement, started, time.perf_counter() - started, executemany)
+
+
+def _queryError(context):
+    started = context.connection.info.get("profile_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+_installed = False
+
+
+def install():
+    """
+    Register the SQL hooks; called once from main.py when PROFILING_ENABLED is set.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    if profilingMode() != config.PROFILING_MODE:
+        print("PROFILING_MODE=deterministic necesita Python 3.11 o anterior; se usa sampling")
+    event.listen(Engine, "before_cursor_execute", _beforeExecute)
+    event.listen(Engine, "after_cursor_execute", _afterExecute)
+    event.listen(Engine, "handle_error", _queryError)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera una cabecera X-Profile firmada con PROFILING_SECRET")
+    parser.add_argument("method", help="Método de la petición, p. ej. GET")
+    parser.add_argument("path", help="Ruta de la petición sin query string, p. ej. /books")
+    parser.add_argument("--ttl", type=int, default=300, help="Segundos de validez")
+    args = parser.parse_args()
+    if not config.PROFILING_SECRET:
+        parser.error("PROFILING_SECRET no está definido")
+    print(f"X-Profile: {token(args.method, args.path, args.ttl)}")
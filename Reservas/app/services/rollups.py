@@ -0,0 +1,283 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, delete, func, insert, literal, select, text, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from starlette.concurrency import run_in_threadpool
+from app import config
+from app.database.connection import SessionLocal
+from app.database.events import onFlush
+from app.models.modelsDB import ArchivedBook, Book, Table, UtilizationDelta, UtilizationRollup
+
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+METRICS = ("reservations", "covers", "no_shows", "table_seconds", "seat_seconds")
+
+# Máximo de intervalos que devuelve un informe (unos 83 días por horas).
+MAX_BUCKETS = 2000
+
+INSERT_BATCH_SIZE = 1000
+
+DELTA_COLUMNS = ("time", "end_time", "no_show", "count", "seats")
+
+# Aportación de una reserva con las plazas de su mesa, leídas en el mismo
+# INSERT.
+DELTA_STATEMENT = insert(UtilizationDelta).values(
+    time=bindparam("start"), end_time=bindparam("end"), no_show=bindparam("absent"), count=bindparam("sign"),
+    seats=bindparam("sign") * func.coalesce(
+        select(Table.seats).where(Table.number == bindparam("table")).scalar_subquery(), 0),
+)
+
+
+def bucketStart(moment: datetime, granularity: str) -> datetime:
+    """
+    Return the start of the hour or day that contains `moment`.
+    """
+    start = moment.replace(minute=0, second=0, microsecond=0)
+    return start.replace(hour=0) if granularity == "day" else start
+
+
+def addContribution(totals: dict, start: datetime, end: datetime, no_show: bool, count: int, seats: int):
+    """
+    Add what one reservation contributes to each hourly and daily rollup.
+
+    The reservation, its covers (the seats of its table) and its no-show
+    count in the hour and day it starts; its table and seat time is split
+    over every hour and day it spans.
+
+    Parameters:
+    totals (dict): (granularity, bucket) -> list of METRICS values, updated in place.
+    start (datetime): When the reservation starts.
+    end (datetime): When it ends.
+    no_show (bool): Whether the customer did not show up.
+    count (int): 1 to add the reservation, -1 to take it out, 0 to only
+        change its seats.
+    seats (int): Seats added (or taken out, if negative) with it.
+    """
+    for granularity, step in GRANULARITIES.items():
+        bucket = bucketStart(start, granularity)
+        row = totals[(granularity, bucket)]
+        row[0] += count
+        row[1] += seats
+        row[2] += count if no_show else 0
+        while bucket < end:
+            seconds = int((min(end, bucket + step) - max(start, bucket)).total_seconds())
+            row = totals[(granularity, bucket)]
+            row[3] += count * seconds
+            row[4] += seats * seconds
+            bucket += step
+
+
+def _totals() -> dict:
+    return defaultdict(lambda: [0] * len(METRICS))
+
+
+def applyTotals(connection, totals: dict):
+    """
+    Add the totals to the stored rollups with one INSERT ... ON CONFLICT DO UPDATE.
+
+    Rows are written in key order so concurrent transactions lock them in
+    the same order and cannot deadlock each other.
+    """
+    rows = [dict(zip(METRICS, values), granularity=granularity, bucket=bucket)
+            for (granularity, bucket), values in sorted(totals.items()) if any(values)]
+    if not rows:
+        return
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(UtilizationRollup.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=["granularity", "bucket"],
+        set_={name: getattr(UtilizationRollup, name) + statement.excluded[name] for name in METRICS},
+    )
+    connection.execute(statement, rows)
+
+
+def _delta(values: dict, sign: int) -> dict:
+    return {"start": values["time"], "end": values["end_time"], "absent": values["no_show"],
+            "sign": sign, "table": values["table_number"]}
+
+
+def _onBookFlush(session, changes):
+    # Solo se añaden filas a utilization_deltas: las reservas de la misma hora
+    # o del mismo día no se bloquean unas a otras en sus agregados.
+    deltas = []
+    for action, values, previous in changes:
+        if action != "create":
+            deltas.append(_delta(previous, -1))
+        if action != "delete":
+            deltas.append(_delta(values, 1))
+    session.connection().execute(DELTA_STATEMENT, deltas)
+
+
+def _onTableFlush(session, changes):
+    # Un cambio de plazas cambia los cubiertos y el tiempo por plaza de todas
+    # las reservas de la mesa, también las archivadas.
+    connection = session.connection()
+    for action, values, previous in changes:
+        difference = values["seats"] - previous["seats"]
+        if action != "update" or not difference:
+            continue
+        for model in (Book, ArchivedBook):
+            connection.execute(insert(UtilizationDelta).from_select(list(DELTA_COLUMNS), select(
+                model.time, model.end_time, model.no_show, literal(0), literal(difference),
+            ).where(model.table_number == values["number"])))
+
+
+def fold(session) -> int:
+    """
+    Add the pending utilization_deltas to the rollups and delete them.
+
+    Each batch is deleted with DELETE ... RETURNING and added in the same
+    transaction, so a delta is counted once even if several workers fold at
+    the same time, and the deltas of transactions still open are left for
+    the next call.
+
+    Parameters:
+    session (Session): A sync session on the primary database.
+
+    Returns:
+    int: The number of deltas folded.
+    """
+    folded = 0
+    while True:
+        batch = select(UtilizationDelta.id).order_by(UtilizationDelta.id).limit(INSERT_BATCH_SIZE)
+        rows = session.execute(delete(UtilizationDelta).where(UtilizationDelta.id.in_(batch)).returning(
+            *(getattr(UtilizationDelta, name) for name in DELTA_COLUMNS))).all()
+        if not rows:
+            return folded
+        totals = _totals()
+        for row in rows:
+            addContribution(totals, *row)
+        applyTotals(session.connection(), totals)
+        session.commit()
+        folded += len(rows)
+
+
+def _fold():
+    session = SessionLocal()
+    try:
+        fold(session)
+    except Exception as e:
+        session.rollback()
+        print(f"Error al sumar los cambios al informe de utilización: {e}")
+    finally:
+        session.close()
+
+
+async def foldPeriodically():
+    """
+    Fold the pending deltas every ROLLUPS_FOLD_SECONDS.
+
+    Started by the lifespan of the app; runs until cancelled.
+    """
+    while True:
+        await asyncio.sleep(config.ROLLUPS_FOLD_SECONDS)
+        await run_in_threadpool(_fold)
+
+
+def rebuild(session) -> tuple:
+    """
+    Recompute every rollup from books and books_archive.
+
+    The pending deltas are dropped, since the result already counts them.
+    On Postgres both tables are locked first, so reservations written
+    meanwhile wait and are added on top of the result; on SQLite the
+    DELETE takes the database write lock. Reservations made with bulk
+    statements (bulk_insert_mappings, imports) are only counted after a rebuild.
+
+    Parameters:
+    session (Session): A sync session on the primary database.
+
+    Returns:
+    tuple: (rollups written, reservations read).
+    """
+    connection = session.connection()
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("LOCK TABLE utilization_rollups, utilization_deltas IN EXCLUSIVE MODE"))
+    connection.execute(delete(UtilizationRollup))
+    connection.execute(delete(UtilizationDelta))
+    reservations = union_all(*(
+        select(model.time, model.end_time, model.no_show, model.table_number) for model in (Book, ArchivedBook)
+    )).subquery()
+    statement = select(reservations.c.time, reservations.c.end_time, reservations.c.no_show,
+                       func.coalesce(Table.seats, 0)).outerjoin(Table, Table.number == reservations.c.table_number)
+    totals = _totals()
+    read = 0
+    for start, end, no_show, seats in connection.execute(statement, execution_options={"yield_per": 10000}):
+        addContribution(totals, start, end, no_show, 1, seats)
+        read += 1
+    keys = sorted(totals)
+    for position in range(0, len(keys), INSERT_BATCH_SIZE):
+        applyTotals(connection, {key: totals[key] for key in keys[position:position + INSERT_BATCH_SIZE]})
+    session.commit()
+    return len(totals), read
+
+
+def report(session, start: datetime, end: datetime, granularity: str) -> dict:
+    """
+    Build the utilization report of [start, end) from the rollups.
+
+    The deltas not folded into them yet are added on the fly.
+
+    Parameters:
+    session (Session): The database session.
+    start (datetime): First moment of the report; rounded down to its hour or day.
+    end (datetime): End of the report (exclusive).
+    granularity (str): "hour" or "day".
+
+    Returns:
+    dict: The restaurant capacity (tables and seats, as they are now), one
+    entry per bucket (empty ones included) and the totals. Utilization is
+    the booked share of table time and seat_utilization that of seat time;
+    no_show_rate is no-shows over reservations. Raises ValueError if the
+    range is empty or has more than MAX_BUCKETS buckets.
+    """
+    step = GRANULARITIES[granularity]
+    first = bucketStart(start, granularity)
+    if end <= first:
+        raise ValueError("El final del informe tiene que ser posterior al inicio")
+    if (end - first) / step > MAX_BUCKETS:
+        raise ValueError(f"El informe no puede tener más de {MAX_BUCKETS} intervalos")
+
+    tables, seats = session.execute(select(func.count(), func.coalesce(func.sum(Table.seats), 0))).one()
+    stored = {row[0]: row[1:] for row in session.execute(
+        select(UtilizationRollup.bucket, *(getattr(UtilizationRollup, name) for name in METRICS))
+        .where(UtilizationRollup.granularity == granularity,
+               UtilizationRollup.bucket >= first, UtilizationRollup.bucket < end)
+    )}
+    pending = _totals()
+    for row in session.execute(select(*(getattr(UtilizationDelta, name) for name in DELTA_COLUMNS))
+                               .where(UtilizationDelta.time < end, UtilizationDelta.end_time > first)):
+        addContribution(pending, *row)
+
+    def entry(values, seconds: float) -> dict:
+        reservations, covers, no_shows, table_seconds, seat_seconds = values
+        return {
+            "reservations": reservations,
+            "covers": covers,
+            "no_shows": no_shows,
+            "no_show_rate": round(no_shows / reservations, 4) if reservations else 0.0,
+            "utilization": round(table_seconds / (tables * seconds), 4) if tables else 0.0,
+            "seat_utilization": round(seat_seconds / (seats * seconds), 4) if seats else 0.0,
+        }
+
+    buckets, totals = [], [0] * len(METRICS)
+    bucket = first
+    while bucket < end:
+        values = [value + change for value, change in zip(
+            stored.get(bucket, (0,) * len(METRICS)), pending.get((granularity, bucket), (0,) * len(METRICS)))]
+        totals = [total + value for total, value in zip(totals, values)]
+        buckets.append(dict(entry(values, step.total_seconds()), start=bucket.isoformat()))
+        bucket += step
+    return {
+        "granularity": granularity,
+        "from": first.isoformat(),
+        "to": bucket.isoformat(),
+        "tables": tables,
+        "seats": seats,
+        "buckets": buckets,
+        "totals": entry(totals, len(buckets) * step.total_seconds()),
+    }
+
+
+onFlush(Book, _onBookFlush)
+onFlush(Table, _onTableFlush)
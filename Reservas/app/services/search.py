@@ -0,0 +1,272 @@
+import heapq
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from sqlalchemy import and_, func, or_, select
+from app import config
+from app.database.events import REMOVALS, onCommit, onReload
+from app.models.modelsDB import Customer, telDigits, unaccented
+
+# Longitud mínima de un término para buscarlo en el índice de trigramas.
+MIN_TERM_LENGTH = 3
+
+PHONE_SEPARATORS = str.maketrans("", "", " +-().")
+
+# Separa los campos de un cliente dentro de su documento indexado.
+FIELD_SEPARATOR = "\x01"
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercase `text` and strip its accents ("Peña" -> "pena").
+    """
+    if not text or text.isascii():
+        return (text or "").lower()
+    decomposed = unicodedata.normalize("NFKD", (text or "").lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def searchTerms(query: str) -> list:
+    """
+    Split a search query into normalized terms.
+
+    Terms that look like a phone number lose their separators, as the
+    indexed phone numbers do ("300-123" -> "300123").
+    """
+    terms = []
+    for term in normalize(query).split():
+        digits = term.translate(PHONE_SEPARATORS)
+        terms.append(digits if digits.isdigit() else term)
+    return terms
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _document(name: str, email: str, tel: str) -> str:
+    fields = (normalize(name), normalize(email), (tel or "").translate(PHONE_SEPARATORS))
+    return FIELD_SEPARATOR + FIELD_SEPARATOR.join(fields) + FIELD_SEPARATOR
+
+
+def _documentTrigrams(document: str) -> set:
+    return set().union(*map(_trigrams, document.split(FIELD_SEPARATOR)))
+
+
+def _patterns(term: str) -> tuple:
+    """
+    Return what a document is checked against for one term.
+
+    The term itself (it must appear somewhere), the whole-field and
+    field-prefix forms and a search for a word starting with it (words end
+    at spaces, dots, @, - and _).
+    """
+    return (term, f"{FIELD_SEPARATOR}{term}{FIELD_SEPARATOR}", FIELD_SEPARATOR + term,
+            re.compile(f"[ .@_-]{re.escape(term)}").search)
+
+
+class CustomerSearchIndex:
+    """
+    In-memory trigram index over the name, email and phone of every customer.
+
+    Each customer is kept as one string, its normalized fields joined by
+    FIELD_SEPARATOR, and each trigram maps to the sorted ids of the
+    customers containing it, in an array of 4-byte integers. A query takes
+    the rarest trigram of its terms, checks the customers in that list
+    against every term (substring match on the document) and ranks the
+    matches: whole field, field prefix, word prefix, then anywhere in a field.
+
+    Like the availability index it lives in the process, is loaded at
+    startup and is updated from the customer writes committed by this and
+    the other workers (app.database.events.catchUp); catchUp() below adds
+    any customer with a higher id that it has not seen. Every worker holds
+    the whole index, so it is only used with CUSTOMER_SEARCH_BACKEND=memory.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._documents = {}
+        self.last_id = 0
+        self.loaded = False
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self.last_id = 0
+            self.loaded = False
+
+    def add(self, customer_id: int, name: str, email: str, tel: str):
+        document = _document(name, email, tel)
+        with self._lock:
+            self._remove(customer_id)
+            self._documents[customer_id] = document
+            self.last_id = max(self.last_id, customer_id)
+            for gram in _documentTrigrams(document):
+                ids = self._postings.get(gram)
+                if ids is None:
+                    self._postings[gram] = array("I", (customer_id,))
+                elif ids[-1] < customer_id:
+                    ids.append(customer_id)
+                else:
+                    position = bisect_left(ids, customer_id)
+                    if position == len(ids) or ids[position] != customer_id:
+                        ids.insert(position, customer_id)
+
+    def remove(self, customer_id: int):
+        with self._lock:
+            self._remove(customer_id)
+
+    def _remove(self, customer_id: int):
+        document = self._documents.pop(customer_id, None)
+        if document is None:
+            return
+        for gram in _documentTrigrams(document):
+            ids = self._postings.get(gram)
+            if ids is None:
+                continue
+            position = bisect_left(ids, customer_id)
+            if position < len(ids) and ids[position] == customer_id:
+                del ids[position]
+            if not ids:
+                del self._postings[gram]
+
+    def search(self, terms: list, limit: int) -> list:
+        """
+        Find the customers matching every term, best first.
+
+        Parameters:
+        terms (list): Normalized terms (see searchTerms); at least one must
+            have MIN_TERM_LENGTH characters.
+        limit (int): Maximum number of results.
+
+        Returns:
+        list: Up to `limit` (score, customer id) pairs, highest score first.
+        """
+        grams = set().union(*(_trigrams(term) for term in terms))
+        patterns = [_patterns(term) for term in terms]
+        with self._lock:
+            postings = [self._postings.get(gram, ()) for gram in grams]
+            candidates = min(postings, key=len) if postings else ()
+            documents = self._documents
+            matches = []
+            for customer_id in candidates:
+                document = documents[customer_id]
+                score = 0
+                # Whole field 4, field prefix 3, word prefix 2, anywhere 1.
+                for term, whole, prefix, word in patterns:
+                    if term not in document:
+                        break
+                    score += 4 if whole in document else 3 if prefix in document else 2 if word(document) else 1
+                else:
+                    matches.append((-score, document.index(FIELD_SEPARATOR, 1), customer_id))
+        return [(-score, customer_id) for score, _, customer_id in heapq.nsmallest(limit, matches)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "customers": len(self._documents),
+                "trigrams": len(self._postings),
+                "postings": sum(len(ids) for ids in self._postings.values()),
+                "postings_bytes": sum(ids.buffer_info()[1] * ids.itemsize for ids in self._postings.values()),
+            }
+
+
+index = CustomerSearchIndex()
+
+
+def usesDatabase() -> bool:
+    """
+    Tell whether searches go to the database or to the in-memory index.
+
+    The in-memory index is only used with CUSTOMER_SEARCH_BACKEND=memory.
+    """
+    return config.CUSTOMER_SEARCH_BACKEND != "memory"
+
+
+def load(session):
+    """
+    Fill the in-memory index with every customer (if it is the backend in use).
+    """
+    index.clear()
+    if not usesDatabase():
+        catchUp(session)
+
+
+def catchUp(session):
+    """
+    Index the customers with an id above the highest one indexed.
+
+    Customers created by other workers are picked up this way; a single
+    query on the primary key that usually returns nothing.
+    """
+    statement = select(Customer.id, Customer.name, Customer.email, Customer.tel).where(Customer.id > index.last_id)
+    for row in session.execute(statement.order_by(Customer.id), execution_options={"yield_per": 10000}):
+        index.add(*row)
+    index.loaded = True
+
+
+def databaseSearch(terms: list, limit: int, ranked: bool = True):
+    """
+    Build the database query: every term in the name, email or phone of the customer.
+
+    Names and emails are compared without accents (unaccented) and phones
+    by their digits, the same expressions the Postgres GIN gin_trgm_ops
+    indexes hold (see modelsDB.Customer); the terms are already normalized.
+
+    Parameters:
+    terms (list): Normalized terms (see searchTerms).
+    limit (int): Maximum number of results.
+    ranked (bool): Order by pg_trgm similarity (Postgres only); otherwise
+        shortest name first.
+    """
+    fields = (unaccented(Customer.name), unaccented(Customer.email), telDigits(Customer.tel))
+    conditions = []
+    for term in terms:
+        pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append(or_(*(field.ilike(pattern, escape="\\") for field in fields)))
+    if ranked:
+        query = " ".join(terms)
+        order = (func.greatest(*(func.similarity(field, query) for field in fields)).desc(), Customer.id)
+    else:
+        order = (func.length(Customer.name), Customer.id)
+    return select(Customer.id).where(and_(*conditions)).order_by(*order).limit(limit)
+
+
+def search(session, query: str, limit: int) -> list:
+    """
+    Return the ids of the customers that best match `query`.
+
+    Parameters:
+    session (Session): The database session.
+    query (str): What the user typed: part of a name, email or phone number.
+    limit (int): Maximum number of results.
+
+    Returns:
+    list: Customer ids, best match first. Raises ValueError if no term is
+    long enough to search for.
+    """
+    terms = searchTerms(query)
+    if not any(len(term) >= MIN_TERM_LENGTH for term in terms):
+        raise ValueError(f"La búsqueda necesita al menos un término de {MIN_TERM_LENGTH} caracteres")
+    if usesDatabase():
+        ranked = session.get_bind().dialect.name == "postgresql"
+        return list(session.execute(databaseSearch(terms, limit, ranked)).scalars())
+    catchUp(session)
+    return [customer_id for _, customer_id in index.search(terms, limit)]
+
+
+def _onCustomerCommit(action, values, previous):
+    if not index.loaded:
+        return
+    if action in REMOVALS:
+        index.remove(values["id"])
+    else:
+        index.add(values["id"], values["name"], values["email"], values["tel"])
+
+
+onCommit(Customer, _onCustomerCommit)
+onReload(Customer, load)
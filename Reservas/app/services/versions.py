@@ -0,0 +1,53 @@
+import uuid
+from typing import Optional
+from app.database import events
+
+# Identifica este proceso en los ids de /events.
+BOOT_ID = uuid.uuid4().hex[:8]
+
+
+def etag(*names: str, suffix: str = "") -> str:
+    """
+    Return the current ETag of one or more resource collections.
+
+    The ETag changes on every committed write to any of the collections, so
+    it is valid for the list and for the detail endpoints of a resource, and
+    for expanded views that embed other resources. The versions are the ids
+    of the shared change log (see app.database.events.version), so every
+    worker gives the same ETag for the same data, also after writes made by
+    another worker or by a command line script.
+
+    Parameters:
+    names (str): "tables", "customers" and/or "books".
+    suffix (str, optional): Anything else the representation depends on.
+
+    Returns:
+    str: A quoted entity tag such as "tables-42".
+    """
+    parts = [f"{name}-{events.version(name)}" for name in names] + ([suffix] if suffix else [])
+    return '"' + "-".join(parts) + '"'
+
+
+def matches(if_none_match: Optional[str], current: str) -> bool:
+    """
+    Tell whether an If-None-Match header matches the current ETag.
+
+    Parameters:
+    if_none_match (str, optional): The raw header value; it can be "*" or a
+        comma separated list of (possibly weak) entity tags.
+    current (str): The current ETag.
+
+    Returns:
+    bool: True if the client already has the current representation.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == current:
+            return True
+    return False
@@ -0,0 +1,142 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class WriterStopped(Exception):
+    """
+    Raised by GroupCommitWriter.submit once the writer has been stopped.
+    """
+
+
+class GroupCommitWriter:
+    """
+    Background thread that writes queued items in batches, one transaction per batch.
+
+    Callers submit an item and wait on the returned Future. The writer takes
+    the first waiting item, keeps collecting until it has `max_batch` items
+    or `max_wait` seconds have passed, and hands the batch to `process`,
+    which returns one result per item, in order. Under a burst many
+    requests share one commit (and one fsync); when idle an item waits at
+    most `max_wait` before it is written.
+
+    If `process` raises for a batch of several items, they are retried one
+    by one so a single bad item cannot fail the rest. Items whose Future was
+    cancelled before their batch started are not written.
+    """
+
+    def __init__(self, process, max_batch: int, max_wait: float):
+        self.process = process
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stopped = False
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item) -> Future:
+        """
+        Queue an item for the next batch.
+
+        Returns:
+        Future: Resolves with the result `process` returned for the item, or
+        with its exception. Raises WriterStopped after stop().
+        """
+        future = Future()
+        with self._lock:
+            if self._stopped:
+                raise WriterStopped("La escritura agrupada está detenida")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((item, future))
+        return future
+
+    def start(self):
+        """
+        Accept items again after stop().
+        """
+        with self._lock:
+            self._stopped = False
+
+    def stop(self, timeout: float = 5) -> bool:
+        """
+        Stop accepting items, write what is already queued and wait for the thread.
+
+        Returns:
+        bool: True if the thread finished within `timeout`; otherwise it goes
+        on with the queued items and ends after them.
+        """
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+            if thread is None:
+                return True
+            self._queue.put(_STOP)
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "average_batch": round(self.items / self.batches, 2) if self.batches else 0,
+            "queued": self._queue.qsize(),
+        }
+
+    def _finish(self) -> bool:
+        # The thread ends at a _STOP only if the writer is still stopped, and
+        # clears _thread itself, so a submit after start() never waits on a
+        # thread that is about to end.
+        with self._lock:
+            if self._stopped:
+                self._thread = None
+            return self._stopped
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                if self._finish():
+                    return
+                continue
+            batch = [first]
+            stopping = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if batch:
+                self.batches += 1
+                self.items += len(batch)
+                self._write(batch)
+            if stopping and self._finish():
+                return
+
+    def _write(self, batch: list):
+        try:
+            results = self.process([item for item, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                for entry in batch:
+                    self._write([entry])
+                return
+            batch[0][1].set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
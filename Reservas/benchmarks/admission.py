@@ -0,0 +1,100 @@
+"""
+Measure how a noisy client affects a polite one, with and without admission control.
+
+The noisy client sends `--noisy` GET /books requests with `--noisy-concurrency`
+in flight under one X-API-Key. At the same time a polite client sends
+`--polite` requests, `--polite-rate` per second, under another key. Each
+mode runs in its own process, because ADMISSION_CONTROL is read when the
+app is imported, on a fresh SQLite file unless DATABASE_URL is set. The report has the status
+codes of both clients, the latency of the polite one and the admission
+counters.
+
+    python -m benchmarks.admission --noisy 3000 --noisy-concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import drive, report, seed, summary
+
+
+def run_mode(args):
+    import httpx
+    from app.database.connection import SessionLocal
+    from app.main import app
+    from app.services import admission
+
+    session = SessionLocal()
+    seed(session, 50, 100, 5000)
+    session.close()
+
+    def requester(key):
+        async def make_request(client, i):
+            return await client.get("/books", params={"limit": 50, "offset": i % 50 * 50}, headers={"X-API-Key": key})
+        return make_request
+
+    async def polite(client):
+        latencies, statuses = [], {}
+        started = time.perf_counter()
+        for i in range(args.polite):
+            sent = time.perf_counter()
+            response = await requester("polite")(client, i)
+            latencies.append(time.perf_counter() - sent)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            await asyncio.sleep(max(0.0, sent + 1 / args.polite_rate - time.perf_counter()))
+        return latencies, statuses, time.perf_counter() - started
+
+    async def main():
+        transport = httpx.ASGITransport(app=app, client=("10.0.0.1", 1234))
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                (_, noisy_statuses, _), (latencies, polite_statuses, elapsed) = await asyncio.gather(
+                    drive(client, requester("noisy"), args.noisy, args.noisy_concurrency),
+                    polite(client),
+                )
+        result = {"noisy_statuses": noisy_statuses, "polite_statuses": polite_statuses,
+                  "polite": summary(latencies, elapsed)}
+        if os.environ.get("ADMISSION_CONTROL") == "1":
+            result["admission"] = admission.stats()
+        return result
+
+    print(json.dumps(asyncio.run(main())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--noisy", type=int, default=3000)
+    parser.add_argument("--noisy-concurrency", type=int, default=64)
+    parser.add_argument("--polite", type=int, default=100)
+    parser.add_argument("--polite-rate", type=float, default=10)
+    parser.add_argument("--mode", choices=("off", "on"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    results = {"params": {key: value for key, value in vars(args).items() if key != "mode"}}
+    for mode in ("off", "on"):
+        env = dict(os.environ)
+        if "DATABASE_URL" not in os.environ:
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='reservas-admission-'), 'admission.db')}"
+        env["ADMISSION_CONTROL"] = "1" if mode == "on" else "0"
+        env["CACHE_ENABLED"] = "0"
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.admission", "--mode", mode, "--noisy", str(args.noisy),
+             "--noisy-concurrency", str(args.noisy_concurrency), "--polite", str(args.polite),
+             "--polite-rate", str(args.polite_rate)],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        results[mode] = json.loads(output.stdout.strip().splitlines()[-1])
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Time POST /books/allocate for a peak-hour batch of parties.
+
+Seeds `--tables` tables (2 to 8 seats) with reservations on `--fill` of
+their evening slots, then allocates `--parties` parties of 2 to 8 people
+asking for 19:00 to 21:00, some willing to wait up to an hour:
+
+- allocate: allocation.allocate (both queries plus the bitmask plan);
+- http: the whole request through the app, with commit=false;
+- scan: the same order of parties checking every table in turn with
+  AvailabilityIndex, best fit (tables by seats) and first fit (tables by
+  number, what picking any free table amounts to).
+
+For each one the report has the latency, the parties seated and the
+seats left empty at their tables.
+
+    python -m benchmarks.allocation --tables 300 --parties 500
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import percentile, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tables", type=int, default=300)
+    parser.add_argument("--parties", type=int, default=500)
+    parser.add_argument("--fill", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        workdir = tempfile.mkdtemp(prefix="reservas-allocation-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'allocation.db')}"
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import select
+    from app.database.connection import SessionLocal, createSchema
+    from app.main import app
+    from app.models.modelsDB import Book, Customer, Table
+    from app.models.pydanticModels import PartyAllocation
+    from app.models.utilities import bookingEnd
+    from app.services.allocation import allocate
+    from app.services.availability import AvailabilityIndex
+
+    createSchema()
+    session = SessionLocal()
+    rng = random.Random(42)
+    day = (datetime.now() + timedelta(days=7)).replace(hour=0, minute=0, second=0, microsecond=0)
+    session.bulk_insert_mappings(Table, [{"number": n, "seats": rng.choice((2, 2, 2, 4, 4, 4, 6, 8)), "is_occupied": False}
+                                         for n in range(1, args.tables + 1)])
+    session.bulk_insert_mappings(Customer, [{"idcustomer": f"C{n}", "name": f"Cliente {n}", "email": f"c{n}@example.com"}
+                                            for n in range(args.parties)])
+    session.bulk_insert_mappings(Book, [
+        {"table_number": n, "customer_id": f"C{rng.randrange(args.parties)}",
+         "time": day + timedelta(hours=hour), "end_time": day + timedelta(hours=hour + 2)}
+        for n in range(1, args.tables + 1) for hour in (13, 18, 20, 22) if rng.random() < args.fill
+    ])
+    session.commit()
+
+    parties = [PartyAllocation(
+        customer_id=f"C{n}", size=rng.choice((2, 2, 2, 2, 3, 3, 4, 4, 4, 5, 6, 7, 8)),
+        time=day + timedelta(hours=19, minutes=15 * rng.randrange(9)), max_wait=rng.choice((0, 0, 30, 60)),
+    ) for n in range(args.parties)]
+
+    def summary(assignments, samples) -> dict:
+        return {"p50_ms": round(percentile(samples, 50) * 1000, 1), "p99_ms": round(percentile(samples, 99) * 1000, 1),
+                "seated": len(assignments), "wasted_seats": sum(item["wasted_seats"] for item in assignments)}
+
+    def timed(function) -> tuple:
+        function()
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = function()
+            samples.append(time.perf_counter() - started)
+        return result, samples
+
+    def scan(by_seats: bool) -> list:
+        tables = session.execute(select(Table.number, Table.seats)).all()
+        tables.sort(key=(lambda table: (table[1], table[0])) if by_seats else (lambda table: table[0]))
+        taken = AvailabilityIndex()
+        for book_id, table_number, start, end in session.execute(select(Book.id, Book.table_number, Book.time, Book.end_time)
+                                                                 .where(Book.time < day + timedelta(days=1), Book.end_time > day)):
+            taken.add(book_id, table_number, start, end)
+        assignments = []
+        for index in sorted(range(len(parties)), key=lambda index: (parties[index].time, -parties[index].size, index)):
+            party = parties[index]
+            for wait in range(0, party.max_wait + 1, 15):
+                start = party.time + timedelta(minutes=wait)
+                end = bookingEnd(start, party.duration)
+                table = next((table for table in tables if table[1] >= party.size
+                              and taken.isFree(table[0], start, end)), None)
+                if table is not None:
+                    taken.add(-(index + 1), table[0], start, end)
+                    assignments.append({"wasted_seats": table[1] - party.size})
+                    break
+        return assignments
+
+    (assignments, _), samples = timed(lambda: allocate(session, parties))
+    results = {"params": vars(args), "allocate": summary(assignments, samples)}
+
+    client = TestClient(app)
+    body = {"parties": [party.model_dump(mode="json") for party in parties]}
+    response, samples = timed(lambda: client.post("/books/allocate", json=body))
+    results["http"] = summary(response.json()["assignments"], samples)
+
+    scan_repeat, args.repeat = args.repeat, max(1, args.repeat // 10)
+    results["scan_best_fit"] = summary(*timed(lambda: scan(True)))
+    results["scan_first_fit"] = summary(*timed(lambda: scan(False)))
+    args.repeat = scan_repeat
+    session.close()
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
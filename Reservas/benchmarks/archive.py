@@ -0,0 +1,87 @@
+"""
+Measure the hot-path queries on books before and after archiving the history.
+
+Seeds `--books` reservations over two years (the last 30 days still to
+come), times the queries that touch books on every request or at startup,
+archives everything that ended more than `--days` days ago and times them
+again. On SQLite the size of each table and index is read from dbstat.
+
+- overlap: availability.overlappingBook for a future slot;
+- customer: the reservations of one customer (expand=reservations);
+- startup: availability.load + occupancy.load, run by every worker at boot;
+- page: the first page of GET /books for one table from today.
+
+    python -m benchmarks.archive --books 200000 --days 30
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import report, seed
+
+
+def timed(function, repeat: int) -> float:
+    function()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return round((time.perf_counter() - started) / repeat * 1e6, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=200000)
+    parser.add_argument("--tables", type=int, default=50)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        workdir = tempfile.mkdtemp(prefix="reservas-archive-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'archive.db')}"
+
+    from sqlalchemy import select, text
+    from app.database.connection import SessionLocal
+    from app.models.modelsDB import Book
+    from app.models.utilities import BOOK_COLUMNS, keysetPage
+    from app.services import availability, occupancy
+    from app.services.archive import archiveBooks, archiveCutoff
+
+    session = SessionLocal()
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    days = max(30, -(-args.books // (args.tables * 6)))
+    seed(session, args.tables, 100, args.books, start=today.replace(hour=12) - timedelta(days=days - 30))
+    slot = today + timedelta(days=3, hours=13)
+
+    def measure() -> dict:
+        result = {
+            "hot_books": session.execute(text("SELECT COUNT(*) FROM books")).scalar(),
+            "overlap_us": timed(lambda: availability.overlappingBook(session, 7, slot, slot + timedelta(hours=2)),
+                                args.repeat),
+            "customer_us": timed(lambda: session.execute(select(*BOOK_COLUMNS).where(Book.customer_id == "C7")).all(),
+                                 args.repeat),
+            "page_us": timed(lambda: keysetPage(session, select(*BOOK_COLUMNS).where(
+                Book.table_number == 7, Book.time >= today), Book.id, 100), args.repeat),
+            "startup_ms": round(timed(lambda: (availability.load(session), occupancy.load(session)), 5) / 1000, 1),
+        }
+        if session.bind.dialect.name == "sqlite":
+            sizes = session.execute(text(
+                "SELECT name, SUM(pgsize) FROM dbstat WHERE name LIKE '%books%' GROUP BY name")).all()
+            result["kib"] = {name: size // 1024 for name, size in sizes}
+        return result
+
+    results = {"params": vars(args), "before": measure()}
+    started = time.perf_counter()
+    moved = archiveBooks(session, archiveCutoff(args.days))
+    results["archive"] = {"moved": moved, "seconds": round(time.perf_counter() - started, 2)}
+    if session.bind.dialect.name == "sqlite":
+        session.execute(text("VACUUM"))
+    results["after"] = measure()
+    session.close()
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compare requests/sec and latency of the sync and async database modes.
+
+Each mode runs in its own process (the mode is read from DB_ASYNC_MODE when
+the app is imported) against the same SQLite file, which is seeded once.
+Requests go through httpx's ASGI transport, so sync handlers still compete
+for the default threadpool exactly as they do under uvicorn.
+
+    python -m benchmarks.asyncVsSync --requests 5000 --concurrency 200
+
+Set DATABASE_URL to a Postgres database to measure against Postgres instead
+(asyncpg must be installed for the async mode).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import drive, report, seed, summary
+
+
+def run_mode(args):
+    import httpx
+    from app.main import app
+
+    async def make_request(client, i):
+        kind = i % 4
+        if kind == 0:
+            return await client.get("/tables")
+        if kind == 1:
+            number = i % args.tables + 1
+            return await client.get(f"/tables/{number}", params={"table_number": number})
+        if kind == 2:
+            return await client.get(f"/customers/C{i % args.customers}")
+        return await client.get(f"/books/{i % args.books + 1}")
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await drive(client, make_request, min(200, args.requests), args.concurrency)
+            latencies, statuses, elapsed = await drive(client, make_request, args.requests, args.concurrency)
+        result = summary(latencies, elapsed)
+        result["statuses"] = statuses
+        return result
+
+    print(json.dumps(asyncio.run(main())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--tables", type=int, default=50)
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--mode", choices=("sync", "async"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    env = dict(os.environ)
+    workdir = None
+    if "DATABASE_URL" not in env:
+        workdir = tempfile.mkdtemp(prefix="reservas-bench-")
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        os.environ["DATABASE_URL"] = env["DATABASE_URL"]
+
+        from app.database.connection import SessionLocal
+        session = SessionLocal()
+        seed(session, args.tables, args.customers, args.books)
+        session.close()
+
+    params = {key: value for key, value in vars(args).items() if key != "mode"}
+    results = {"params": params | {"database_url": env["DATABASE_URL"]}}
+    for mode in ("sync", "async"):
+        env["DB_ASYNC_MODE"] = "1" if mode == "async" else "0"
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.asyncVsSync", "--mode", mode,
+             "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+             "--tables", str(args.tables), "--customers", str(args.customers), "--books", str(args.books)],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        results[mode] = json.loads(output.stdout.strip().splitlines()[-1])
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
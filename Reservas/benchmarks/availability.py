@@ -0,0 +1,79 @@
+"""
+Benchmark the availability index against scanning the reservations.
+
+Builds 500 tables with 100k reservations spread over 60 days and answers
+random "free tables between X and X + duration" questions with the
+in-memory index and with a linear scan of every reservation (what a client
+has to do today after downloading /tables and /books).
+
+    python -m benchmarks.availability --tables 500 --books 100000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import percentile, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tables", type=int, default=500)
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--duration", type=int, default=120, help="minutes")
+    args = parser.parse_args()
+
+    from app.services.availability import AvailabilityIndex
+
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1, 12)
+    length = timedelta(minutes=args.duration)
+    books = []
+    for book_id in range(1, args.books + 1):
+        begin = start + timedelta(days=rng.randrange(60), minutes=15 * rng.randrange(40))
+        books.append((book_id, rng.randint(1, args.tables), begin, begin + length))
+
+    index = AvailabilityIndex()
+    started = time.perf_counter()
+    for book_id, table_number, begin, end in books:
+        index.add(book_id, table_number, begin, end)
+    load_seconds = time.perf_counter() - started
+
+    tables = list(range(1, args.tables + 1))
+    windows = []
+    for _ in range(args.queries):
+        begin = start + timedelta(days=rng.randrange(60), minutes=15 * rng.randrange(40))
+        windows.append((begin, begin + length))
+
+    index_latencies = []
+    index_answers = []
+    for begin, end in windows:
+        started = time.perf_counter()
+        index_answers.append(index.freeTables(tables, begin, end))
+        index_latencies.append(time.perf_counter() - started)
+
+    scan_latencies = []
+    for (begin, end), expected in zip(windows[:200], index_answers):
+        started = time.perf_counter()
+        busy = {table_number for _, table_number, b_start, b_end in books if b_start < end and b_end > begin}
+        free = [number for number in tables if number not in busy]
+        scan_latencies.append(time.perf_counter() - started)
+        assert free == expected, "index and scan disagree"
+
+    report({
+        "params": vars(args),
+        "index_load_seconds": round(load_seconds, 3),
+        "index_query_ms": {
+            "p50": round(percentile(index_latencies, 50) * 1000, 3),
+            "p99": round(percentile(index_latencies, 99) * 1000, 3),
+        },
+        "scan_query_ms": {
+            "p50": round(percentile(scan_latencies, 50) * 1000, 3),
+            "p99": round(percentile(scan_latencies, 99) * 1000, 3),
+        },
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare creating tables, customers and books one request at a time with the bulk endpoints.
+
+Each run starts from an empty database (a temporary SQLite file per run
+unless DATABASE_URL is set) and creates `--items` tables, customers and
+books, first through POST /tables, /customers and /books and then through
+POST /tables/bulk, /customers/bulk and /books/bulk.
+
+    python -m benchmarks.bulkCreate --items 1000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import report
+
+
+def payloads(items: int) -> tuple:
+    start = datetime(2030, 1, 1, 12)
+    tables = [{"number": n, "seats": 4} for n in range(1, items + 1)]
+    customers = [{"IDCustomer": f"B{n}", "name": f"Cliente {n}", "email": f"b{n}@example.com", "tel": None}
+                 for n in range(items)]
+    books = [{"table_number": n % items + 1, "customer_id": f"B{n}",
+              "time": (start + timedelta(hours=2 * (n // items))).isoformat()} for n in range(items)]
+    return tables, customers, books
+
+
+def run_mode(mode: str, items: int):
+    from fastapi.testclient import TestClient
+    from app.database.connection import createSchema
+    from app.main import app
+
+    createSchema()
+    tables, customers, books = payloads(items)
+    timings = {}
+    with TestClient(app) as client:
+        for path, body in (("/tables", tables), ("/customers", customers), ("/books", books)):
+            started = time.perf_counter()
+            if mode == "bulk":
+                response = client.post(f"{path}/bulk", json=body)
+                assert response.status_code == 201, response.text
+            else:
+                for item in body:
+                    response = client.post(path, json=item)
+                    assert response.status_code == 201, response.text
+            timings[path] = round(time.perf_counter() - started, 3)
+    print(json.dumps(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--mode", choices=("single", "bulk"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.items)
+        return
+
+    results = {"items": args.items}
+    for mode in ("single", "bulk"):
+        env = dict(os.environ)
+        if "DATABASE_URL" not in os.environ:
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='reservas-bulk-'), 'bulk.db')}"
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bulkCreate", "--mode", mode, "--items", str(args.items)],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        results[f"{mode}_seconds"] = json.loads(output.stdout.strip().splitlines()[-1])
+    results["speedup"] = {
+        path: round(results["single_seconds"][path] / max(results["bulk_seconds"][path], 1e-6), 1)
+        for path in results["single_seconds"]
+    }
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Measure the fan-out of the /events change feed to many open streams.
+
+Opens `--subscribers` subscriptions on the event loop and publishes
+`--events` changes from another thread, as the after-commit hooks do. The
+report has the time each publish() takes in the committing thread and the
+delay until every subscriber has the event (p50/p95/p99 across deliveries).
+
+    python -m benchmarks.changeFeed --subscribers 1000 --events 200
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+
+from benchmarks.common import percentile, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    from app.services.feed import Broker
+
+    broker = Broker(args.events, args.events)
+    delays, publish_times = [], []
+
+    async def consume(subscriber):
+        for _ in range(args.events):
+            event = await subscriber.next(30)
+            delays.append(time.perf_counter() - event.data["sent"])
+
+    def publisher():
+        for i in range(args.events):
+            started = time.perf_counter()
+            broker.publish("books", "create", {"id": i, "sent": started})
+            publish_times.append(time.perf_counter() - started)
+            time.sleep(args.interval_ms / 1000)
+
+    async def run():
+        subscribers = [broker.subscribe({"books"}) for _ in range(args.subscribers)]
+        consumers = [asyncio.create_task(consume(subscriber)) for subscriber in subscribers]
+        thread = threading.Thread(target=publisher)
+        thread.start()
+        await asyncio.gather(*consumers)
+        thread.join()
+
+    started = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    report({
+        "params": vars(args),
+        "deliveries": len(delays),
+        "deliveries_per_second": round(len(delays) / elapsed),
+        "publish_us": {q: round(percentile(publish_times, q) * 1e6, 1) for q in (50, 99)},
+        "delivery_ms": {q: round(percentile(delays, q) * 1000, 2) for q in (50, 95, 99)},
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Helpers shared by the benchmark scripts.
+
+The scripts are run from the Reservas directory, e.g.:
+
+    python -m benchmarks.asyncVsSync
+"""
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+
+def percentile(samples: list, q: float) -> float:
+    """
+    Return the q-th percentile (0-100) of a list of samples.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summary(latencies: list, elapsed: float) -> dict:
+    """
+    Summarise request latencies (in seconds) measured over `elapsed` seconds.
+    """
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def seed(session, tables: int, customers: int, books: int, start: datetime = None, seed_value: int = 42):
+    """
+    Create the schema and insert synthetic tables, customers and books
+    through the ORM models.
+
+    Parameters:
+    session (Session): A sync session bound to the benchmark database.
+    tables (int): Number of tables; numbers go from 1 to `tables`.
+    customers (int): Number of customers; IDs go from C0 upwards.
+    books (int): Number of books, in non-overlapping two-hour slots (six per
+        table and day) over at least the 30 days after `start`.
+    start (datetime): First day of the reservations. Defaults to today at 12:00.
+    seed_value (int): Seed for the random generator so runs are reproducible.
+    """
+    from app.database.connection import createSchema
+    from app.models.modelsDB import Table, Customer, Book
+
+    createSchema()
+    rng = random.Random(seed_value)
+    start = start or datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    session.bulk_insert_mappings(Table, [
+        {"number": n, "seats": rng.choice((2, 2, 4, 4, 6, 8)), "is_occupied": False}
+        for n in range(1, tables + 1)
+    ])
+    session.bulk_insert_mappings(Customer, [
+        {"idcustomer": f"C{n}", "name": f"Cliente {n}", "email": f"cliente{n}@example.com", "tel": f"300{n:07d}"}
+        for n in range(customers)
+    ])
+    days = max(30, -(-books // (tables * 6)))
+    slots = rng.sample(range(tables * days * 6), books)
+    session.bulk_insert_mappings(Book, [
+        {
+            "table_number": slot % tables + 1,
+            "customer_id": f"C{rng.randrange(customers)}",
+            "time": start + timedelta(days=slot // (tables * 6), hours=2 * (slot // tables % 6)),
+            "end_time": start + timedelta(days=slot // (tables * 6), hours=2 * (slot // tables % 6) + 2),
+        }
+        for slot in slots
+    ])
+    session.commit()
+
+
+async def drive(client, make_request, total: int, concurrency: int) -> tuple:
+    """
+    Send `total` requests with at most `concurrency` in flight.
+
+    Parameters:
+    client (httpx.AsyncClient): The client used to reach the app.
+    make_request (Callable): Receives (client, i) and returns an awaitable response.
+    total (int): Number of requests to send.
+    concurrency (int): Number of concurrent workers.
+
+    Returns:
+    tuple: (latencies in seconds, status code counts, elapsed seconds)
+    """
+    import asyncio
+
+    latencies = []
+    statuses = {}
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            response = await make_request(client, i)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+def report(results: dict):
+    """
+    Print the benchmark results as JSON.
+    """
+    print(json.dumps(results, indent=2, default=str))
@@ -0,0 +1,108 @@
+"""
+Compare /customers/search on the in-memory trigram index with a LIKE scan.
+
+Inserts `--customers` customers with realistic names, emails and phone
+numbers, loads the index the way the app does at startup and runs a mix
+of partial names, emails and phone numbers against both:
+
+- index: app.services.search (trigram lookup, verification, ranking);
+- like: every term with LIKE '%term%' on name, email or tel, which is
+  what a database without trigram indexes has to do: like_first_ms takes
+  the first 10 rows the scan finds, like_ranked_ms orders them (shortest
+  name first) as a search box has to, so it reads the whole table.
+
+The report has the load time, the index size and the latency per query.
+
+    python -m benchmarks.customerSearch --customers 1000000
+"""
+import argparse
+import os
+import random
+import resource
+import tempfile
+import time
+
+from benchmarks.common import percentile, report
+
+FIRST = ("María", "José", "Ana", "Luis", "Carmen", "Juan", "Lucía", "Pedro", "Sofía", "Andrés",
+         "Valentina", "Camilo", "Daniela", "Felipe", "Paula", "Santiago", "Laura", "Mateo", "Isabel", "Diego")
+LAST = ("García", "Rodríguez", "Martínez", "López", "González", "Pérez", "Sánchez", "Ramírez", "Torres",
+        "Flores", "Rivera", "Gómez", "Díaz", "Reyes", "Morales", "Jiménez", "Ruiz", "Hernández", "Peña", "Castro")
+DOMAINS = ("gmail.com", "hotmail.com", "yahoo.es", "outlook.com", "correo.co")
+QUERIES = ("garcía", "ana gar", "peña", "castro mateo", "555 12", "3004512", "hotmail", "lucia.ruiz", "zzzz")
+
+
+def timed(function, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--customers", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--like-repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        workdir = tempfile.mkdtemp(prefix="reservas-search-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'search.db')}"
+    os.environ["CUSTOMER_SEARCH_BACKEND"] = "memory"
+
+    from sqlalchemy import and_, func, or_, select
+    from app.database.connection import SessionLocal, createSchema
+    from app.models.modelsDB import Customer
+    from app.services import search
+
+    createSchema()
+    session = SessionLocal()
+    rng = random.Random(42)
+    batch = []
+    for n in range(args.customers):
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        local = search.normalize(f"{first}.{last}").replace(" ", "")
+        batch.append({"idcustomer": f"S{n}", "name": f"{first} {last} {rng.choice(LAST)}",
+                      "email": f"{local}{n}@{rng.choice(DOMAINS)}", "tel": f"300 {rng.randrange(1000):03d} {n % 10000:04d}"})
+        if len(batch) == 50000:
+            session.bulk_insert_mappings(Customer, batch)
+            batch = []
+    session.bulk_insert_mappings(Customer, batch)
+    session.commit()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    search.load(session)
+    load_seconds = round(time.perf_counter() - started, 1)
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def like(query, ranked=False):
+        conditions = [or_(Customer.name.like(f"%{term}%"), Customer.email.like(f"%{term}%"), Customer.tel.like(f"%{term}%"))
+                      for term in query.split()]
+        statement = select(Customer.id).where(and_(*conditions))
+        if ranked:
+            statement = statement.order_by(func.length(Customer.name), Customer.id)
+        return session.execute(statement.limit(10)).all()
+
+    results = {"params": vars(args), "load_seconds": load_seconds,
+               "index": search.index.stats() | {"rss_growth_mb": (rss_after - rss_before) // 1024}, "queries": {}}
+    for query in QUERIES:
+        index_samples = timed(lambda: search.search(session, query, 10), args.repeat)
+        like_samples = timed(lambda: like(query), args.like_repeat)
+        ranked_samples = timed(lambda: like(query, ranked=True), args.like_repeat)
+        results["queries"][query] = {
+            "matches": len(search.search(session, query, 10)),
+            "index_p50_ms": round(percentile(index_samples, 50) * 1000, 2),
+            "index_p99_ms": round(percentile(index_samples, 99) * 1000, 2),
+            "like_first_ms": round(percentile(like_samples, 50) * 1000, 1),
+            "like_ranked_ms": round(percentile(ranked_samples, 50) * 1000, 1),
+        }
+    session.close()
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
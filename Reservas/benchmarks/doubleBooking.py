@@ -0,0 +1,79 @@
+"""
+Fire parallel bookings at the same table and slot and check that exactly one wins.
+
+First `--parallel` POST /books requests target the same table, starting
+within the same hour. Every pair overlaps, and most of them do not hit the
+unique (table, time) constraint. Exactly one must get 201 and every other
+one 409, and the books table must hold a single row for that hour. Then the
+same number of requests target different tables to measure the booking
+throughput when there is no conflict.
+
+    python -m benchmarks.doubleBooking --parallel 300
+
+Uses a temporary SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from benchmarks.common import drive, report, seed, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--parallel", type=int, default=300)
+    parser.add_argument("--tables", type=int, default=300)
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        workdir = tempfile.mkdtemp(prefix="reservas-conflict-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'conflict.db')}"
+
+    import httpx
+    from sqlalchemy import func, select
+    from app.database.connection import SessionLocal
+    from app.main import app
+    from app.models.modelsDB import Book
+
+    session = SessionLocal()
+    seed(session, args.tables, 100, 0)
+    session.close()
+
+    slot = datetime.now().replace(hour=20, minute=0, second=0, microsecond=0) + timedelta(days=365)
+
+    async def same_slot(client, i):
+        start = slot + timedelta(minutes=i % 60)
+        return await client.post("/books", json={"table_number": 1, "customer_id": f"C{i % 100}", "time": start.isoformat()})
+
+    async def distinct_tables(client, i):
+        return await client.post("/books", json={
+            "table_number": i % args.tables + 1, "customer_id": f"C{i % 100}",
+            "time": (slot + timedelta(days=1 + i // args.tables)).isoformat(),
+        })
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            conflict = await drive(client, same_slot, args.parallel, args.parallel)
+            free = await drive(client, distinct_tables, args.parallel, args.parallel)
+        return conflict, free
+
+    (conflict_latencies, conflict_statuses, conflict_elapsed), (free_latencies, free_statuses, free_elapsed) = asyncio.run(run())
+
+    session = SessionLocal()
+    rows = session.execute(select(func.count()).select_from(Book).where(Book.table_number == 1, Book.time >= slot, Book.time < slot + timedelta(hours=1))).scalar()
+    session.close()
+
+    report({
+        "params": vars(args),
+        "same_slot": summary(conflict_latencies, conflict_elapsed) | {"statuses": conflict_statuses, "rows_for_slot": rows},
+        "distinct_tables": summary(free_latencies, free_elapsed) | {"statuses": free_statuses},
+    })
+    if conflict_statuses.get(201) != 1 or conflict_statuses.get(409) != args.parallel - 1 or rows != 1:
+        raise SystemExit("Double booking detected")
+
+
+if __name__ == "__main__":
+    main()
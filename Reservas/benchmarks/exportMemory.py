@@ -0,0 +1,82 @@
+"""
+Check that the streaming export keeps memory flat regardless of row count.
+
+Seeds a SQLite file with increasing numbers of books (up to 1M by default),
+consumes the /books/export stream for each size and records the peak Python
+memory allocated while streaming (tracemalloc). The run fails if the peak at
+the largest size is more than 1.5x the peak at the smallest one.
+
+    python -m benchmarks.exportMemory --sizes 100000 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks.common import report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="reservas-export-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'export.db')}"
+
+    from sqlalchemy import insert, select
+    from app.database.connection import SessionLocal
+    from app.models.modelsDB import Book
+    from app.models.utilities import streamRows
+    from benchmarks.common import seed
+
+    session = SessionLocal()
+    seed(session, 50, 1000, 0)
+    session.close()
+
+    start = datetime(2024, 1, 1, 12)
+    inserted = 0
+    results = {"format": args.format, "runs": []}
+    for size in sorted(args.sizes):
+        session = SessionLocal()
+        while inserted < size:
+            chunk = min(50_000, size - inserted)
+            session.execute(insert(Book), [
+                {"table_number": n % 50 + 1, "customer_id": f"C{n % 1000}", "time": start + timedelta(minutes=15 * n),
+                 "end_time": start + timedelta(minutes=15 * n + 15)}
+                for n in range(inserted, inserted + chunk)
+            ])
+            inserted += chunk
+        session.commit()
+        session.close()
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        written = 0
+        for chunk in streamRows(SessionLocal(), select(Book.__table__).order_by(Book.id), args.format):
+            written += len(chunk)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results["runs"].append({
+            "rows": size,
+            "bytes_written": written,
+            "seconds": round(elapsed, 2),
+            "rows_per_second": round(size / elapsed),
+            "peak_memory_kb": round(peak / 1024),
+        })
+
+    report(results)
+    smallest, largest = results["runs"][0], results["runs"][-1]
+    if largest["peak_memory_kb"] > 1.5 * smallest["peak_memory_kb"]:
+        raise SystemExit(
+            f"Peak memory grew from {smallest['peak_memory_kb']} KB to {largest['peak_memory_kb']} KB"
+        )
+
+
+if __name__ == "__main__":
+    main()
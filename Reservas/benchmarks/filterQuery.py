@@ -0,0 +1,127 @@
+"""
+Compare answering /tablesFilter and hourly utilization from SQL and from the occupancy bitmap.
+
+Seeds `--tables` tables and `--books` reservations and runs each variant
+`--repeat` times:
+
+- text: the original text(f"SELECT * FROM tables WHERE is_occupied = {value}")
+  on the static flag (fast, but nothing ever updates the flag);
+- sql_uncached: FILTER_STATEMENT (EXISTS on books, the moment and the
+  filter value as parameters) with the compiled cache disabled, i.e. the
+  cost of compiling it on every request;
+- sql: FILTER_STATEMENT as the endpoint runs it for moments the bitmap
+  does not cover;
+- bitmap: the cached select() of the tables plus OccupancyBitmap.occupiedAt,
+  as the endpoint does for the other moments;
+- utilization_sql / utilization_bitmap: booked share of each hour of a day.
+
+For the occupied and the free tables it reports the microseconds per call
+and the SQL compilations counted by SQLAlchemy (one compiled statement
+serves both filter values). It also checks that sql and bitmap agree and
+reports the time to build the bitmap and its memory per day.
+
+    python -m benchmarks.filterQuery --tables 200 --books 50000 --repeat 200
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import report, seed
+
+
+def timed(function, repeat: int) -> tuple:
+    function()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return round((time.perf_counter() - started) / repeat * 1e6, 1), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tables", type=int, default=200)
+    parser.add_argument("--books", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        workdir = tempfile.mkdtemp(prefix="reservas-filter-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'filter.db')}"
+
+    from sqlalchemy import event, func, select, text
+    from sqlalchemy.engine.default import CACHE_HIT
+    from app.database.connection import SessionLocal, getEngine
+    from app.models.modelsDB import Book
+    from app.models.utilities import rowDicts
+    from app.routers.tables import ALL_TABLES, FILTER_STATEMENT
+    from app.services import occupancy
+
+    session = SessionLocal()
+    start = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    seed(session, args.tables, 100, args.books, start=start)
+    moment = start + timedelta(days=2, hours=3, minutes=10)
+    day_start = datetime.combine(moment.date(), datetime.min.time())
+
+    started = time.perf_counter()
+    occupancy.load(session, since=start)
+    build_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    compilations = []
+
+    def count_compilations(conn, cursor, statement, parameters, context, executemany):
+        compilations.append(context.cache_hit is not CACHE_HIT)
+
+    event.listen(getEngine(), "before_cursor_execute", count_compilations)
+
+    def filter_text(value):
+        return rowDicts(session.execute(text(f"SELECT * FROM tables WHERE is_occupied = {value}")))
+
+    def filter_sql_uncached(value):
+        return rowDicts(session.execute(FILTER_STATEMENT, {"at": moment, "occupied": value},
+                                        execution_options={"compiled_cache": None}))
+
+    def filter_sql(value):
+        return rowDicts(session.execute(FILTER_STATEMENT, {"at": moment, "occupied": value}))
+
+    def filter_bitmap(value):
+        occupied = set(occupancy.bitmap.occupiedAt(moment))
+        return [row for row in rowDicts(session.execute(ALL_TABLES)) if (row["number"] in occupied) == value]
+
+    def utilization_sql():
+        hours = []
+        for hour in range(24):
+            low, high = day_start + timedelta(hours=hour), day_start + timedelta(hours=hour + 1)
+            booked = session.execute(select(func.count()).where(Book.time < high, Book.end_time > low)).scalar()
+            hours.append(round(booked / args.tables, 4))
+        return hours
+
+    def utilization_bitmap():
+        return occupancy.bitmap.utilization(moment.date(), args.tables)
+
+    results = {"params": vars(args) | {"database_url": os.environ["DATABASE_URL"]}}
+    variants = (("text", filter_text), ("sql_uncached", filter_sql_uncached), ("sql", filter_sql),
+                ("bitmap", filter_bitmap))
+    for name, function in variants:
+        results[name] = {}
+        function(True)
+        compilations.clear()
+        for value, label in ((True, "occupied"), (False, "free")):
+            us, rows = timed(lambda: function(value), args.repeat)
+            results[name][label] = {"us_per_call": us, "rows": len(rows)}
+        results[name]["compilations"] = sum(compilations)
+    for name, function in (("utilization_sql", utilization_sql), ("utilization_bitmap", utilization_bitmap)):
+        us, hours = timed(function, args.repeat)
+        results[name] = {"us_per_call": us, "peak_hour": max(hours)}
+
+    results["bitmap_matches_sql"] = all(
+        [row["number"] for row in filter_sql(value)] == [row["number"] for row in filter_bitmap(value)]
+        for value in (True, False))
+    results["bitmap"] |= {"build_ms": build_ms} | occupancy.bitmap.stats()
+    session.close()
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
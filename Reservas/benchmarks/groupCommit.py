@@ -0,0 +1,89 @@
+"""
+Compare POST /books with one commit per request and with the group-commit writer.
+
+Each mode runs in its own process (BOOKS_GROUP_COMMIT is read when the app
+is imported) on a fresh SQLite file unless DATABASE_URL is set, and sends
+`--bookings` reservations for distinct tables and slots with
+`--concurrency` requests in flight. The report has the throughput, the
+p50/p95/p99 latency, the status codes and, for the grouped mode, how many
+commits the writer made.
+
+    python -m benchmarks.groupCommit --bookings 3000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from benchmarks.common import drive, report, seed, summary
+
+
+def run_mode(args):
+    import httpx
+    from app.database.connection import SessionLocal
+    from app.main import app
+    from app.routers.books import bookWriter
+
+    session = SessionLocal()
+    seed(session, args.tables, 100, 0)
+    session.close()
+    start = datetime(2040, 1, 1, 12)
+
+    async def make_request(client, i):
+        return await client.post("/books", json={
+            "table_number": i % args.tables + 1,
+            "customer_id": f"C{i % 100}",
+            "time": (start + timedelta(hours=2 * (i // args.tables))).isoformat(),
+        })
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                latencies, statuses, elapsed = await drive(client, make_request, args.bookings, args.concurrency)
+        result = summary(latencies, elapsed)
+        result["statuses"] = statuses
+        result["writer"] = bookWriter.stats()
+        return result
+
+    print(json.dumps(asyncio.run(main())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--bookings", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--tables", type=int, default=100)
+    parser.add_argument("--max-batch", type=int, default=100)
+    parser.add_argument("--wait-ms", type=int, default=5)
+    parser.add_argument("--mode", choices=("per-request", "grouped"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    results = {"params": {key: value for key, value in vars(args).items() if key != "mode"}}
+    for mode in ("per-request", "grouped"):
+        env = dict(os.environ)
+        if "DATABASE_URL" not in os.environ:
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='reservas-group-'), 'group.db')}"
+        env["BOOKS_GROUP_COMMIT"] = "1" if mode == "grouped" else "0"
+        env["GROUP_COMMIT_MAX_BATCH"] = str(args.max_batch)
+        env["GROUP_COMMIT_WAIT_MS"] = str(args.wait_ms)
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.groupCommit", "--mode", mode, "--bookings", str(args.bookings),
+             "--concurrency", str(args.concurrency), "--tables", str(args.tables)],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        results[mode] = json.loads(output.stdout.strip().splitlines()[-1])
+    results["speedup"] = round(results["grouped"]["rps"] / max(results["per-request"]["rps"], 1e-6), 1)
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Run a mixed, reproducible workload against the API and report latency per endpoint.
+
+The app from app/main.py is served in-process through httpx's ASGI
+transport (sync handlers still go through the threadpool, as under
+uvicorn) on a temporary SQLite file seeded with `--tables`, `--customers`
+and `--books`. Set DATABASE_URL to run against a local Postgres instead,
+or --url to drive an already running server over HTTP.
+
+Each request picks an operation by weight from `--mix`:
+
+- browse: GET /tables
+- filter: GET /tablesFilter?booleanTable=false
+- book:   POST /books at a random future table and slot (201, or 409 when taken)
+- update: PUT /books/{id} with a new duration (200, or 409 when it overlaps)
+- detail: GET /books/{id}
+
+The report (stdout, and --output if given) holds the parameters,
+throughput and p50/p95/p99 per operation and overall, and the status
+codes seen. With --baseline, the p95 of every operation is compared with
+a previous report and the run fails if any grew by more than --tolerance.
+
+    python -m benchmarks.loadTest --requests 5000 --concurrency 50 --output run.json
+    python -m benchmarks.loadTest --baseline run.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import report, seed, summary
+
+DEFAULT_MIX = "browse=35,filter=25,book=15,update=10,detail=15"
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def browse(client, rng, args):
+    return await client.get("/tables")
+
+
+async def filter_tables(client, rng, args):
+    return await client.get("/tablesFilter", params={"booleanTable": False})
+
+
+async def book(client, rng, args):
+    start = datetime(2040, 1, 1, 12) + timedelta(days=rng.randrange(365), minutes=15 * rng.randrange(48))
+    return await client.post("/books", json={
+        "table_number": rng.randrange(args.tables) + 1,
+        "customer_id": f"C{rng.randrange(args.customers)}",
+        "time": start.isoformat(),
+    })
+
+
+async def update(client, rng, args):
+    return await client.put(f"/books/{rng.randrange(args.books) + 1}", json={"duration": rng.choice((60, 90, 120, 150))})
+
+
+async def detail(client, rng, args):
+    return await client.get(f"/books/{rng.randrange(args.books) + 1}")
+
+
+OPERATIONS = {"browse": browse, "filter": filter_tables, "book": book, "update": update, "detail": detail}
+
+
+async def run(client, args) -> dict:
+    """
+    Send `args.requests` requests from `args.concurrency` workers.
+
+    Every worker has its own random generator derived from --seed, so the
+    sequence of operations and payloads is the same on every run.
+    """
+    names = list(args.mix)
+    weights = [args.mix[name] for name in names]
+    latencies = {name: [] for name in names}
+    statuses = {name: {} for name in names}
+    counter = iter(range(args.requests))
+
+    async def worker(number):
+        rng = random.Random(args.seed * 1000 + number)
+        for _ in counter:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = (await OPERATIONS[name](client, rng, args)).status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies[name].append(time.perf_counter() - started)
+            statuses[name][status] = statuses[name].get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for name in names:
+        endpoints[name] = summary(latencies[name], elapsed)
+        endpoints[name]["statuses"] = statuses[name]
+    overall = summary([value for values in latencies.values() for value in values], elapsed)
+    overall["errors"] = sum(count for codes in statuses.values() for status, count in codes.items()
+                            if not isinstance(status, int) or status >= 500)
+    return {"overall": overall, "endpoints": endpoints}
+
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> list:
+    """
+    Return the operations whose p95 grew by more than `tolerance` over the baseline.
+    """
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if previous and previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append({"endpoint": name, "baseline_p95_ms": previous["p95_ms"], "p95_ms": current["p95_ms"]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--tables", type=int, default=50)
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help=f"Operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--url", help="Drive a running server instead of the in-process app")
+    parser.add_argument("--no-seed", action="store_true", help="Use the data already in DATABASE_URL")
+    parser.add_argument("--output", help="Also write the report to this file")
+    parser.add_argument("--baseline", help="A previous report to compare the p95 latencies with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    import contextlib
+    import httpx
+
+    lifespan = contextlib.nullcontext()
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        if "DATABASE_URL" not in os.environ:
+            workdir = tempfile.mkdtemp(prefix="reservas-load-")
+            os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'load.db')}"
+        from app.database.connection import SessionLocal
+        from app.main import app
+
+        if not args.no_seed:
+            session = SessionLocal()
+            seed(session, args.tables, args.customers, args.books, seed_value=args.seed)
+            session.close()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load", timeout=60)
+        lifespan = app.router.lifespan_context(app)
+
+    async def execute():
+        async with lifespan, client:
+            return await run(client, args)
+
+    results = {"params": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}}
+    results["params"]["database_url"] = args.url or os.environ["DATABASE_URL"]
+    results.update(asyncio.run(execute()))
+    if args.baseline:
+        results["regressions"] = compare(results, args.baseline, args.tolerance)
+
+    report(results)
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(results, handle, indent=2, default=str)
+    if results.get("regressions"):
+        raise SystemExit(f"p95 regression in: {', '.join(item['endpoint'] for item in results['regressions'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Measure what the per-request profiler costs on GET /books/{id}.
+
+Each mode runs in its own process (the PROFILING_* settings are read when
+the app is imported) on a fresh SQLite file unless DATABASE_URL is set,
+and sends `--requests` sequential requests:
+
+- off: PROFILING_ENABLED=0, nothing is installed;
+- idle: PROFILING_ENABLED=1 with no request selected, the cost every
+  request pays once the feature is on (middleware, SQL hooks, wrappers);
+- sampling / deterministic: every request profiled and written to disk.
+
+The report has the p50/p95/p99 latency of each mode and its overhead over
+"off" at p50.
+
+    python -m benchmarks.profilingOverhead --requests 2000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import report, seed, summary
+
+MODES = {
+    "off": {"PROFILING_ENABLED": "0"},
+    "idle": {"PROFILING_ENABLED": "1", "PROFILING_SAMPLE_RATE": "0"},
+    "sampling": {"PROFILING_ENABLED": "1", "PROFILING_SAMPLE_RATE": "1", "PROFILING_MODE": "sampling"},
+    "deterministic": {"PROFILING_ENABLED": "1", "PROFILING_SAMPLE_RATE": "1", "PROFILING_MODE": "deterministic"},
+}
+
+
+def run_mode(args):
+    from fastapi.testclient import TestClient
+    from app.database.connection import SessionLocal
+    from app.main import app
+
+    session = SessionLocal()
+    seed(session, 50, 100, 1000)
+    session.close()
+
+    with TestClient(app) as client:
+        for n in range(50):
+            client.get(f"/books/{n % 1000 + 1}")
+        latencies = []
+        started = time.perf_counter()
+        for n in range(args.requests):
+            before = time.perf_counter()
+            response = client.get(f"/books/{n % 1000 + 1}")
+            latencies.append(time.perf_counter() - before)
+            assert response.status_code == 200, response.text
+        elapsed = time.perf_counter() - started
+    print(json.dumps(summary(latencies, elapsed)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--mode", choices=tuple(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    results = {"params": {"requests": args.requests}}
+    for mode, settings in MODES.items():
+        workdir = tempfile.mkdtemp(prefix="reservas-profiling-")
+        env = dict(os.environ, **settings, PROFILING_DIR=os.path.join(workdir, "profiles"))
+        if "DATABASE_URL" not in os.environ:
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'profiling.db')}"
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.profilingOverhead", "--mode", mode, "--requests", str(args.requests)],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        results[mode] = json.loads(output.stdout.strip().splitlines()[-1])
+    baseline = results["off"]["p50_ms"]
+    results["overhead_p50_ms"] = {mode: round(results[mode]["p50_ms"] - baseline, 2) for mode in MODES if mode != "off"}
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
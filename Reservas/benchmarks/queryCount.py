@@ -0,0 +1,68 @@
+"""
+Count the SQL statements of the expanded views for small and large pages.
+
+Every expanded request must run the same number of statements whatever the
+page size: a book's table and customer are joined into the main SELECT and a
+customer's reservations take one extra SELECT. The change log catch-up
+that runs before every read is not counted. The run fails if any count
+grows with the number of rows.
+
+    python -m benchmarks.queryCount
+"""
+import os
+import tempfile
+
+from benchmarks.common import report, seed
+
+
+def main():
+    if "DATABASE_URL" not in os.environ:
+        workdir = tempfile.mkdtemp(prefix="reservas-queries-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'queries.db')}"
+    os.environ["CACHE_ENABLED"] = "0"
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    from app.database.connection import SessionLocal, getEngine
+    from app.main import app
+
+    session = SessionLocal()
+    seed(session, 50, 20, 1000)
+    session.close()
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if "change_log" not in statement:
+            statements.append(statement)
+
+    event.listen(getEngine(), "before_cursor_execute", record)
+
+    def count(client, path, params) -> int:
+        statements.clear()
+        response = client.get(path, params=params)
+        assert response.status_code == 200, response.text
+        return len(statements)
+
+    cases = {
+        "books?expand=table,customer": ("/books", {"expand": "table,customer"}, 1),
+        "books?expand=customer": ("/books", {"expand": "customer"}, 1),
+        "books/{id}?expand=table,customer": ("/books/1", {"expand": "table,customer"}, 1),
+        "customers/{id}?expand=reservations": ("/customers/C1", {"expand": "reservations"}, 2),
+    }
+    results = {}
+    failed = False
+    with TestClient(app) as client:
+        for name, (path, params, expected) in cases.items():
+            small = count(client, path, params | {"limit": 5})
+            large = count(client, path, params | {"limit": 1000})
+            results[name] = {"limit_5": small, "limit_1000": large, "expected": expected}
+            failed = failed or small != expected or large != expected
+
+    report(results)
+    if failed:
+        raise SystemExit("The number of SQL statements depends on the number of rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Check read-replica routing with SQLite files standing in for a primary and two replicas.
+
+The primary is seeded and copied to two replica files (a snapshot, so
+nothing written afterwards reaches the replicas). The script then checks that:
+
+- GETs are spread over the replicas and never reach the primary;
+- writes go to the primary;
+- after a write, the same client (X-Client-Id) reads from the primary and
+  sees its reservation, while another client reads from a replica and does not;
+- once DB_READ_YOUR_WRITES_SECONDS has passed, the writer reads from the replicas again.
+
+    python -m benchmarks.replicaRouting --selection round_robin
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import report, seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--selection", choices=("round_robin", "least_connections"), default="round_robin")
+    parser.add_argument("--reads", type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="reservas-replicas-")
+    paths = {name: os.path.join(workdir, f"{name}.db") for name in ("primary", "replica-0", "replica-1")}
+    os.environ["DATABASE_URL"] = f"sqlite:///{paths['primary']}"
+    os.environ["DATABASE_REPLICA_URLS"] = ",".join(f"sqlite:///{paths[name]}" for name in ("replica-0", "replica-1"))
+    os.environ["DB_REPLICA_SELECTION"] = args.selection
+    os.environ["DB_READ_YOUR_WRITES_SECONDS"] = "1"
+    os.environ["CACHE_ENABLED"] = "0"
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    from app import config
+    from app.database.connection import (SessionLocal, getAsyncEngine, getAsyncReplicaEngines, getEngine,
+                                         getReplicaEngines)
+    from app.main import app
+
+    session = SessionLocal()
+    seed(session, 20, 50, 200)
+    session.close()
+    getEngine().dispose()
+    for name in ("replica-0", "replica-1"):
+        shutil.copy(paths["primary"], paths[name])
+
+    statements = {}
+    if config.DB_ASYNC_MODE:
+        engines = [engine.sync_engine for engine in [getAsyncEngine()] + getAsyncReplicaEngines()]
+    else:
+        engines = [getEngine()] + getReplicaEngines()
+    for name, engine in zip(("primary", "replica-0", "replica-1"), engines):
+        event.listen(engine, "before_cursor_execute",
+                     lambda *args, name=name: statements.__setitem__(name, statements.get(name, 0) + 1))
+
+    def counted(call) -> dict:
+        statements.clear()
+        call()
+        return dict(statements)
+
+    checks = {}
+    with TestClient(app) as client:
+        reader = {"X-Client-Id": "reader"}
+        writer = {"X-Client-Id": "writer"}
+        reads = counted(lambda: [client.get("/books", params={"limit": 10}, headers=reader) for _ in range(args.reads)])
+        checks["reads_spread_over_replicas"] = "primary" not in reads and len(reads) == 2
+        results = {"reads": reads}
+
+        slot = {"table_number": 1, "customer_id": "C1", "time": "2045-06-01T12:00:00"}
+        write = counted(lambda: client.post("/books", json=slot, headers=writer))
+        checks["write_on_primary"] = set(write) == {"primary"}
+        results["write"] = write
+
+        def find(headers):
+            books = client.get("/books", params={"start": "2045-06-01T00:00:00"}, headers=headers).json()["books"]
+            return len(books)
+
+        results["writer_after_write"] = counted(lambda: results.setdefault("writer_sees", find(writer)))
+        results["reader_after_write"] = counted(lambda: results.setdefault("reader_sees", find(reader)))
+        checks["read_your_writes"] = results["writer_sees"] == 1 and set(results["writer_after_write"]) == {"primary"}
+        checks["others_read_replica"] = results["reader_sees"] == 0 and "primary" not in results["reader_after_write"]
+
+        time.sleep(1.1)
+        results["writer_after_window"] = counted(lambda: find(writer))
+        checks["window_expires"] = "primary" not in results["writer_after_window"]
+
+    results["checks"] = checks
+    report(results)
+    if not all(checks.values()):
+        raise SystemExit("Replica routing check failed")
+
+
+if __name__ == "__main__":
+    main()
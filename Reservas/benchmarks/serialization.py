@@ -0,0 +1,75 @@
+"""
+Compare the previous and the current way of turning query rows into JSON.
+
+For each size, books are read from a temporary SQLite file and serialized
+both ways, and the best of `--repeat` runs is reported:
+
+- previous: a dict per row built from cursor.description, then
+  jsonable_encoder and the standard json module (FastAPI's default path);
+- current: result.mappings() and app.responses.dumps (orjson when installed).
+
+    python -m benchmarks.serialization --sizes 10000 100000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.common import report, seed
+
+
+def best(function, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = function()
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) * 1000, 1), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="reservas-json-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'json.db')}"
+
+    from fastapi.encoders import jsonable_encoder
+    from sqlalchemy import select
+    from app.database.connection import SessionLocal
+    from app.models.modelsDB import Book
+    from app.responses import dumps, orjson
+
+    session = SessionLocal()
+    seed(session, 100, 100, max(args.sizes))
+
+    def previous(limit):
+        result = session.connection().execute(select(Book.__table__).order_by(Book.id).limit(limit))
+        column_names = [desc[0] for desc in result.cursor.description]
+        books = [{column_names[i]: value for i, value in enumerate(row)} for row in result]
+        return json.dumps(jsonable_encoder({"books": books}), ensure_ascii=False,
+                          allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+    def current(limit):
+        result = session.connection().execute(select(Book.__table__).order_by(Book.id).limit(limit))
+        return dumps({"books": [dict(row) for row in result.mappings()]})
+
+    results = {"encoder": "orjson" if orjson is not None else "json"}
+    for size in args.sizes:
+        previous_ms, previous_bytes = best(lambda: previous(size), args.repeat)
+        current_ms, current_bytes = best(lambda: current(size), args.repeat)
+        results[size] = {
+            "previous_ms": previous_ms,
+            "current_ms": current_ms,
+            "speedup": round(previous_ms / max(current_ms, 1e-6), 1),
+            "bytes": {"previous": previous_bytes, "current": current_bytes},
+        }
+    session.close()
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
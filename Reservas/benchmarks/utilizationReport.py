@@ -0,0 +1,100 @@
+"""
+Compare /reports/utilization from the rollups with aggregating the reservations.
+
+Seeds `--books` reservations, builds the rollups with rollups.rebuild and
+times two reports, a month by hour and a year by day:
+
+- rollups: rollups.report, which reads one row per hour or day;
+- scan: what had to be done before, reading every reservation of the range
+  joined with Table.seats and aggregating it in Python.
+
+It also times `--writes` single-reservation commits with and without the
+insert into utilization_deltas, which is what maintaining them costs each
+write.
+
+    python -m benchmarks.utilizationReport --books 500000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import report, seed
+
+
+def timed(function, repeat: int) -> float:
+    function()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return round((time.perf_counter() - started) / repeat * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=200000)
+    parser.add_argument("--tables", type=int, default=50)
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        workdir = tempfile.mkdtemp(prefix="reservas-reports-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'reports.db')}"
+
+    from sqlalchemy import select
+    from app.database import events
+    from app.database.connection import SessionLocal
+    from app.models.modelsDB import Book, Table
+    from app.services import rollups
+
+    session = SessionLocal()
+    days = max(30, -(-args.books // (args.tables * 6)))
+    start = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    seed(session, args.tables, 100, args.books, start=start)
+
+    started = time.perf_counter()
+    written, read = rollups.rebuild(session)
+    results = {"params": vars(args),
+               "rebuild": {"rollups": written, "books": read, "seconds": round(time.perf_counter() - started, 2)}}
+
+    def scan(first, end, granularity):
+        totals = rollups._totals()
+        statement = select(Book.time, Book.end_time, Book.no_show, Table.seats).join(Table).where(
+            Book.time < end, Book.end_time > first)
+        for book_start, book_end, no_show, seats in session.execute(statement):
+            rollups.addContribution(totals, book_start, book_end, no_show, 1, seats)
+        return {bucket: values for (name, bucket), values in totals.items() if name == granularity}
+
+    day = start.replace(hour=0)
+    ranges = {"month_by_hour": (day + timedelta(days=days - 30), day + timedelta(days=days), "hour"),
+              "year_by_day": (day + timedelta(days=max(0, days - 365)), day + timedelta(days=days), "day")}
+    for name, (first, end, granularity) in ranges.items():
+        results[name] = {
+            "rollups_ms": timed(lambda: rollups.report(session, first, end, granularity), args.repeat),
+            "scan_ms": timed(lambda: scan(first, end, granularity), args.repeat),
+        }
+        session.commit()
+
+    def writes(offset: int) -> float:
+        moment = day + timedelta(days=days + 10 + offset)
+        started = time.perf_counter()
+        for n in range(args.writes):
+            session.add(Book(table_number=n % args.tables + 1, customer_id="C1",
+                             time=moment + timedelta(hours=3 * (n // args.tables)),
+                             end_time=moment + timedelta(hours=3 * (n // args.tables) + 2)))
+            session.commit()
+        return round((time.perf_counter() - started) / args.writes * 1000, 3)
+
+    results["write_ms"] = {"with_rollups": writes(0)}
+    listeners = list(events._flushListeners)
+    events._flushListeners.clear()
+    results["write_ms"]["without_rollups"] = writes(1000)
+    events._flushListeners.extend(listeners)
+    session.close()
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Fixtures shared by the tests.
+
+The app reads its configuration when it is imported, so the database is
+chosen here, before any app module is loaded: TEST_DATABASE_URL if it is
+set (its tables are dropped and created again for every test), otherwise a
+SQLite file in a temporary directory. The change log is read before every
+request, so the writes of other processes are seen right away. Run them from the Reservas directory:
+
+    python -m pytest tests
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+from datetime import datetime, timedelta
+
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix="reservas-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{os.path.join(_workdir, 'tests.db')}")
+os.environ["CHANGE_LOG_POLL_MS"] = "0"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.database.connection import SessionLocal, getEngine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.modelsDB import Base, Book, Customer, Table  # noqa: E402
+from app.services import cache, idempotency  # noqa: E402
+
+# Día de las reservas de prueba: siempre en el futuro, a medianoche.
+DAY = (datetime.now() + timedelta(days=30)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def database():
+    """
+    Start every test from an empty schema and empty in-process caches.
+    """
+    Base.metadata.drop_all(bind=getEngine())
+    Base.metadata.create_all(bind=getEngine())
+    for store in cache.caches.values():
+        store.clear()
+    idempotency.responses.clear()
+    yield
+
+
+@pytest.fixture
+def session(database):
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client(database):
+    """
+    A TestClient with the lifespan run, so the in-memory indexes are loaded.
+
+    Rows the test needs at startup have to be inserted before it asks for
+    this fixture (through the `seeded` fixture, for instance).
+    """
+    with TestClient(app) as client:
+        yield client
+
+
+def seedRows(session, tables: int = 10, customers: int = 20, books: int = 0):
+    """
+    Insert `tables` tables (4 seats), `customers` customers (C0, C1, ...) and
+    `books` two-hour reservations on DAY, one table after another.
+    """
+    session.bulk_insert_mappings(Table, [{"number": n, "seats": 4, "is_occupied": False}
+                                         for n in range(1, tables + 1)])
+    session.bulk_insert_mappings(Customer, [
+        {"idcustomer": f"C{n}", "name": f"Cliente {n}", "email": f"cliente{n}@example.com", "tel": f"300{n:07d}"}
+        for n in range(customers)])
+    session.bulk_insert_mappings(Book, [
+        {"table_number": n % tables + 1, "customer_id": f"C{n % customers}",
+         "time": DAY + timedelta(hours=2 * (n // tables)), "end_time": DAY + timedelta(hours=2 * (n // tables) + 2)}
+        for n in range(books)])
+    session.commit()
+
+
+@pytest.fixture
+def seeded(session):
+    seedRows(session, books=100)
+    return session
+
+
+def inOtherProcess(code: str) -> str:
+    """
+    Run `code` in a new Python process on the same database, as another
+    worker or a command line script would, and return what it prints.
+    """
+    return subprocess.run([sys.executable, "-c", textwrap.dedent(code)], check=True, capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
@@ -0,0 +1,51 @@
+import pytest
+
+from app.services import admission
+from app.services.admission import RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock.monotonic)
+    return clock
+
+
+@pytest.mark.parametrize("rate, burst", [(20, 5), (5, 10)])
+def test_steady_client_gets_the_configured_rate(clock, rate, burst):
+    limiter = RateLimiter({"read": (rate, burst)}, max_clients=100)
+    seconds, step = 3.0, 0.01
+    allowed = 0
+    for _ in range(int(seconds / step)):
+        allowed += limiter.check("cliente", "read") == 0
+        clock.now += step
+
+    assert allowed <= burst + rate * seconds + 1
+    assert allowed >= rate * seconds
+
+
+def test_idle_buckets_are_dropped_and_busy_ones_kept(clock):
+    limiter = RateLimiter({"read": (10, 10)}, max_clients=100)
+    limiter.check("ocioso", "read")
+    for _ in range(30):
+        clock.now += 0.1
+        limiter.check("activo", "read")
+
+    assert limiter.tracked() == 1
+
+
+def test_least_recently_used_client_is_dropped_when_full(clock):
+    limiter = RateLimiter({"write": (1, 1)}, max_clients=2)
+    for client in ("a", "b", "a", "c"):
+        limiter.check(client, "write")
+
+    assert limiter.tracked() == 2
+    assert limiter.check("a", "write") > 0
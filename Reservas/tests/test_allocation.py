@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+import pytest
+
+from tests.conftest import DAY, seedRows
+
+
+@pytest.mark.parametrize("field, value, status", [
+    ("max_wait", 24 * 60, 200),
+    ("max_wait", 10 ** 9, 422),
+    ("duration", 10 ** 9, 422),
+])
+def test_allocation_waits_and_durations_are_bounded(session, client, field, value, status):
+    seedRows(session)
+    party = {"customer_id": "C1", "size": 2, "time": (DAY + timedelta(hours=20)).isoformat(), field: value}
+
+    response = client.post("/books/allocate", json={"parties": [party]})
+
+    assert response.status_code == status, response.text
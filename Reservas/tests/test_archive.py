@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.models.modelsDB import Book, ChangeLog
+from tests.conftest import inOtherProcess, seedRows
+
+ARCHIVE_COMMAND = """
+    import runpy, sys
+
+    sys.argv = ["archive", "--days", "0"]
+    runpy.run_module("app.database.archive", run_name="__main__")
+"""
+
+
+def test_running_workers_see_the_archive_script_changes(session, client):
+    seedRows(session, books=20)
+    start = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=3)
+    past = Book(table_number=1, customer_id="C1", time=start, end_time=start + timedelta(hours=2))
+    session.add(past)
+    session.commit()
+
+    detail = client.get(f"/books/{past.id}")
+    assert detail.status_code == 200, detail.text
+    listing = client.get("/books")
+    assert past.id in [book["id"] for book in listing.json()["books"]]
+
+    output = inOtherProcess(ARCHIVE_COMMAND)
+    assert output.startswith("Se han archivado 1 reservas")
+    assert session.execute(select(ChangeLog.action).order_by(ChangeLog.id.desc()).limit(1)).scalar() == "archive"
+
+    assert client.get(f"/books/{past.id}", headers={"If-None-Match": detail.headers["etag"]}).status_code == 404
+    after = client.get("/books", headers={"If-None-Match": listing.headers["etag"]})
+    assert after.status_code == 200
+    assert past.id not in [book["id"] for book in after.json()["books"]]
+    assert client.get(f"/books/{past.id}", params={"include_archived": True}).json()["reserva"]["archived"] is True
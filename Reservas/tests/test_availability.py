@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from sqlalchemy import delete
+
+from app import config
+from app.models.modelsDB import ChangeLog
+from tests.conftest import DAY, inOtherProcess, seedRows
+
+START = DAY + timedelta(hours=20)
+
+BOOK_TABLE_1 = f"""
+    from datetime import datetime
+    from app.database.connection import SessionLocal
+    from app.models.modelsDB import Book
+
+    session = SessionLocal()
+    session.add(Book(table_number=1, customer_id="C1", time=datetime.fromisoformat("{START.isoformat()}"),
+                     end_time=datetime.fromisoformat("{(START + timedelta(hours=2)).isoformat()}")))
+    session.commit()
+"""
+
+# Another change after the reservation, so the log goes on without it as
+# after pruning.
+RESIZE_TABLE_10 = """
+    from app.database.connection import SessionLocal
+    from app.models.modelsDB import Table
+
+    session = SessionLocal()
+    session.query(Table).filter_by(number=10).one().seats = 6
+    session.commit()
+"""
+
+
+def freeTables(client) -> list:
+    response = client.get("/tables/available", params={"seats": 2, "start": START.isoformat()})
+    assert response.status_code == 200, response.text
+    return [table["number"] for table in response.json()["mesas"]]
+
+
+def test_reservation_made_by_another_worker_is_seen(session, client):
+    seedRows(session)
+    assert 1 in freeTables(client)
+
+    inOtherProcess(BOOK_TABLE_1)
+
+    assert 1 not in freeTables(client)
+
+
+def test_index_is_reloaded_when_the_change_log_was_pruned(session, client, monkeypatch):
+    monkeypatch.setattr(config, "CHANGE_LOG_RETENTION", 2)
+    seedRows(session)
+    assert 1 in freeTables(client)
+
+    inOtherProcess(BOOK_TABLE_1)
+    inOtherProcess(RESIZE_TABLE_10)
+    session.execute(delete(ChangeLog).where(ChangeLog.entity == "books"))
+    session.commit()
+
+    assert 1 not in freeTables(client)
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from sqlalchemy import event, func, select
+
+from app.database.connection import getEngine
+from app.models.modelsDB import Book, Customer, Table
+from tests.conftest import DAY, seedRows
+
+
+def statuses(body: dict) -> dict:
+    return {item["index"]: item["status"] for item in body["created"] + body["errors"]}
+
+
+def booking(table_number: int, customer_id: str, hour: int) -> dict:
+    return {"table_number": table_number, "customer_id": customer_id,
+            "time": (DAY + timedelta(days=1, hours=hour)).isoformat()}
+
+
+def test_tables_bulk_reports_each_item(session, client):
+    seedRows(session, tables=3)
+
+    response = client.post("/tables/bulk", json=[
+        {"number": 4, "seats": 2}, {"number": 2, "seats": 4}, {"number": 5, "seats": 6}, {"number": 4, "seats": 8}])
+
+    assert response.status_code == 207
+    assert statuses(response.json()) == {0: 201, 1: 409, 2: 201, 3: 409}
+    assert session.execute(select(func.count()).select_from(Table)).scalar() == 5
+
+
+def test_customers_bulk_reports_each_item(session, client):
+    seedRows(session, customers=2)
+
+    response = client.post("/customers/bulk", json=[
+        {"IDCustomer": "N1", "name": "Nuevo", "email": "n1@example.com", "tel": "1"},
+        {"IDCustomer": "C1", "name": "Repetido", "email": "otro@example.com", "tel": "2"},
+        {"IDCustomer": "N2", "name": "Email", "email": "cliente0@example.com", "tel": "3"},
+        {"IDCustomer": "N1", "name": "Otra vez", "email": "n1b@example.com", "tel": "4"},
+    ])
+
+    assert response.status_code == 207
+    assert statuses(response.json()) == {0: 201, 1: 409, 2: 409, 3: 409}
+    assert session.execute(select(func.count()).select_from(Customer)).scalar() == 3
+
+
+def test_books_bulk_reports_each_item(session, client):
+    seedRows(session, tables=3, customers=3)
+    assert client.post("/books", json=booking(1, "C0", 12)).status_code == 201
+
+    response = client.post("/books/bulk", json=[
+        booking(2, "C1", 12),
+        booking(1, "C1", 13),
+        booking(2, "C2", 13),
+        booking(99, "C1", 12),
+        booking(3, "NOPE", 12),
+        booking(3, "C2", 12),
+    ])
+
+    assert response.status_code == 207
+    body = response.json()
+    assert statuses(body) == {0: 201, 1: 409, 2: 409, 3: 404, 4: 404, 5: 201}
+    assert body["message"] == "Se han creado 2 de 6 registros"
+    stored = {row.id: row.table_number for row in session.execute(select(Book.id, Book.table_number))}
+    assert {item["id"]: item["table_number"] for item in body["created"]}.items() <= stored.items()
+    assert len(stored) == 3
+
+
+def test_books_bulk_all_created(session, client):
+    seedRows(session, tables=5, customers=5)
+
+    response = client.post("/books/bulk", json=[booking(n % 5 + 1, f"C{n % 5}", 2 * (n // 5)) for n in range(20)])
+
+    assert response.status_code == 201
+    assert set(statuses(response.json()).values()) == {201}
+
+
+def test_books_bulk_statement_count_does_not_grow(session, client):
+    seedRows(session, tables=50, customers=50)
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        # SQLite has no implicit sentinel for INSERT ... RETURNING, so the ORM
+        # sends the INSERT of each new id on its own there (Postgres batches
+        # them); what must not grow are the lookups and the other statements.
+        if not (statement.startswith("INSERT INTO books") and conn.dialect.name == "sqlite"):
+            statements.append(statement)
+
+    def run(size: int, day: int) -> int:
+        statements.clear()
+        items = [dict(booking(n % 50 + 1, f"C{n % 50}", 2 * (n // 50)), time=(
+            DAY + timedelta(days=day, hours=2 * (n // 50))).isoformat()) for n in range(size)]
+        assert client.post("/books/bulk", json=items).status_code == 201
+        return len(statements)
+
+    event.listen(getEngine(), "before_cursor_execute", count)
+    try:
+        small, large = run(10, 2), run(500, 3)
+    finally:
+        event.remove(getEngine(), "before_cursor_execute", count)
+
+    assert large == small
@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import event
+
+from app import config
+from app.database.connection import getAsyncEngine, getEngine
+from app.services import cache
+
+
+@pytest.fixture
+def statements():
+    found = []
+
+    def count(conn, cursor, statement, *args):
+        # The change log catch-up runs before every read, whatever the view.
+        if "change_log" not in statement:
+            found.append(statement)
+
+    # With DB_ASYNC_MODE the read endpoints run on the async engine.
+    engine = getAsyncEngine().sync_engine if config.DB_ASYNC_MODE else getEngine()
+    event.listen(engine, "before_cursor_execute", count)
+    yield found
+    event.remove(engine, "before_cursor_execute", count)
+
+
+@pytest.mark.parametrize("path, params, expected", [
+    ("/books", {"expand": "table,customer"}, 1),
+    ("/books", {"expand": "customer"}, 1),
+    ("/books", {"expand": "table", "include_archived": True}, 2),
+    ("/books/1", {"expand": "table,customer"}, 1),
+    ("/customers/C1", {"expand": "reservations"}, 2),
+])
+def test_expanded_views_run_a_fixed_number_of_statements(seeded, client, statements, path, params, expected):
+    counts = []
+    for limit in (5, 1000):
+        for store in cache.caches.values():
+            store.clear()
+        statements.clear()
+        response = client.get(path, params=dict(params, limit=limit))
+        assert response.status_code == 200, response.text
+        counts.append(len(statements))
+
+    assert counts == [expected, expected]
+
+
+def test_expanded_book_embeds_its_table_and_customer(seeded, client):
+    book = client.get("/books/1", params={"expand": "table,customer"}).json()["reserva"]
+
+    assert book["table"]["number"] == book["table_number"]
+    assert book["customer"]["idcustomer"] == book["customer_id"]
+
+
+def test_expanded_customer_embeds_its_reservations(seeded, client):
+    customer = client.get("/customers/C1", params={"expand": "reservations"}).json()["customer"]
+
+    assert len(customer["reservations"]) == 5
+    assert {item["customer_id"] for item in customer["reservations"]} == {"C1"}
+
+
+def test_unknown_expansion_is_rejected(seeded, client):
+    assert client.get("/books", params={"expand": "waiter"}).status_code == 400
@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+import tracemalloc
+from datetime import timedelta
+
+from sqlalchemy import insert, select
+
+from app.database.connection import SessionLocal
+from app.models.modelsDB import ArchivedBook, Book
+from app.models.utilities import EXPORT_BATCH_SIZE, streamRows
+from tests.conftest import DAY, seedRows
+
+
+def insertBooks(session, first: int, count: int):
+    session.execute(insert(Book), [
+        {"table_number": n % 10 + 1, "customer_id": f"C{n % 20}",
+         "time": DAY + timedelta(minutes=15 * n), "end_time": DAY + timedelta(minutes=15 * n + 15)}
+        for n in range(first, first + count)])
+    session.commit()
+
+
+def exportPeak(rows: int) -> int:
+    tracemalloc.start()
+    for _ in streamRows(SessionLocal(), select(Book.__table__).order_by(Book.id), "ndjson"):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def test_books_export_ndjson_has_every_row(session, client):
+    seedRows(session, books=0)
+    insertBooks(session, 0, 2 * EXPORT_BATCH_SIZE + 7)
+
+    response = client.get("/books/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 2 * EXPORT_BATCH_SIZE + 7
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+    assert set(rows[0]) == {"id", "table_number", "customer_id", "time", "end_time", "no_show"}
+
+
+def test_books_export_csv_includes_archived(session, client):
+    seedRows(session, books=30)
+    session.execute(insert(ArchivedBook), [
+        {"id": 1000 + n, "table_number": 1, "customer_id": "C1", "time": DAY - timedelta(days=400 + n),
+         "end_time": DAY - timedelta(days=400 + n) + timedelta(hours=2), "archived_at": DAY} for n in range(5)])
+    session.commit()
+
+    rows = list(csv.reader(io.StringIO(client.get("/books/export", params={"format": "csv"}).text)))
+    archived = list(csv.reader(io.StringIO(
+        client.get("/books/export", params={"format": "csv", "include_archived": True}).text)))
+
+    assert rows[0] == ["id", "table_number", "customer_id", "time", "end_time", "no_show"]
+    assert len(rows) == 1 + 30
+    assert len(archived) == 1 + 35
+
+
+def test_customers_export_has_every_row(session, client):
+    seedRows(session, customers=1500)
+
+    response = client.get("/customers/export")
+
+    assert len(response.text.splitlines()) == 1500
+
+
+def test_export_memory_does_not_grow_with_rows(session):
+    seedRows(session, books=0)
+    insertBooks(session, 0, 2000)
+    small = exportPeak(2000)
+    insertBooks(session, 2000, 18000)
+    large = exportPeak(20000)
+
+    assert large < 1.5 * small
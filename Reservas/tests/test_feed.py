@@ -0,0 +1,30 @@
+import asyncio
+
+from app import config
+from app.services import feed
+from tests.conftest import inOtherProcess, seedRows
+
+
+def test_streams_receive_the_changes_of_other_processes(session, client, monkeypatch):
+    seedRows(session)
+    monkeypatch.setattr(config, "EVENTS_POLL_MS", 20)
+
+    async def receive():
+        subscriber = feed.broker.subscribe(["tables"])
+        try:
+            await asyncio.to_thread(inOtherProcess, """
+                from app.database.connection import SessionLocal
+                from app.models.modelsDB import Table
+
+                session = SessionLocal()
+                session.add(Table(number=99, seats=6, is_occupied=False))
+                session.commit()
+            """)
+            return await subscriber.next(10)
+        finally:
+            feed.broker.unsubscribe(subscriber)
+
+    event = asyncio.run(receive())
+
+    assert event is not None
+    assert (event.entity, event.action, event.data["number"]) == ("tables", "create", 99)
@@ -0,0 +1,27 @@
+from tests.conftest import seedRows
+
+CUSTOMER = {"IDCustomer": "N1", "name": "Nuevo", "email": "nuevo@example.com", "tel": "3001234567"}
+
+
+def test_retry_with_the_same_key_is_replayed(session, client):
+    seedRows(session)
+    headers = {"Idempotency-Key": "k-1", "X-API-Key": "cliente-a"}
+    first = client.post("/customers", json=CUSTOMER, headers=headers)
+    second = client.post("/customers", json=CUSTOMER, headers=headers)
+
+    assert first.status_code == 201, first.text
+    assert second.status_code == 201
+    assert second.headers["idempotent-replayed"] == "true"
+    assert second.json() == first.json()
+
+
+def test_same_key_from_another_client_is_not_replayed(session, client):
+    seedRows(session)
+    first = client.post("/customers", json=CUSTOMER, headers={"Idempotency-Key": "k-1", "X-API-Key": "cliente-a"})
+    other = dict(CUSTOMER, IDCustomer="N2", email="otro@example.com")
+    second = client.post("/customers", json=other, headers={"Idempotency-Key": "k-1", "X-API-Key": "cliente-b"})
+
+    assert first.status_code == 201, first.text
+    assert second.status_code == 201, second.text
+    assert "idempotent-replayed" not in second.headers
+    assert second.json()["customer"]["idCustomer"] == "N2"
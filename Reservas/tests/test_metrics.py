@@ -0,0 +1,21 @@
+from sqlalchemy import create_engine, text
+
+from app.services import metrics
+
+
+def test_pool_metrics_are_labelled_with_the_engine(monkeypatch):
+    monkeypatch.setattr(metrics, "_installed", True)
+    monkeypatch.setattr(metrics, "_engines", {})
+    primary, replica = create_engine("sqlite://"), create_engine("sqlite://")
+    metrics.instrumentEngine("test-primary", primary)
+    metrics.instrumentEngine("test-replica", replica)
+
+    with primary.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        assert metrics.pool_in_use.value("test-primary") == 1
+        assert metrics.pool_in_use.value("test-replica") == 0
+
+    assert metrics.pool_in_use.value("test-primary") == 0
+    rendered = metrics.render()
+    assert 'db_pool_connections_in_use{engine="test-primary"} 0' in rendered
+    assert 'db_pool_checkout_wait_seconds_count{engine="test-primary"} 1' in rendered
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+
+from app import config
+from app.models.modelsDB import Book, ChangeLog
+from app.services.occupancy import OccupancyBitmap
+from tests.conftest import DAY, inOtherProcess, seedRows
+
+AT = DAY + timedelta(hours=20, minutes=30)
+
+BOOK_TABLE_3 = f"""
+    from datetime import datetime
+    from app.database.connection import SessionLocal
+    from app.models.modelsDB import Book
+
+    session = SessionLocal()
+    session.add(Book(table_number=3, customer_id="C1", time=datetime.fromisoformat("{(AT - timedelta(minutes=30)).isoformat()}"),
+                     end_time=datetime.fromisoformat("{(AT + timedelta(minutes=90)).isoformat()}")))
+    session.commit()
+"""
+
+# Another change after the reservation, so the log goes on without it as
+# after pruning.
+RESIZE_TABLE_10 = """
+    from app.database.connection import SessionLocal
+    from app.models.modelsDB import Table
+
+    session = SessionLocal()
+    session.query(Table).filter_by(number=10).one().seats = 6
+    session.commit()
+"""
+
+
+def test_adding_a_reservation_twice_counts_it_once():
+    bitmap = OccupancyBitmap()
+    bitmap.add(1, 7, DAY + timedelta(hours=12), DAY + timedelta(hours=13, minutes=5))
+    bitmap.add(2, 7, DAY + timedelta(hours=13, minutes=5), DAY + timedelta(hours=14))
+    bitmap.add(2, 7, DAY + timedelta(hours=13, minutes=5), DAY + timedelta(hours=14))
+
+    bitmap.remove(2)
+    assert bitmap.occupiedAt(DAY + timedelta(hours=13, minutes=1)) == [7]
+    assert bitmap.occupiedAt(DAY + timedelta(hours=13, minutes=20)) == []
+
+    bitmap.remove(1)
+    bitmap.remove(1)
+    assert bitmap.occupiedMask(DAY, DAY + timedelta(days=1)) == 0
+
+
+def test_moving_a_reservation_releases_its_old_slots():
+    bitmap = OccupancyBitmap()
+    bitmap.add(1, 7, DAY + timedelta(hours=12), DAY + timedelta(hours=14))
+    bitmap.add(1, 8, DAY + timedelta(hours=18), DAY + timedelta(hours=20))
+
+    assert bitmap.occupiedAt(DAY + timedelta(hours=13)) == []
+    assert bitmap.occupiedAt(DAY + timedelta(hours=19)) == [8]
+
+
+def occupied(client) -> list:
+    response = client.get("/tablesFilter", params={"booleanTable": True, "at": AT.isoformat()})
+    assert response.status_code == 200, response.text
+    return [table["number"] for table in response.json()["mesas"]]
+
+
+def test_reservation_made_by_another_worker_is_in_the_bitmap(session, client):
+    seedRows(session)
+    assert occupied(client) == []
+
+    inOtherProcess(BOOK_TABLE_3)
+
+    assert occupied(client) == [3]
+
+
+def test_bitmap_is_reloaded_when_the_change_log_was_pruned(session, client, monkeypatch):
+    monkeypatch.setattr(config, "CHANGE_LOG_RETENTION", 2)
+    seedRows(session)
+    assert occupied(client) == []
+
+    inOtherProcess(BOOK_TABLE_3)
+    inOtherProcess(RESIZE_TABLE_10)
+    session.execute(delete(ChangeLog).where(ChangeLog.entity == "books"))
+    session.commit()
+
+    assert occupied(client) == [3]
+    assert client.get("/occupancy/stats").json()["occupancy"]["reservations"] == 1
+
+
+def test_utilization_of_a_day_before_the_bitmap_is_read_from_the_database(session, client):
+    seedRows(session, tables=2)
+    yesterday = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    session.add(Book(table_number=1, customer_id="C1", time=yesterday + timedelta(hours=20),
+                     end_time=yesterday + timedelta(hours=21)))
+    session.commit()
+
+    response = client.get("/tables/utilization", params={"day": yesterday.date().isoformat()})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["utilization"][20] == 0.5
+    assert sum(response.json()["utilization"]) == 0.5
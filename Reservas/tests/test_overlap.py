@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from app.models.modelsDB import Book
+from tests.conftest import DAY, seedRows
+
+
+def addBook(session, table_number: int, start_hour: float, end_hour: float):
+    session.execute(insert(Book).values(
+        table_number=table_number, customer_id="C1",
+        time=DAY + timedelta(hours=start_hour), end_time=DAY + timedelta(hours=end_hour)))
+    session.commit()
+
+
+@pytest.mark.parametrize("start, end", [(13, 15), (11, 13), (12.5, 13.5), (11, 16)])
+def test_database_rejects_overlapping_books_written_outside_the_api(session, start, end):
+    seedRows(session, tables=2)
+    addBook(session, 1, 12, 14)
+
+    with pytest.raises(IntegrityError):
+        addBook(session, 1, start, end)
+    session.rollback()
+
+
+def test_database_accepts_adjacent_books_and_other_tables(session):
+    seedRows(session, tables=2)
+    addBook(session, 1, 12, 14)
+
+    addBook(session, 1, 14, 16)
+    addBook(session, 1, 10, 12)
+    addBook(session, 2, 12, 14)
+
+
+def test_database_rejects_moving_a_book_onto_another(session):
+    seedRows(session, tables=2)
+    addBook(session, 1, 12, 14)
+    addBook(session, 1, 16, 18)
+
+    session.execute(update(Book).where(Book.id == 2).values(no_show=True))
+    session.execute(update(Book).where(Book.id == 2).values(end_time=DAY + timedelta(hours=19)))
+    session.commit()
+    with pytest.raises(IntegrityError):
+        session.execute(update(Book).where(Book.id == 2).values(time=DAY + timedelta(hours=13)))
+    session.rollback()
@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from sqlalchemy import insert
+
+from app.models.modelsDB import ArchivedBook
+from tests.conftest import DAY, seedRows
+
+
+def walk(client, path: str, key: str, **params) -> list:
+    """
+    Follow next_after from the first page to the last and return every row.
+    """
+    rows, after = [], None
+    while True:
+        body = client.get(path, params=dict(params, **({"after": after} if after is not None else {}))).json()
+        rows.extend(body[key])
+        after = body["next_after"]
+        if after is None:
+            return rows
+
+
+def test_pages_with_tied_times_return_every_book_once(session, client):
+    # 100 reservations, ten of them at each hour: the cursor is the id, so
+    # rows with the same time are never skipped or repeated between pages.
+    seedRows(session, books=100)
+
+    for limit in (1, 7, 10, 99, 100, 101):
+        ids = [row["id"] for row in walk(client, "/books", "books", limit=limit)]
+        assert ids == list(range(1, 101)), limit
+
+
+def test_last_page_exactly_full_ends_with_an_empty_page(session, client):
+    seedRows(session, books=20)
+
+    first = client.get("/books", params={"limit": 10}).json()
+    second = client.get("/books", params={"limit": 10, "after": first["next_after"]}).json()
+    third = client.get("/books", params={"limit": 10, "after": second["next_after"]}).json()
+
+    assert [len(first["books"]), len(second["books"]), len(third["books"])] == [10, 10, 0]
+    assert third["next_after"] is None
+
+
+def test_filtered_pages(session, client):
+    seedRows(session, books=100)
+    start, end = DAY + timedelta(hours=4), DAY + timedelta(hours=10)
+
+    rows = walk(client, "/books", "books", limit=4, table_number=3,
+                start=start.isoformat(), end=end.isoformat())
+
+    assert [row["time"] for row in rows] == [(DAY + timedelta(hours=hour)).isoformat() for hour in (4, 6, 8)]
+    assert {row["table_number"] for row in rows} == {3}
+
+
+def test_pages_merge_archived_books_by_id(session, client):
+    seedRows(session, books=30)
+    session.execute(insert(ArchivedBook), [
+        {"id": 100 + 3 * n, "table_number": 1, "customer_id": "C1", "time": DAY - timedelta(days=400),
+         "end_time": DAY - timedelta(days=400) + timedelta(hours=2), "archived_at": DAY} for n in range(10)])
+    session.commit()
+
+    rows = walk(client, "/books", "books", limit=6, include_archived=True)
+
+    assert [row["id"] for row in rows] == list(range(1, 31)) + [100 + 3 * n for n in range(10)]
+    assert [row["archived"] for row in rows].count(True) == 10
+
+
+def test_tables_and_customers_pages(session, client):
+    seedRows(session, tables=25, customers=33)
+
+    assert [row["number"] for row in walk(client, "/tables", "mesas", limit=4, min_seats=4)] == list(range(1, 26))
+    assert len(walk(client, "/customers", "customers", limit=10)) == 33
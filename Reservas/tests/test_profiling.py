@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+from app import config
+from app.middleware import ProfilingMiddleware
+from app.services import profiling
+
+
+@pytest.fixture
+def profiled(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "PROFILING_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(config, "PROFILING_DIR", str(tmp_path))
+    return tmp_path
+
+
+def handler():
+    return sum(range(1000))
+
+
+async def app(scope, receive, send):
+    profiling.profiledEndpoint(handler)()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def request(middleware) -> list:
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/books", "headers": []}
+    await middleware(scope, receive, send)
+    return sent
+
+
+@pytest.mark.parametrize("mode", ["sampling", "deterministic"])
+def test_profiled_request_writes_its_profile(profiled, monkeypatch, mode):
+    monkeypatch.setattr(config, "PROFILING_MODE", mode)
+
+    async def inWorkerThread():
+        # Sync handlers run in the threadpool, away from the event loop thread.
+        async def threaded(scope, receive, send):
+            thread = threading.Thread(target=profiling.profiledEndpoint(handler))
+            thread.start()
+            thread.join()
+            await app(scope, receive, send)
+
+        return await request(ProfilingMiddleware(threaded))
+
+    sent = asyncio.run(inWorkerThread())
+
+    profile_id = dict(sent[0]["headers"])[b"x-profile-id"].decode()
+    summary = json.loads((profiled / f"{profile_id}.summary.json").read_text())
+    expected = "deterministic" if mode == "deterministic" and sys.version_info < (3, 12) else "sampling"
+    assert summary["status"] == 200
+    assert summary["mode"] == expected
+    suffix = ".pstats" if expected == "deterministic" else ".speedscope.json"
+    assert os.path.exists(profiled / f"{profile_id}{suffix}")
+    assert not profiling._active.locked()
+
+
+def test_lock_is_released_when_saving_is_cancelled(profiled, monkeypatch):
+    saving = threading.Event()
+    release = threading.Event()
+
+    def slowSave(run):
+        saving.set()
+        release.wait(5)
+
+    monkeypatch.setattr(profiling, "save", slowSave)
+
+    async def cancelWhileSaving():
+        task = asyncio.create_task(request(ProfilingMiddleware(app)))
+        while not saving.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    try:
+        asyncio.run(cancelWhileSaving())
+    finally:
+        release.set()
+
+    assert not profiling._active.locked()
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from app.models.modelsDB import UtilizationDelta, UtilizationRollup
+from app.services import rollups
+from tests.conftest import DAY, seedRows
+
+
+def report(client) -> dict:
+    response = client.get("/reports/utilization", params={
+        "from": DAY.isoformat(), "to": (DAY + timedelta(days=1)).isoformat(), "granularity": "hour"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def count(session, model) -> int:
+    session.commit()
+    return session.execute(select(func.count()).select_from(model)).scalar()
+
+
+def test_reservations_only_append_deltas_until_folded(session, client):
+    seedRows(session)
+    start = DAY + timedelta(hours=20)
+    created = client.post("/books", json={"table_number": 1, "customer_id": "C1", "time": start.isoformat()})
+    assert created.status_code == 201, created.text
+    book_id = created.json()["reserva"]["id"]
+    assert client.put(f"/books/{book_id}", json={"table_number": 2}).status_code == 200
+
+    assert count(session, UtilizationRollup) == 0
+    assert count(session, UtilizationDelta) == 3
+    before = report(client)
+    assert before["totals"]["reservations"] == 1
+    assert before["totals"]["covers"] == 4
+
+    assert rollups.fold(session) == 3
+
+    assert count(session, UtilizationDelta) == 0
+    assert count(session, UtilizationRollup) > 0
+    assert report(client)["buckets"] == before["buckets"]
+
+
+def test_seat_changes_are_folded_into_the_existing_reservations(session, client):
+    seedRows(session, books=10)
+    rollups.rebuild(session)
+    assert report(client)["totals"]["covers"] == 40
+
+    assert client.put("/tables/1", params={"table_number": 1}, json={"seats": 6}).status_code == 200
+
+    assert report(client)["totals"]["covers"] == 42
+    rollups.fold(session)
+    assert report(client)["totals"]["covers"] == 42
@@ -0,0 +1,42 @@
+import pytest
+
+from app import config
+from app.models.modelsDB import Customer
+from app.services import search
+
+CUSTOMERS = [
+    ("S1", "José Peña", "jose.pena@example.com", "300 555 1234"),
+    ("S2", "Josefina Ruiz", "jruiz@example.com", "(301) 222-0000"),
+    ("S3", "Ana Gómez", "ana@correo.co", "+57 310 999 8888"),
+]
+
+
+@pytest.fixture(params=["database", "memory"])
+def backend(request, monkeypatch, session):
+    monkeypatch.setattr(config, "CUSTOMER_SEARCH_BACKEND", request.param)
+    session.add_all([Customer(idcustomer=idcustomer, name=name, email=email, tel=tel)
+                     for idcustomer, name, email, tel in CUSTOMERS])
+    session.commit()
+    return request.param
+
+
+def found(client, query: str) -> list:
+    response = client.get("/customers/search", params={"q": query})
+    assert response.status_code == 200, response.text
+    return [customer["idcustomer"] for customer in response.json()["customers"]]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("jose", ["S1", "S2"]),
+    ("JOSÉ peña", ["S1"]),
+    ("gomez", ["S3"]),
+    ("555-12", ["S1"]),
+    ("301222", ["S2"]),
+    ("zzzz", []),
+])
+def test_search_ignores_accents_case_and_phone_separators(backend, client, query, expected):
+    assert found(client, query) == expected
+
+
+def test_in_memory_index_is_only_loaded_when_configured(backend, client):
+    assert search.index.loaded == (backend == "memory")
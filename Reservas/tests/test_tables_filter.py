@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+import pytest
+
+from app.services import occupancy
+from tests.conftest import DAY, seedRows
+
+
+def numbers(client, occupied: bool, at) -> list:
+    response = client.get("/tablesFilter", params={"booleanTable": occupied, "at": at.isoformat()})
+    assert response.status_code == 200, response.text
+    tables = response.json()["mesas"]
+    assert all(table["is_occupied"] is occupied for table in tables)
+    return [table["number"] for table in tables]
+
+
+@pytest.mark.parametrize("at", [DAY + timedelta(minutes=30), DAY + timedelta(hours=3)])
+def test_books_table_and_bitmap_give_the_same_tables(session, client, monkeypatch, at):
+    seedRows(session, books=15)
+    occupancy.load(session)
+    from_bitmap = (numbers(client, True, at), numbers(client, False, at))
+
+    monkeypatch.setattr(occupancy.bitmap, "since", None)
+    from_books = (numbers(client, True, at), numbers(client, False, at))
+
+    assert from_books == from_bitmap
+    assert sorted(from_books[0] + from_books[1]) == list(range(1, 11))
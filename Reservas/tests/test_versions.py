@@ -0,0 +1,96 @@
+import json
+
+from sqlalchemy import func, insert, select
+
+from app import config
+from app.models.modelsDB import ChangeLog
+from tests.conftest import inOtherProcess, seedRows
+
+ADD_TABLE_99 = """
+    from app.database.connection import SessionLocal
+    from app.models.modelsDB import Table
+
+    session = SessionLocal()
+    session.add(Table(number=99, seats=6, is_occupied=False))
+    session.commit()
+"""
+
+
+def test_etag_changes_after_a_write_in_another_process(session, client):
+    seedRows(session)
+    first = client.get("/tables")
+    etag = first.headers["etag"]
+    assert client.get("/tables", headers={"If-None-Match": etag}).status_code == 304
+
+    inOtherProcess(ADD_TABLE_99)
+
+    second = client.get("/tables", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.headers["etag"] != etag
+    assert 99 in [table["number"] for table in second.json()["mesas"]]
+
+
+def test_detail_cache_is_invalidated_by_another_process(session, client):
+    seedRows(session)
+    assert client.get("/customers/C1").json()["customer"]["name"] == "Cliente 1"
+
+    inOtherProcess("""
+        from app.database.connection import SessionLocal
+        from app.models.modelsDB import Customer
+
+        session = SessionLocal()
+        session.query(Customer).filter_by(idcustomer="C1").one().name = "Otro nombre"
+        session.commit()
+    """)
+
+    assert client.get("/customers/C1").json()["customer"]["name"] == "Otro nombre"
+
+
+def test_every_process_gives_the_same_etag(session, client):
+    seedRows(session)
+    response = client.post("/tables", json={"number": 50, "seats": 2, "is_occupied": False})
+    assert response.status_code == 201, response.text
+
+    other = inOtherProcess("""
+        from app.database.connection import SessionLocal
+        from app.database.events import catchUp
+        from app.services import versions
+
+        catchUp(SessionLocal())
+        print(versions.etag("tables"))
+    """)
+
+    assert client.get("/tables").headers["etag"] == other.strip()
+
+
+def test_change_log_is_read_at_most_every_poll_interval(session, client, monkeypatch):
+    seedRows(session)
+    etag = client.get("/tables").headers["etag"]
+    monkeypatch.setattr(config, "CHANGE_LOG_POLL_MS", 60000)
+
+    inOtherProcess(ADD_TABLE_99)
+
+    assert client.get("/tables", headers={"If-None-Match": etag}).status_code == 304
+    monkeypatch.setattr(config, "CHANGE_LOG_POLL_MS", 0)
+    assert client.get("/tables", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_change_committed_after_a_later_one_changes_the_etag(session, client):
+    seedRows(session)
+    client.get("/tables")
+    last = session.execute(select(func.max(ChangeLog.id))).scalar() or 0
+
+    def log(number: int):
+        values = {"id": number, "number": number, "seats": 4, "is_occupied": False}
+        session.execute(insert(ChangeLog).values(id=number, entity="tables", action="create",
+                                                 data=json.dumps({"values": values})))
+        session.commit()
+        return client.get("/tables").headers["etag"]
+
+    # Postgres hands out the ids when the rows are inserted, so a transaction
+    # can commit its entry after a later one has been read.
+    later = log(last + 2)
+    both = log(last + 1)
+
+    assert later not in (f'"tables-{last}"', both)
+    assert both == f'"tables-{last + 2}"'
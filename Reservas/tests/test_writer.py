@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+from app.services.writer import GroupCommitWriter, WriterStopped
+
+
+def test_submit_after_stop_raises_until_started_again():
+    writer = GroupCommitWriter(lambda items: [item * 2 for item in items], max_batch=10, max_wait=0.001)
+    assert writer.submit(1).result(timeout=5) == 2
+
+    assert writer.stop()
+    with pytest.raises(WriterStopped):
+        writer.submit(2)
+
+    writer.start()
+    assert writer.submit(3).result(timeout=5) == 6
+    assert writer.stop()
+
+
+def test_items_cancelled_while_waiting_are_not_written():
+    release = threading.Event()
+    written = []
+
+    def process(items):
+        release.wait(5)
+        written.extend(items)
+        return items
+
+    writer = GroupCommitWriter(process, max_batch=1, max_wait=0.001)
+    first = writer.submit("first")
+    second = writer.submit("second")
+    with pytest.raises(TimeoutError):
+        second.result(timeout=0.05)
+
+    assert second.cancel()
+    release.set()
+    assert first.result(timeout=5) == "first"
+    assert writer.stop()
+    assert written == ["first"]
+
+
+def test_stop_reports_a_thread_that_is_still_writing():
+    release = threading.Event()
+    writer = GroupCommitWriter(lambda items: release.wait(5) and items, max_batch=1, max_wait=0.001)
+    pending = writer.submit("slow")
+
+    assert not writer.stop(timeout=0.05)
+    with pytest.raises(WriterStopped):
+        writer.submit("late")
+    release.set()
+    assert pending.result(timeout=5) == "slow"